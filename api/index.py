@@ -1,10 +1,25 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, has_request_context, Response, stream_with_context
 from flask_cors import CORS
+import click
 import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
 import os
+import queue as queue_mod
+import atexit
+import bisect
+import csv
+import functools
 import hashlib
 import hmac
+import io
+import json
+import re
 import secrets
+import select
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 
 class PrefixMiddleware:
@@ -31,7 +46,7 @@ def parse_date(date_str):
     except Exception:
         pass
     formats = ['%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y/%m/%d',
-               '%m/%d/%Y', '%d/%m/%Y', '%b %d, %Y', '%d %b %Y']
+               '%m/%d/%Y', '%d/%m/%Y', '%B %d, %Y', '%b %d, %Y', '%d %b %Y']
     for fmt in formats:
         try:
             return datetime.strptime(date_str, fmt).date()
@@ -47,6 +62,30 @@ def parse_date(date_str):
     return None
 
 
+def parse_time(time_str):
+    """Parse a clock time string ("7:05 PM", "19:05", ...) into a datetime.time."""
+    if not time_str:
+        return None
+    # Browsers put a narrow / non-breaking space before AM/PM
+    time_str = ' '.join(time_str.replace('\u202f', ' ').replace('\xa0', ' ').split())
+    for fmt in ('%I:%M %p', '%I:%M:%S %p', '%H:%M', '%H:%M:%S'):
+        try:
+            return datetime.strptime(time_str, fmt).time()
+        except Exception:
+            continue
+    return None
+
+
+def display_date(day):
+    """A ticket date the way the pages show it: "October 5, 2026"."""
+    return f"{day:%B} {day.day}, {day.year}" if day else None
+
+
+def display_time(t):
+    """A ticket time the way the pages show it: "7:05 PM"."""
+    return t.strftime('%I:%M %p').lstrip('0') if t else None
+
+
 # --- Password hashing (PBKDF2-HMAC-SHA256, no bcrypt dependency) ---
 
 def hash_password(password):
@@ -70,30 +109,627 @@ def verify_password(password, stored_hash):
 
 app = Flask(__name__)
 app.wsgi_app = PrefixMiddleware(app.wsgi_app, prefix='/api')
-CORS(app)
+CORS(app, expose_headers=['X-Next-After', 'ETag', 'X-Queue-Version'])
+
+
+# =================================================================
+# DATABASE CONNECTION POOL
+# =================================================================
+
+def _connect():
+    """Open a new physical connection (used only by the pool)."""
+    database_url = os.environ.get('DATABASE_URL')
+    if database_url:
+        # Strip channel_binding param — not supported by all psycopg2 builds
+        import re as _re
+        database_url = _re.sub(r'[&?]channel_binding=[^&]*', '', database_url)
+        return psycopg2.connect(database_url)
+    return psycopg2.connect(
+        database=os.environ.get('PGDATABASE'),
+        user=os.environ.get('PGUSER'),
+        password=os.environ.get('PGPASSWORD'),
+        host=os.environ.get('PGHOST'),
+        port=os.environ.get('PGPORT', 5432),
+        sslmode='require'
+    )
+
+
+class PooledConnection:
+    """Proxy around a psycopg2 connection; close() hands it back to the pool."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get('_raw')
+        if raw is None:
+            raise psycopg2.InterfaceError('connection already returned to pool')
+        return getattr(raw, name)
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool.release(raw)
+
+
+class ConnectionPool:
+    """Thread-safe PostgreSQL connection pool.
+
+    Connections idle longer than ``idle_timeout`` are reaped down to
+    ``min_size``; connections idle longer than ``ping_after`` are checked with
+    ``SELECT 1`` before being handed out. Checkout blocks up to
+    ``checkout_timeout`` seconds once ``max_size`` connections are in use.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, idle_timeout=300.0,
+                 ping_after=30.0, checkout_timeout=10.0):
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self.checkout_timeout = checkout_timeout
+        self._cond = threading.Condition()
+        self._idle = []          # [(raw_conn, returned_at)], most recently used last
+        self._in_use = 0
+        self._stats = {
+            'checkouts': 0, 'connections_opened': 0, 'connections_closed': 0,
+            'reaped': 0, 'failed_health_checks': 0, 'timeouts': 0,
+            'wait_time_total_ms': 0.0, 'wait_time_max_ms': 0.0,
+        }
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        self._stats['connections_closed'] += 1
+
+    def _reap_idle(self, now):
+        """Close connections idle past idle_timeout, keeping min_size open. Caller holds the lock."""
+        while len(self._idle) + self._in_use > self.min_size and self._idle:
+            raw, returned_at = self._idle[0]
+            if now - returned_at < self.idle_timeout:
+                break
+            self._idle.pop(0)
+            self._discard(raw)
+            self._stats['reaped'] += 1
+
+    def _healthy(self, raw, returned_at, now):
+        if raw.closed:
+            return False
+        if now - returned_at < self.ping_after:
+            return True
+        try:
+            cur = raw.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+            raw.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self):
+        """Check out a raw connection, waiting for a free slot if the pool is full."""
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._reap_idle(now)
+                if self._idle:
+                    raw, returned_at = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._in_use < self.max_size:
+                    raw, returned_at = None, None
+                    self._in_use += 1
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise psycopg2.OperationalError(
+                        f"connection pool exhausted ({self.max_size} in use)")
+                self._cond.wait(remaining)
+        try:
+            if raw is not None and not self._healthy(raw, returned_at, time.monotonic()):
+                with self._cond:
+                    self._stats['failed_health_checks'] += 1
+                    self._discard(raw)
+                raw = None
+            if raw is None:
+                raw = self._connect()
+                with self._cond:
+                    self._stats['connections_opened'] += 1
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        waited_ms = (time.monotonic() - started) * 1000
+        with self._cond:
+            self._stats['checkouts'] += 1
+            self._stats['wait_time_total_ms'] += waited_ms
+            self._stats['wait_time_max_ms'] = max(self._stats['wait_time_max_ms'], waited_ms)
+        return raw
+
+    def release(self, raw):
+        """Return a raw connection, rolling back any open transaction first."""
+        keep = not raw.closed
+        if keep:
+            try:
+                if raw.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    raw.rollback()
+                if raw.autocommit:
+                    raw.autocommit = False
+                if raw.readonly is not None:
+                    raw.readonly = None
+            except Exception:
+                keep = False
+        with self._cond:
+            self._in_use -= 1
+            if keep:
+                self._idle.append((raw, time.monotonic()))
+            else:
+                self._discard(raw)
+            self._reap_idle(time.monotonic())
+            self._cond.notify()
+
+    def checkout(self):
+        """Return a PooledConnection whose close() releases it back to the pool."""
+        return PooledConnection(self, self.getconn())
+
+    @contextmanager
+    def connection(self):
+        """Context manager that always returns the connection, even if the body raises."""
+        conn = self.checkout()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def stats(self):
+        with self._cond:
+            s = dict(self._stats)
+            s.update({
+                'min_size': self.min_size, 'max_size': self.max_size,
+                'in_use': self._in_use, 'idle': len(self._idle),
+                'wait_time_avg_ms': (s['wait_time_total_ms'] / s['checkouts']) if s['checkouts'] else 0.0,
+            })
+        return s
+
+    def closeall(self):
+        with self._cond:
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+
+
+db_pool = ConnectionPool(
+    _connect,
+    min_size=int(os.environ.get('DB_POOL_MIN', 1)),
+    max_size=int(os.environ.get('DB_POOL_MAX', 10)),
+    idle_timeout=float(os.environ.get('DB_POOL_IDLE_TIMEOUT', 300)),
+    ping_after=float(os.environ.get('DB_POOL_PING_AFTER', 30)),
+    checkout_timeout=float(os.environ.get('DB_POOL_CHECKOUT_TIMEOUT', 10)),
+)
+atexit.register(db_pool.closeall)
 
 
 def get_db_connection():
+    """Check out a pooled connection for the current request.
+
+    Route handlers may still call conn.close(); anything left checked out
+    (e.g. when a handler raises) is returned by release_request_connections().
+    """
     try:
-        database_url = os.environ.get('DATABASE_URL')
-        if database_url:
-            # Strip channel_binding param — not supported by all psycopg2 builds
-            import re as _re
-            database_url = _re.sub(r'[&?]channel_binding=[^&]*', '', database_url)
-            conn = psycopg2.connect(database_url)
-        else:
-            conn = psycopg2.connect(
-                database=os.environ.get('PGDATABASE'),
-                user=os.environ.get('PGUSER'),
-                password=os.environ.get('PGPASSWORD'),
-                host=os.environ.get('PGHOST'),
-                port=os.environ.get('PGPORT', 5432),
-                sslmode='require'
-            )
-        return conn
+        conn = db_pool.checkout()
     except Exception as e:
         print(f"Database connection error: {e}")
         return None
+    if has_request_context():
+        g.setdefault('db_connections', []).append(conn)
+    return conn
+
+
+@app.teardown_request
+def release_request_connections(exc=None):
+    for conn in g.pop('db_connections', []):
+        conn.close()
+
+
+# =================================================================
+# LISTEN / NOTIFY
+# =================================================================
+
+class NotificationListener:
+    """Background thread that LISTENs on a dedicated (unpooled) connection.
+
+    ``subscribe(channel, handler, on_reconnect)`` registers ``handler(payload)``
+    for a channel. Notifications sent while the listener is disconnected are
+    lost, so ``on_reconnect()`` is called after every (re)connect to let
+    subscribers drop whatever they cached.
+    """
+
+    def __init__(self, connect, poll_interval=5.0, retry_delay=2.0):
+        self._connect = connect
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self._handlers = {}        # channel -> [handler]
+        self._reconnect_hooks = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.connected = False
+        self.received = 0
+
+    def subscribe(self, channel, handler, on_reconnect=None):
+        with self._lock:
+            self._handlers.setdefault(channel, []).append(handler)
+            if on_reconnect and on_reconnect not in self._reconnect_hooks:
+                self._reconnect_hooks.append(on_reconnect)
+
+    def start(self):
+        """Start the listener thread (no-op if it is already running)."""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='pg-listener', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _dispatch(self, channel, payload):
+        for handler in list(self._handlers.get(channel, [])):
+            try:
+                handler(payload)
+            except Exception as e:
+                print(f"Notification handler for {channel} failed: {e}")
+
+    def _run(self):
+        while not self._stop.is_set():
+            raw = None
+            try:
+                raw = self._connect()
+                raw.autocommit = True
+                cur = raw.cursor()
+                for channel in list(self._handlers):
+                    cur.execute(f'LISTEN "{channel}"')
+                self.connected = True
+                for hook in list(self._reconnect_hooks):
+                    hook()
+                while not self._stop.is_set():
+                    if select.select([raw], [], [], self.poll_interval) == ([], [], []):
+                        continue
+                    raw.poll()
+                    while raw.notifies:
+                        n = raw.notifies.pop(0)
+                        self.received += 1
+                        self._dispatch(n.channel, n.payload)
+            except Exception as e:
+                print(f"Notification listener error: {e}")
+            finally:
+                self.connected = False
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+            self._stop.wait(self.retry_delay)
+
+
+db_listener = NotificationListener(_connect)
+atexit.register(db_listener.stop)
+
+
+@app.before_request
+def start_listener_once():
+    """Start the LISTEN thread on the first request (DB_LISTEN=false disables it)."""
+    if db_listener._thread is None and os.environ.get('DB_LISTEN', 'true').lower() != 'false':
+        db_listener.start()
+
+
+# =================================================================
+# LIVE EVENTS
+# =================================================================
+
+class EventHub:
+    """In-process fan-out of "something changed" signals to streaming clients.
+
+    Keys are ('service', service_id) or ('queue', queue_id). Subscribers get a
+    bounded queue; a full queue already means "re-read your state", so
+    publish() never blocks on a slow client.
+    """
+
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._subs = {}
+
+    def subscribe(self, key):
+        sub = queue_mod.Queue(self.maxsize)
+        with self._lock:
+            self._subs.setdefault(key, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, key, sub):
+        with self._lock:
+            subs = self._subs.get(key)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[key]
+
+    def publish(self, key, event=None):
+        with self._lock:
+            subs = list(self._subs.get(key, ()))
+        for sub in subs:
+            try:
+                sub.put_nowait(event)
+            except queue_mod.Full:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {'keys': len(self._subs), 'subscribers': sum(len(v) for v in self._subs.values())}
+
+
+event_hub = EventHub()
+
+
+# Change bus: every queue mutation sends one compact JSON event per ticket on
+# QUEUE_CHANNEL from inside its transaction, so it is delivered (to every
+# worker's listener) only if the mutation commits:
+#   {"i": institution_id, "s": service_id, "q": queue id,
+#    "st": waiting|called|completed, "a": action, "v": service version,
+#    "n": ticket number, "sq": ticket seq}
+QUEUE_CHANNEL = 'queue_changes'
+
+
+def _ticket_lifecycle(row):
+    if row['state'] >= STATE_COMPLETED:
+        return 'completed'
+    return 'called' if row['state'] == STATE_CALLED else 'waiting'
+
+
+def _bump_service_versions(cur, service_ids):
+    """Increment service_versions once per service; returns {service_id: new version}."""
+    if not service_ids:
+        return {}
+    cur.execute("""
+        INSERT INTO service_versions AS v (service_id, version, updated_at)
+        SELECT sid, 1, NOW() FROM unnest(%s::int[]) AS sid
+        ON CONFLICT (service_id) DO UPDATE SET version = v.version + 1, updated_at = NOW()
+        RETURNING service_id, version
+    """, (sorted(service_ids),))
+    return dict(cur.fetchall())
+
+
+def _send_queue_events(cur, events):
+    cur.execute("SELECT pg_notify(%s, e) FROM unnest(%s::text[]) AS e",
+                (QUEUE_CHANNEL, [json.dumps(e, separators=(',', ':')) for e in events]))
+    if has_request_context():
+        g.setdefault('pending_events', []).extend(events)
+
+
+def _notify_queue_changes(cur, action, rows):
+    """Bump service versions and queue one NOTIFY per changed ticket (sent on commit)."""
+    versions = _bump_service_versions(cur, {r['service_id'] for r in rows if r.get('service_id')})
+    _send_queue_events(cur, [{
+        "i": r.get('institution_id'), "s": r.get('service_id'), "q": str(r['id']),
+        "st": _ticket_lifecycle(r), "a": action, "v": versions.get(r.get('service_id')),
+        "n": r.get('number'), "sq": r.get('seq'),
+    } for r in rows])
+
+
+def _notify_services_changed(cur, action, services):
+    """Service-wide variant for bulk changes such as deletes: one event per
+    (institution_id, service_id) pair, with no queue id."""
+    versions = _bump_service_versions(cur, {sid for _, sid in services if sid})
+    _send_queue_events(cur, [{
+        "i": inst, "s": sid, "q": None, "st": None, "a": action, "v": versions.get(sid),
+    } for inst, sid in services])
+
+
+def _publish_queue_event(event):
+    queue_engine.apply(event)
+    if event.get('s') and event.get('v'):
+        service_versions.observe(event['s'], event['v'])
+    if event.get('q'):
+        event_hub.publish(('queue', event['q']), event)
+    if event.get('s'):
+        event_hub.publish(('service', event['s']), event)
+
+
+def _queue_notified(payload):
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        return
+    _publish_queue_event(event)
+
+
+@app.after_request
+def publish_pending_events(response):
+    """Record this request's committed versions locally right away (so the
+    caller's next conditional GET cannot 304 on the old version), and, without
+    a connected listener, hand its events to local subscribers directly.
+    The queue engine applies them immediately for read-your-writes."""
+    events = g.pop('pending_events', None)
+    if events and response.status_code < 400:
+        for event in events:
+            if not db_listener.connected:
+                _publish_queue_event(event)
+            else:
+                # The NOTIFY echo will replay these; both steps are idempotent
+                queue_engine.apply(event)
+                if event.get('s') and event.get('v'):
+                    service_versions.observe(event['s'], event['v'])
+    return response
+
+
+class ServiceVersionCache:
+    """Per-worker copy of service_versions, kept current by the change bus.
+
+    While the listener is connected a cached version is authoritative; when it
+    is not, every lookup goes to the database. Tickets never change service,
+    so their service_id is cached too (bounded; cleared when full).
+    """
+
+    def __init__(self, listener, max_tickets=50000):
+        self._listener = listener
+        self.max_tickets = max_tickets
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._ticket_services = {}
+
+    def reset(self):
+        with self._lock:
+            self._versions.clear()
+
+    def observe(self, service_id, version):
+        with self._lock:
+            if version > self._versions.get(service_id, -1):
+                self._versions[service_id] = version
+
+    def cached(self, service_id):
+        if not self._listener.connected:
+            return None
+        with self._lock:
+            return self._versions.get(service_id)
+
+    def get(self, cur, service_id):
+        version = self.cached(service_id)
+        if version is None:
+            cur.execute("SELECT version FROM service_versions WHERE service_id = %s", (service_id,))
+            row = cur.fetchone()
+            version = row[0] if row else 0
+            self.observe(service_id, version)
+        return version
+
+    def ticket_service(self, queue_id):
+        with self._lock:
+            return self._ticket_services.get(queue_id)
+
+    def remember_ticket(self, queue_id, service_id):
+        with self._lock:
+            if len(self._ticket_services) >= self.max_tickets:
+                self._ticket_services.clear()
+            self._ticket_services[queue_id] = service_id
+
+
+service_versions = ServiceVersionCache(db_listener)
+
+
+def _reset_change_caches():
+    """Events sent while the listener was down are lost: drop what they maintain."""
+    service_versions.reset()
+    queue_engine.reset()
+
+
+db_listener.subscribe(QUEUE_CHANNEL, _queue_notified, _reset_change_caches)
+
+
+def _service_etag(service_id, version, *parts):
+    """Strong ETag for a service-scoped response: the service version plus
+    whatever else the body depends on (query string, day, presence...)."""
+    g.queue_version = version
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()[:10]
+    return f"s{service_id}-v{version}-{digest}"
+
+
+def _not_modified(etag):
+    return _with_etag(Response(status=304), etag)
+
+
+def _with_etag(resp, etag):
+    """Attach the ETag, plus X-Queue-Version (the ``since`` for a long-poll)."""
+    if etag:
+        resp.set_etag(etag)
+        resp.headers['Cache-Control'] = 'no-cache'
+        resp.headers['X-Queue-Version'] = str(g.queue_version)
+    return resp
+
+
+# Serverless functions (Vercel sets VERCEL) run each request under an
+# execution time limit and are billed for as long as it is held open, so
+# there no request blocks waiting for a change: see the SSE and long-poll
+# endpoints. SERVERLESS=true/false overrides the detection.
+SERVERLESS = os.environ.get('SERVERLESS', 'true' if os.environ.get('VERCEL') else 'false').lower() == 'true'
+
+# Upper bound on ?wait= for long-polls, and how often a waiting request
+# re-reads the version when no listener is delivering change events
+LONG_POLL_MAX_SECONDS = float(os.environ.get('LONG_POLL_MAX_SECONDS', 30))
+LONG_POLL_RECHECK_SECONDS = 2.0
+
+
+def _current_version(service_id):
+    """Service version from memory, else from a short pool checkout."""
+    version = service_versions.cached(service_id)
+    if version is None:
+        with db_pool.connection() as conn:
+            version = service_versions.get(conn.cursor(), service_id)
+    return version
+
+
+def _wait_for_change(service_id, since, timeout):
+    """Block until ``service_id``'s version passes ``since``, its admin
+    presence changes, or ``timeout`` seconds pass. Holds no database
+    connection while waiting. Returns True if something changed.
+    """
+    key = ('service', service_id)
+    sub = event_hub.subscribe(key)
+    try:
+        if _current_version(service_id) > since:
+            return True
+        deadline = time.monotonic() + min(timeout, LONG_POLL_MAX_SECONDS)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            step = remaining if db_listener.connected else min(remaining, LONG_POLL_RECHECK_SECONDS)
+            try:
+                event = sub.get(timeout=step)
+            except queue_mod.Empty:
+                if not db_listener.connected and _current_version(service_id) > since:
+                    return True
+                continue
+            # Presence changes arrive without a payload
+            if event is None or (event.get('v') or 0) > since:
+                return True
+    finally:
+        event_hub.unsubscribe(key, sub)
+
+
+def _long_poll_args():
+    """(wait, since) from ?wait=<seconds>&since=<version>, or None when not
+    long-polling. Always None when SERVERLESS: the request answers at once."""
+    wait = request.args.get('wait', type=float)
+    since = request.args.get('since', type=int)
+    if SERVERLESS or not wait or wait <= 0 or since is None:
+        return None
+    return wait, since
+
+
+def _department_etag(department, *parts, cur=None):
+    """ETag for a per-service admin endpoint (None for legacy department names).
+
+    Without ``cur`` only the in-memory version is used (None if unknown). The
+    version is read before the response body, so a racing mutation can only
+    make the ETag older than the body, never newer.
+    """
+    if not str(department).isdigit():
+        return None
+    service_id = int(department)
+    if cur is None:
+        version = service_versions.cached(service_id)
+    else:
+        version = service_versions.get(cur, service_id)
+    if version is None:
+        return None
+    return _service_etag(service_id, version, request.full_path, *parts)
 
 
 # Legacy person-filter map (kept only for backward-compatible endpoints)
@@ -105,16 +741,13 @@ LEGACY_DEPT_MAPPING = {
     'dean': 'A', 'ie-chair': 'B', 'cpe-chair': 'C', 'ece-chair': 'D', 'others': 'E'
 }
 
-# In-memory admin status (prefix -> 'available' | 'busy' | 'away')
-admin_statuses = {}
-
 
 # =================================================================
 # SCHEMA
 # =================================================================
 
 def init_schema(conn):
-    """Create all tables if they don't exist."""
+    """Migration 1: create all tables if they don't exist (also upgrades the old single-tenant schema)."""
     cur = conn.cursor()
 
     cur.execute("""
@@ -254,12 +887,10 @@ def init_schema(conn):
     cur.execute("CREATE INDEX IF NOT EXISTS idx_queue_status ON queue(institution_id, status)")
     cur.execute("CREATE INDEX IF NOT EXISTS idx_queue_date ON queue(institution_id, created_at)")
 
-    conn.commit()
-
 
 def seed_default_data(conn):
-    """Seed the default PNC College of Engineering institution and users.
-    Safe to call on both fresh DBs and DBs migrated from the old single-tenant schema.
+    """Migration 2: seed the default PNC College of Engineering institution and users.
+    Safe to run on both fresh DBs and DBs migrated from the old single-tenant schema.
     """
     cur = conn.cursor()
 
@@ -343,14 +974,696 @@ def seed_default_data(conn):
             ON CONFLICT DO NOTHING
         """, u)
 
-    conn.commit()
     print("Default institution and users seeded.")
 
 
-def ensure_schema(conn):
-    """Idempotent helper — safe to call on every request."""
-    init_schema(conn)
-    seed_default_data(conn)
+def migrate_queue_counters(conn):
+    """Migration 3: per-institution/service/day ticket counters for atomic numbering."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS queue_counters (
+            institution_id INTEGER NOT NULL REFERENCES institutions(id) ON DELETE CASCADE,
+            service_id INTEGER NOT NULL REFERENCES services(id) ON DELETE CASCADE,
+            day DATE NOT NULL,
+            last_value INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (institution_id, service_id, day)
+        )
+    """)
+    # Continue numbering from tickets already issued today/yesterday
+    cur.execute("""
+        INSERT INTO queue_counters (institution_id, service_id, day, last_value)
+        SELECT q.institution_id, q.service_id, q.created_at::date,
+               MAX(CAST(SUBSTRING(q.number FROM 2) AS INTEGER))
+        FROM queue q JOIN services s ON s.id = q.service_id AND s.institution_id = q.institution_id
+        WHERE q.created_at >= CURRENT_DATE - 1 AND q.number ~ '^[A-Za-z][0-9]+$'
+        GROUP BY q.institution_id, q.service_id, q.created_at::date
+        ON CONFLICT (institution_id, service_id, day)
+        DO UPDATE SET last_value = GREATEST(queue_counters.last_value, EXCLUDED.last_value)
+    """)
+
+
+def migrate_hot_query_indexes(conn):
+    """Migration 4: indexes matching the sargable hot-path predicates."""
+    cur = conn.cursor()
+    # Active tickets per service (rebuilt on state by migration 17)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_queue_active_service
+        ON queue(service_id, created_at) WHERE completed IS NOT TRUE
+    """)
+    # Tickets created / completed per service within a time range
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_queue_service_created ON queue(service_id, created_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_queue_service_completed ON queue(service_id, completed_at)")
+    # idx_queue_service(service_id) is a prefix of idx_queue_service_created
+    cur.execute("DROP INDEX IF EXISTS idx_queue_service")
+    # Login: (institution_id, username) is served by the uq_users_inst_username
+    # constraint from migration 1; super-admin/legacy login looks up username alone.
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
+
+
+def migrate_queue_seq(conn):
+    """Migration 5: monotonic ticket sequence for keyset pagination."""
+    cur = conn.cursor()
+    cur.execute("ALTER TABLE queue ADD COLUMN IF NOT EXISTS seq BIGSERIAL")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_queue_service_seq ON queue(service_id, seq)")
+
+
+def migrate_admin_presence(conn):
+    """Migration 7: admin presence per service, shared by every worker."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS admin_presence (
+            service_id INTEGER PRIMARY KEY REFERENCES services(id) ON DELETE CASCADE,
+            status VARCHAR(10) NOT NULL CHECK (status IN ('available', 'busy', 'away')),
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+
+
+def migrate_service_versions(conn):
+    """Migration 8: per-service change counter bumped by every queue mutation."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS service_versions (
+            service_id INTEGER PRIMARY KEY REFERENCES services(id) ON DELETE CASCADE,
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+
+
+def migrate_hourly_rollup(conn):
+    """Migration 6: per-service hourly counters maintained by the mutation handlers."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS queue_hourly_rollup (
+            institution_id INTEGER NOT NULL REFERENCES institutions(id) ON DELETE CASCADE,
+            service_id INTEGER NOT NULL REFERENCES services(id) ON DELETE CASCADE,
+            bucket TIMESTAMP NOT NULL,
+            created INTEGER NOT NULL DEFAULT 0,
+            called INTEGER NOT NULL DEFAULT 0,
+            completed INTEGER NOT NULL DEFAULT 0,
+            served INTEGER NOT NULL DEFAULT 0,
+            wait_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+            service_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+            PRIMARY KEY (institution_id, service_id, bucket)
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_rollup_service_bucket ON queue_hourly_rollup(service_id, bucket)")
+    backfill_hourly_rollup(conn, source='queue')
+
+
+# The queue table is range-partitioned by created_at, one partition per day
+# (queue_pYYYYMMDD) plus queue_default for anything outside them.
+QUEUE_PARTITION_AHEAD_DAYS = int(os.environ.get('QUEUE_PARTITION_AHEAD_DAYS', '7'))
+# Drop day partitions, archived tickets and events older than this many days
+# (0 keeps all history)
+QUEUE_RETENTION_DAYS = int(os.environ.get('QUEUE_RETENTION_DAYS', '365'))
+# Rows each transaction removes when retention or an institution / department
+# delete clears rows one by one
+QUEUE_DELETE_BATCH = int(os.environ.get('QUEUE_DELETE_BATCH', '5000'))
+# pg_advisory_xact_lock key serialising partition maintenance across workers
+PARTITION_LOCK_KEY = 7_401_002
+
+
+def _partition_name(day):
+    return f"queue_p{day:%Y%m%d}"
+
+
+def queue_partitions(cur):
+    """{day: partition name} for the existing day partitions of queue."""
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'queue'::regclass AND c.relname LIKE 'queue\\_p%'
+    """)
+    return {datetime.strptime(name[len('queue_p'):], '%Y%m%d').date(): name for (name,) in cur.fetchall()}
+
+
+def _create_queue_partition(cur, day):
+    """Create the partition for ``day``, first moving any of its rows out of
+    queue_default (Postgres refuses to attach a range the default holds)."""
+    start, end = _day_range(day)
+    cur.execute("SELECT EXISTS (SELECT 1 FROM queue_default WHERE created_at >= %s AND created_at < %s)",
+                (start, end))
+    stranded = cur.fetchone()[0]
+    if stranded:
+        cur.execute("""
+            CREATE TEMP TABLE queue_stranded ON COMMIT DROP AS
+            SELECT * FROM queue_default WHERE created_at >= %s AND created_at < %s
+        """, (start, end))
+        cur.execute("DELETE FROM queue_default WHERE created_at >= %s AND created_at < %s", (start, end))
+    cur.execute(f"CREATE TABLE {_partition_name(day)} PARTITION OF queue FOR VALUES FROM (%s) TO (%s)",
+                (start, end))
+    if stranded:
+        cur.execute("INSERT INTO queue SELECT * FROM queue_stranded")
+        cur.execute("DROP TABLE queue_stranded")
+
+
+def ensure_queue_partitions(conn, days_ahead=None):
+    """Create the day partitions for today and the next ``days_ahead`` days.
+    Returns the names created; a no-op read when they all exist."""
+    days_ahead = QUEUE_PARTITION_AHEAD_DAYS if days_ahead is None else days_ahead
+    today = datetime.now().date()
+    wanted = [today + timedelta(days=n) for n in range(days_ahead + 1)]
+    cur = conn.cursor()
+    if not set(wanted) - set(queue_partitions(cur)):
+        return []
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", (PARTITION_LOCK_KEY,))
+    cur.execute("SET LOCAL lock_timeout = '5s'")
+    existing = queue_partitions(cur)
+    created = []
+    for day in wanted:
+        if day not in existing:
+            _create_queue_partition(cur, day)
+            created.append(_partition_name(day))
+    return created
+
+
+def drop_queue_partitions(conn, before_day, only_empty=False):
+    """Drop whole day partitions older than ``before_day`` (retention), or
+    only the empty ones. Returns [(name, rows)] dropped; rollups are kept."""
+    cur = conn.cursor()
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", (PARTITION_LOCK_KEY,))
+    cur.execute("SET LOCAL lock_timeout = '5s'")
+    dropped = []
+    for day, name in sorted(queue_partitions(cur).items()):
+        if day >= before_day:
+            continue
+        if only_empty:
+            cur.execute(f"SELECT EXISTS (SELECT 1 FROM {name})")
+            if cur.fetchone()[0]:
+                continue
+        cur.execute(f"SELECT institution_id, service_id, COUNT(*) FROM {name} GROUP BY 1, 2")
+        groups = cur.fetchall()
+        cur.execute(f"DROP TABLE {name}")
+        _notify_services_changed(cur, 'deleted', [(inst, sid) for inst, sid, _ in groups])
+        dropped.append((name, sum(n for _, _, n in groups)))
+    return dropped
+
+
+def migrate_partition_queue(conn):
+    """Migration 9: range-partition queue by created_at, one partition per day.
+
+    Partitions are created from today on; older rows are copied into
+    queue_default, which the archiver drains into queue_history, rather than
+    one partition per historical day. The primary key becomes
+    (id, created_at), since a partitioned table's keys must include the
+    partition column.
+    """
+    cur = conn.cursor()
+    cur.execute("ALTER TABLE queue RENAME TO queue_unpartitioned")
+    cur.execute("ALTER INDEX IF EXISTS queue_pkey RENAME TO queue_unpartitioned_pkey")
+    cur.execute("UPDATE queue_unpartitioned SET created_at = COALESCE(called_at, completed_at, 'epoch') "
+                "WHERE created_at IS NULL")
+    cur.execute("""
+        CREATE TABLE queue (LIKE queue_unpartitioned INCLUDING DEFAULTS,
+            PRIMARY KEY (id, created_at),
+            FOREIGN KEY (institution_id) REFERENCES institutions(id) ON DELETE CASCADE,
+            FOREIGN KEY (service_id) REFERENCES services(id) ON DELETE CASCADE
+        ) PARTITION BY RANGE (created_at)
+    """)
+    cur.execute("ALTER SEQUENCE queue_seq_seq OWNED BY queue.seq")
+    cur.execute("CREATE TABLE queue_default PARTITION OF queue DEFAULT")
+    ensure_queue_partitions(conn)
+    cur.execute("INSERT INTO queue SELECT * FROM queue_unpartitioned")
+    cur.execute("DROP TABLE queue_unpartitioned")
+    # Same indexes as before, now created on every partition
+    cur.execute("CREATE INDEX idx_queue_institution ON queue(institution_id)")
+    cur.execute("CREATE INDEX idx_queue_status ON queue(institution_id, status)")
+    cur.execute("CREATE INDEX idx_queue_date ON queue(institution_id, created_at)")
+    cur.execute("""
+        CREATE INDEX idx_queue_active_service
+        ON queue(service_id, created_at) WHERE completed IS NOT TRUE
+    """)
+    cur.execute("CREATE INDEX idx_queue_service_created ON queue(service_id, created_at)")
+    cur.execute("CREATE INDEX idx_queue_service_completed ON queue(service_id, completed_at)")
+    cur.execute("CREATE INDEX idx_queue_service_seq ON queue(service_id, seq)")
+
+
+# queue.state / queue_history.state is an index into QUEUE_STATES
+QUEUE_STATES = ('waiting', 'called', 'completed', 'expired')
+STATE_WAITING, STATE_CALLED, STATE_COMPLETED, STATE_EXPIRED = range(len(QUEUE_STATES))
+
+# called / completed as derived from state on queue and queue_history
+# (migration 17 dropped the columns); an expired ticket counts as called if
+# it ever was
+QUEUE_FLAG_COLUMNS = {
+    'called': f"(state IN ({STATE_CALLED}, {STATE_COMPLETED})"
+              f" OR (state = {STATE_EXPIRED} AND called_at IS NOT NULL))",
+    'completed': f"(state >= {STATE_COMPLETED})",
+}
+
+# queue_all = live queue + queue_history, with queue's columns. Columns the
+# archive does not keep read as NULL / FALSE (name, expression over history);
+# the flags are derived on both sides.
+QUEUE_ALL_COLUMNS = [
+    ('id', 'id'), ('institution_id', 'institution_id'), ('service_id', 'service_id'),
+    ('number', 'number'), ('person', 'person'), ('date', 'date'), ('time', 'time'),
+    ('state', 'state'), ('accessed', 'accessed'), ('accessed_at', 'NULL::timestamp'),
+    ('completed', QUEUE_FLAG_COLUMNS['completed']), ('completed_at', 'completed_at'),
+    ('created_at', 'created_at'), ('called', QUEUE_FLAG_COLUMNS['called']), ('called_at', 'called_at'),
+    ('is_present', 'is_present'), ('present_at', 'NULL::timestamp'), ('is_muted', 'FALSE'), ('seq', 'seq'),
+]
+# The view as migrations 10-12 created it, before state replaced the status
+# string, when the flags were still columns
+STATUS_QUEUE_ALL_COLUMNS = [
+    ('status', 'status') if name == 'state'
+    else (name, {'completed': 'completed', 'called': 'called_at IS NOT NULL'}.get(name, expr))
+    for name, expr in QUEUE_ALL_COLUMNS
+]
+
+
+def migrate_queue_history(conn):
+    """Migration 10: compact archive for finished tickets and the queue_all view."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS queue_history (
+            id VARCHAR(255) PRIMARY KEY,
+            seq BIGINT,
+            institution_id INTEGER REFERENCES institutions(id) ON DELETE CASCADE,
+            service_id INTEGER REFERENCES services(id) ON DELETE CASCADE,
+            number VARCHAR(50),
+            person VARCHAR(255),
+            date VARCHAR(100),
+            time VARCHAR(50),
+            status VARCHAR(50),
+            created_at TIMESTAMP NOT NULL,
+            called_at TIMESTAMP,
+            called_by VARCHAR(255),
+            completed BOOLEAN NOT NULL DEFAULT FALSE,
+            completed_at TIMESTAMP,
+            completed_by VARCHAR(255),
+            is_present BOOLEAN NOT NULL DEFAULT FALSE,
+            accessed BOOLEAN NOT NULL DEFAULT FALSE
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_history_service_created ON queue_history(service_id, created_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_history_service_completed ON queue_history(service_id, completed_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_history_institution_created ON queue_history(institution_id, created_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_history_service_seq ON queue_history(service_id, seq)")
+    _create_queue_all_view(cur, STATUS_QUEUE_ALL_COLUMNS, live={})
+
+
+def _create_queue_all_view(cur, columns=QUEUE_ALL_COLUMNS, live=QUEUE_FLAG_COLUMNS):
+    """``live`` maps the columns read from queue as an expression, not as is."""
+    live_columns = [f'{live[name]} AS {name}' if name in live else name for name, _ in columns]
+    cur.execute(f"""
+        CREATE OR REPLACE VIEW queue_all AS
+        SELECT {', '.join(live_columns)} FROM queue
+        UNION ALL
+        SELECT {', '.join(f'{expr} AS {name}' for name, expr in columns)} FROM queue_history
+    """)
+
+
+def migrate_rollover_runs(conn):
+    """Migration 11: one row per institution and day closed out by the rollover."""
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS rollover_runs (
+            institution_id INTEGER NOT NULL REFERENCES institutions(id) ON DELETE CASCADE,
+            day DATE NOT NULL,
+            started_at TIMESTAMP DEFAULT NOW(),
+            finished_at TIMESTAMP,
+            expired INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (institution_id, day)
+        )
+    """)
+
+
+# Per-action columns whose history now lives in queue_events
+EVENT_LOGGED_COLUMNS = ('called_by', 'completed_by', 'returned_by', 'returned_at', 'muted_at', 'muted_by')
+
+
+def migrate_queue_events(conn):
+    """Migration 12: append-only queue_events log.
+
+    Seeded with one event per action the rows still remember, after which
+    the per-action actor / return / mute columns are dropped from queue and
+    queue_history.
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS queue_events (
+            id BIGSERIAL PRIMARY KEY,
+            queue_id VARCHAR(255) NOT NULL,
+            institution_id INTEGER,
+            service_id INTEGER,
+            type VARCHAR(16) NOT NULL,
+            actor VARCHAR(255),
+            at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_queue_events_queue ON queue_events(queue_id, id)")
+    # Rows are appended in time order, so a BRIN range index is enough for scans by time
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_queue_events_at ON queue_events USING brin (at)")
+    cur.execute("""
+        INSERT INTO queue_events (queue_id, institution_id, service_id, type, actor, at)
+        SELECT * FROM (
+            SELECT id, institution_id, service_id, 'created', NULL, created_at FROM queue
+            UNION ALL SELECT id, institution_id, service_id, 'called', called_by, called_at
+                      FROM queue WHERE called_at IS NOT NULL
+            UNION ALL SELECT id, institution_id, service_id, 'returned', returned_by, returned_at
+                      FROM queue WHERE returned_at IS NOT NULL
+            UNION ALL SELECT id, institution_id, service_id, 'present', NULL, present_at
+                      FROM queue WHERE present_at IS NOT NULL
+            UNION ALL SELECT id, institution_id, service_id, 'muted', muted_by, muted_at
+                      FROM queue WHERE muted_at IS NOT NULL
+            UNION ALL SELECT id, institution_id, service_id, 'completed', completed_by, completed_at
+                      FROM queue WHERE completed_at IS NOT NULL
+            UNION ALL SELECT id, institution_id, service_id, 'created', NULL, created_at FROM queue_history
+            UNION ALL SELECT id, institution_id, service_id, 'called', called_by, called_at
+                      FROM queue_history WHERE called_at IS NOT NULL
+            UNION ALL SELECT id, institution_id, service_id, 'completed', completed_by, completed_at
+                      FROM queue_history WHERE completed_at IS NOT NULL
+        ) e (queue_id, institution_id, service_id, type, actor, at)
+        ORDER BY at
+    """)
+    cur.execute("DROP VIEW IF EXISTS queue_all")
+    for column in EVENT_LOGGED_COLUMNS:
+        cur.execute(f"ALTER TABLE queue DROP COLUMN IF EXISTS {column}")
+        cur.execute(f"ALTER TABLE queue_history DROP COLUMN IF EXISTS {column}")
+    _create_queue_all_view(cur, STATUS_QUEUE_ALL_COLUMNS, live={})
+
+
+def migrate_compact_queue_row(conn):
+    """Migration 13: compact queue and queue_history rows.
+
+    seq becomes the primary key; the public id stays
+    unique (per day partition, together with created_at, on queue). date and
+    time become DATE / TIME: each distinct stored string is run through
+    parse_date / parse_time once, falling back to created_at. The status
+    string becomes the smallint state, derived from the row's flags.
+    """
+    cur = conn.cursor()
+    cur.execute("DROP VIEW IF EXISTS queue_all")
+    cur.execute("CREATE TEMP TABLE ticket_dates (raw VARCHAR(100) PRIMARY KEY, day DATE) ON COMMIT DROP")
+    cur.execute("CREATE TEMP TABLE ticket_times (raw VARCHAR(50) PRIMARY KEY, at TIME) ON COMMIT DROP")
+    cur.execute("SELECT date FROM queue UNION SELECT date FROM queue_history")
+    dates = [(raw, parse_date(raw)) for (raw,) in cur.fetchall() if raw]
+    psycopg2.extras.execute_values(cur, "INSERT INTO ticket_dates VALUES %s", dates)
+    cur.execute("SELECT time FROM queue UNION SELECT time FROM queue_history")
+    times = [(raw, parse_time(raw)) for (raw,) in cur.fetchall() if raw]
+    psycopg2.extras.execute_values(cur, "INSERT INTO ticket_times VALUES %s", times)
+
+    for table, called in (('queue', 't.called'), ('queue_history', 't.called_at IS NOT NULL')):
+        cur.execute(f"""
+            ALTER TABLE {table}
+                ADD COLUMN state SMALLINT NOT NULL DEFAULT {STATE_WAITING},
+                ADD COLUMN ticket_date DATE,
+                ADD COLUMN ticket_time TIME(0)
+        """)
+        cur.execute(f"""
+            UPDATE {table} t SET
+                state = CASE WHEN t.status = 'expired' THEN {STATE_EXPIRED}
+                             WHEN t.completed THEN {STATE_COMPLETED}
+                             WHEN {called} THEN {STATE_CALLED}
+                             ELSE {STATE_WAITING} END,
+                ticket_date = COALESCE((SELECT day FROM ticket_dates WHERE raw = t.date), t.created_at::date),
+                ticket_time = COALESCE((SELECT at FROM ticket_times WHERE raw = t.time),
+                                       date_trunc('second', t.created_at)::time)
+        """)
+        cur.execute(f"ALTER TABLE {table} DROP COLUMN status, DROP COLUMN date, DROP COLUMN time")
+        cur.execute(f"ALTER TABLE {table} RENAME COLUMN ticket_date TO date")
+        cur.execute(f"ALTER TABLE {table} RENAME COLUMN ticket_time TO time")
+        cur.execute(f"ALTER TABLE {table} ALTER COLUMN date SET NOT NULL, ALTER COLUMN time SET NOT NULL")
+    cur.execute("""
+        ALTER TABLE queue ALTER COLUMN date SET DEFAULT CURRENT_DATE,
+                          ALTER COLUMN time SET DEFAULT LOCALTIME(0)
+    """)
+    cur.execute("CREATE INDEX idx_queue_state ON queue(institution_id, state)")
+
+    # seq becomes the key of both tables. It keeps its BIGSERIAL sequence
+    # default: identity columns on a partitioned table need PostgreSQL 17.
+    cur.execute("SELECT GREATEST((SELECT MAX(seq) FROM queue), (SELECT MAX(seq) FROM queue_history))")
+    next_seq = (cur.fetchone()[0] or 0) + 1
+    cur.execute("SELECT setval('queue_seq_seq', %s, false)", (next_seq,))
+    cur.execute("""
+        ALTER TABLE queue DROP CONSTRAINT queue_pkey,
+            ADD PRIMARY KEY (seq, created_at),
+            ADD CONSTRAINT queue_id_key UNIQUE (id, created_at)
+    """)
+    cur.execute("""
+        ALTER TABLE queue_history DROP CONSTRAINT queue_history_pkey,
+            ADD PRIMARY KEY (seq),
+            ADD CONSTRAINT queue_history_id_key UNIQUE (id)
+    """)
+    _create_queue_all_view(cur)
+
+
+def migrate_admin_sessions(conn):
+    """Migration 14: server-side admin sessions.
+
+    Only a SHA-256 of each bearer token is stored, so a leaked table cannot
+    be replayed; rows go with their user.
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS admin_sessions (
+            token_hash CHAR(64) PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            expires_at TIMESTAMP NOT NULL
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_admin_sessions_expires ON admin_sessions(expires_at)")
+
+
+def migrate_queue_ids(conn):
+    """Migration 15: queue_ids, the day (created_at) of every ticket id.
+
+    queue's keys include created_at, the partition column, so a lookup by id
+    alone probes every day partition; going through queue_ids reaches just
+    the one holding the ticket. It covers archived tickets too and keeps ids
+    unique across days; a legacy id used twice keeps its newest ticket.
+    """
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS queue_ids (
+            id VARCHAR(255) PRIMARY KEY,
+            created_at TIMESTAMP NOT NULL
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_queue_ids_created ON queue_ids(created_at)")
+    cur.execute("""
+        INSERT INTO queue_ids (id, created_at)
+        SELECT DISTINCT ON (id) id, created_at
+        FROM (SELECT id, created_at FROM queue UNION ALL SELECT id, created_at FROM queue_history) t
+        ORDER BY id, created_at DESC
+        ON CONFLICT (id) DO NOTHING
+    """)
+
+
+def migrate_queue_events_service_index(conn):
+    """Migration 16: index the per-service audit log page (service_id, id)."""
+    conn.cursor().execute("CREATE INDEX IF NOT EXISTS idx_queue_events_service ON queue_events(service_id, id)")
+
+
+def migrate_derived_queue_flags(conn):
+    """Migration 17: state is the only record of a ticket's lifecycle.
+
+    called / completed only restated it, so they are dropped from queue and
+    queue_history; queue_all and the readers of the live table derive them
+    from state (QUEUE_FLAG_COLUMNS). is_present, is_muted and accessed stay:
+    state does not record them. The active-ticket partial index is rebuilt
+    on state, which the queries now filter on. queue_history.id loses its
+    UNIQUE constraint: queue_ids keeps ids unique now, and a legacy
+    duplicate must not stall the archiver.
+    """
+    cur = conn.cursor()
+    cur.execute("DROP VIEW IF EXISTS queue_all")
+    cur.execute("DROP INDEX idx_queue_active_service")
+    cur.execute("ALTER TABLE queue DROP COLUMN called, DROP COLUMN completed")
+    cur.execute("ALTER TABLE queue_history DROP COLUMN completed, DROP CONSTRAINT queue_history_id_key")
+    cur.execute("CREATE INDEX idx_queue_history_id ON queue_history(id)")
+    cur.execute(f"""
+        CREATE INDEX idx_queue_active_service
+        ON queue(service_id, created_at) WHERE {QUEUE_STATUS_FILTERS['active']}
+    """)
+    _create_queue_all_view(cur)
+
+
+def _by_queue_id(alias='', param='%s'):
+    """WHERE fragment matching one ticket by public id: queue_ids supplies
+    its created_at, so only that day's partition is searched."""
+    return f"({alias}id, {alias}created_at) = (SELECT id, created_at FROM queue_ids WHERE id = {param})"
+
+
+# =================================================================
+# MIGRATIONS
+# =================================================================
+# Each migration runs once, in its own transaction, and is recorded in
+# schema_migrations. Append new migrations to the end of MIGRATIONS;
+# never renumber or edit one that has shipped.
+
+MIGRATIONS = [
+    (1, 'base multi-tenant schema', init_schema),
+    (2, 'seed default institution and users', seed_default_data),
+    (3, 'queue number counters', migrate_queue_counters),
+    (4, 'hot query indexes', migrate_hot_query_indexes),
+    (5, 'queue sequence column', migrate_queue_seq),
+    (6, 'hourly analytics rollup', migrate_hourly_rollup),
+    (7, 'shared admin presence', migrate_admin_presence),
+    (8, 'service change versions', migrate_service_versions),
+    (9, 'day-partitioned queue table', migrate_partition_queue),
+    (10, 'queue history archive', migrate_queue_history),
+    (11, 'day rollover runs', migrate_rollover_runs),
+    (12, 'append-only queue events', migrate_queue_events),
+    (13, 'compact queue row', migrate_compact_queue_row),
+    (14, 'admin sessions', migrate_admin_sessions),
+    (15, 'queue id routing', migrate_queue_ids),
+    (16, 'queue events by service', migrate_queue_events_service_index),
+    (17, 'state-derived queue flags', migrate_derived_queue_flags),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# pg_advisory_xact_lock key serialising migrations across workers
+MIGRATION_LOCK_KEY = 7_401_001
+
+
+def get_schema_version(conn):
+    """Return the highest applied migration version (0 for an unmigrated DB)."""
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+        version = cur.fetchone()[0]
+    except psycopg2.errors.UndefinedTable:
+        version = 0
+    conn.rollback()
+    return version
+
+
+def apply_migrations(conn):
+    """Apply pending migrations in order. Returns the list of versions applied."""
+    cur = conn.cursor()
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+    conn.commit()
+
+    applied = []
+    for version, name, migrate in MIGRATIONS:
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+        cur.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (version,))
+        if cur.fetchone():
+            conn.commit()
+            continue
+        try:
+            migrate(conn)
+            cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"Applied migration {version}: {name}")
+        applied.append(version)
+    return applied
+
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+@app.before_request
+def check_schema_once():
+    """Bring the schema up to date on the first request this process serves.
+
+    After the first successful check this is a flag test — request handlers
+    never run DDL. Set AUTO_MIGRATE=false to only report pending migrations.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        try:
+            with db_pool.connection() as conn:
+                if get_schema_version(conn) < SCHEMA_VERSION:
+                    if os.environ.get('AUTO_MIGRATE', 'true').lower() == 'false':
+                        print(f"Database schema is behind (latest is {SCHEMA_VERSION}); run 'flask migrate'")
+                        return
+                    apply_migrations(conn)
+            _schema_ready = True
+        except Exception as e:
+            # Leave the flag unset so the next request retries; the handler
+            # itself will report the database error.
+            print(f"Schema check failed: {e}")
+
+
+def _delete_in_batches(conn, table, key, where, params=(), returning=None, on_batch=None, batch_size=None):
+    """DELETE FROM ``table`` WHERE ``where``, QUEUE_DELETE_BATCH rows (picked
+    by their ``key`` columns) per committed transaction, so no delete holds
+    more than a batch of row locks or WAL at once. ``on_batch(cur, rows)``
+    runs inside each batch's transaction with its RETURNING ``returning``
+    rows. Returns the number of rows deleted."""
+    batch_size = batch_size or QUEUE_DELETE_BATCH
+    cur = conn.cursor()
+    deleted = 0
+    while True:
+        cur.execute(f"""
+            DELETE FROM {table} WHERE ({key}) IN (
+                SELECT {key} FROM {table} WHERE {where} LIMIT {int(batch_size)}
+            )
+            RETURNING {returning or key}
+        """, params)
+        rows = cur.fetchall()
+        if on_batch and rows:
+            on_batch(cur, rows)
+        conn.commit()
+        deleted += len(rows)
+        if len(rows) < batch_size:
+            return deleted
+
+
+def maintain_queue_partitions(conn, retention_days=None):
+    """ensure_queue_partitions() plus retention of the live day partitions,
+    queue_history, queue_events and queue_ids, and dropping past day
+    partitions the archiver has emptied; returns (created, dropped). Run by
+    the rollover worker each day and by 'flask partitions', never from a
+    request, since DROP TABLE locks the whole queue.
+
+    Old live tickets go a whole day partition at a time. queue_history,
+    queue_events and queue_ids are plain tables, so their expired rows are
+    deleted in committed batches instead.
+    """
+    retention_days = QUEUE_RETENTION_DAYS if retention_days is None else retention_days
+    created = ensure_queue_partitions(conn)
+    dropped = []
+    if retention_days > 0:
+        before_day = datetime.now().date() - timedelta(days=retention_days)
+        dropped = drop_queue_partitions(conn, before_day)
+        conn.commit()
+        cutoff = (_day_range(before_day)[0],)
+        for table, key, column in (('queue_history', 'seq', 'created_at'), ('queue_events', 'id', 'at'),
+                                   ('queue_ids', 'id', 'created_at')):
+            dropped.append((table, _delete_in_batches(conn, table, key, f"{column} < %s", cutoff)))
+    dropped += drop_queue_partitions(conn, datetime.now().date(), only_empty=True)
+    return created, dropped
+
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations: flask --app api/index.py migrate"""
+    with db_pool.connection() as conn:
+        applied = apply_migrations(conn)
+        version = get_schema_version(conn)
+    print(f"Schema at version {version} ({len(applied)} migration(s) applied)")
+
+
+@app.cli.command('partitions')
+@click.option('--retention-days', type=int, help='Drop day partitions older than this (default QUEUE_RETENTION_DAYS)')
+def partitions_command(retention_days):
+    """Create upcoming queue partitions and drop expired ones."""
+    with db_pool.connection() as conn:
+        created, dropped = maintain_queue_partitions(conn, retention_days)
+        conn.commit()
+    print(f"Created {len(created)} partition(s); dropped {len(dropped)} "
+          f"({sum(n for _, n in dropped)} queue rows)")
 
 
 # =================================================================
@@ -387,9 +1700,11 @@ def init_schema_endpoint():
     if not conn:
         return jsonify({"error": "Database connection failed"}), 500
     try:
-        ensure_schema(conn)
+        applied = apply_migrations(conn)
+        version = get_schema_version(conn)
         conn.close()
-        return jsonify({"success": True, "message": "Schema initialized"})
+        return jsonify({"success": True, "message": "Schema initialized",
+                        "applied": applied, "version": version})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -405,7 +1720,6 @@ def list_institutions():
         return jsonify({"error": "Database connection failed"}), 500
     try:
         cur = conn.cursor()
-        ensure_schema(conn)
         show_all = request.args.get('all', 'false') == 'true'
         if show_all:
             cur.execute("SELECT id, name, slug, type, logo_url, description, is_active, created_at FROM institutions ORDER BY name")
@@ -443,7 +1757,6 @@ def create_institution():
             return jsonify({"success": False, "error": "Slug must contain only lowercase letters, numbers, and hyphens"}), 400
 
         cur = conn.cursor()
-        ensure_schema(conn)
         cur.execute("""
             INSERT INTO institutions (name, slug, type, logo_url, description)
             VALUES (%s, %s, %s, %s, %s) RETURNING id
@@ -536,7 +1849,6 @@ def list_services(inst_id):
         return jsonify({"error": "Database connection failed"}), 500
     try:
         cur = conn.cursor()
-        ensure_schema(conn)
         cur.execute("""
             SELECT id, name, prefix, description, icon, is_active, display_order
             FROM services WHERE institution_id = %s AND is_active = TRUE
@@ -716,6 +2028,74 @@ def delete_admin(user_id):
 # AUTHENTICATION
 # =================================================================
 
+# Lifetime of the bearer token /auth/login hands out
+ADMIN_SESSION_HOURS = float(os.environ.get('ADMIN_SESSION_HOURS', 12))
+ADMIN_ROLES = ('super-admin', 'institution-admin', 'service-admin')
+
+
+def _token_hash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _bearer_token():
+    header = request.headers.get('Authorization', '')
+    scheme, _, token = header.partition(' ')
+    return token.strip() if scheme.lower() == 'bearer' and token.strip() else None
+
+
+def _session_user(cur):
+    """The user behind the request's bearer token, or None."""
+    token = _bearer_token()
+    if not token:
+        return None
+    cur.execute("""
+        SELECT u.id, u.username, u.role, u.institution_id, u.service_id
+        FROM admin_sessions s JOIN users u ON u.id = s.user_id
+        WHERE s.token_hash = %s AND s.expires_at > NOW()
+    """, (_token_hash(token),))
+    row = cur.fetchone()
+    if not row:
+        return None
+    return dict(zip(('id', 'username', 'role', 'institution_id', 'service_id'), row))
+
+
+def require_admin(*roles):
+    """Route decorator: 401 without a live admin session, 403 if the user's
+    role is not in ``roles`` (any admin role when none are given). The
+    session user is available to the view as ``g.admin``.
+    """
+    allowed = roles or ADMIN_ROLES
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            conn = get_db_connection()
+            if not conn:
+                return jsonify({"success": False, "error": "Database connection failed"}), 500
+            try:
+                user = _session_user(conn.cursor())
+            finally:
+                conn.close()
+            if not user:
+                return jsonify({"success": False, "error": "Authentication required"}), 401
+            if user['role'] not in allowed:
+                return jsonify({"success": False, "error": "Not permitted for this role"}), 403
+            g.admin = user
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _admin_scope():
+    """(WHERE fragment, params) limiting queue rows to what g.admin may touch."""
+    admin = g.admin
+    if admin['role'] == 'super-admin':
+        return "TRUE", []
+    if admin['role'] == 'institution-admin':
+        return "institution_id = %s", [admin['institution_id']]
+    return "service_id = %s", [admin['service_id']]
+
+
 @app.route('/auth/login', methods=['POST'])
 def login():
     conn = get_db_connection()
@@ -731,7 +2111,6 @@ def login():
             return jsonify({"success": False, "error": "Username and password required"}), 400
 
         cur = conn.cursor()
-        ensure_schema(conn)
 
         if institution_id:
             cur.execute("""
@@ -752,16 +2131,24 @@ def login():
             """, (username,))
 
         user = cur.fetchone()
-        conn.close()
 
-        if not user:
+        if not user or not verify_password(password, user[2]):
+            conn.close()
             return jsonify({"success": False, "error": "Invalid credentials"}), 401
 
-        if not verify_password(password, user[2]):
-            return jsonify({"success": False, "error": "Invalid credentials"}), 401
+        token = secrets.token_urlsafe(32)
+        cur.execute("DELETE FROM admin_sessions WHERE expires_at <= NOW()")
+        cur.execute("""
+            INSERT INTO admin_sessions (token_hash, user_id, expires_at)
+            VALUES (%s, %s, NOW() + %s * interval '1 hour')
+        """, (_token_hash(token), user[0], ADMIN_SESSION_HOURS))
+        conn.commit()
+        conn.close()
 
         return jsonify({
             "success": True,
+            "token": token,
+            "expires_in": int(ADMIN_SESSION_HOURS * 3600),
             "user": {
                 "id": user[0],
                 "username": user[1],
@@ -780,15 +2167,32 @@ def login():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/auth/logout', methods=['POST'])
+def logout():
+    """End the bearer token's session; a missing or stale token is not an error."""
+    token = _bearer_token()
+    if token:
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({"success": False, "error": "Database connection failed"}), 500
+        try:
+            conn.cursor().execute("DELETE FROM admin_sessions WHERE token_hash = %s", (_token_hash(token),))
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+    return jsonify({"success": True})
+
+
 @app.route('/auth/init', methods=['GET'])
 def init_auth():
     conn = get_db_connection()
     if not conn:
         return jsonify({"error": "Database connection failed"}), 500
     try:
-        ensure_schema(conn)
+        applied = apply_migrations(conn)
         conn.close()
-        return jsonify({"success": True, "message": "Auth tables initialized"})
+        return jsonify({"success": True, "message": "Auth tables initialized", "applied": applied})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -854,10 +2258,899 @@ def change_password():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+# =================================================================
+# HOURLY ROLLUP
+# =================================================================
+# queue_hourly_rollup holds one row per (institution, service, hour) with
+# event counts and summed durations. Mutation handlers bump it in their own
+# transaction via _queue_changed(); backfill_hourly_rollup() rebuilds it
+# from the queue table. "served" counts completions that have a called_at,
+# i.e. the denominator for service_seconds.
+
+ROLLUP_FIELDS = ('created', 'called', 'completed', 'served', 'wait_seconds', 'service_seconds')
+
+
+def _hour(ts):
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def _bump_hourly_rollup(cur, action, rows):
+    """Add the effect of ``action`` on ``rows`` (dicts from CHANGE_RETURNING) to the rollup."""
+    deltas = {}
+    for r in rows:
+        if not r['service_id'] or not r['institution_id']:
+            continue
+        if action == 'created':
+            ts, delta = r['created_at'], {'created': 1}
+        elif action == 'called' and r['called_at']:
+            ts, delta = r['called_at'], {'called': 1}
+            if r['created_at']:
+                delta['wait_seconds'] = (r['called_at'] - r['created_at']).total_seconds()
+        elif action == 'completed' and r['completed_at']:
+            ts, delta = r['completed_at'], {'completed': 1}
+            if r['called_at']:
+                delta['served'] = 1
+                delta['service_seconds'] = (r['completed_at'] - r['called_at']).total_seconds()
+        else:
+            continue
+        acc = deltas.setdefault((r['institution_id'], r['service_id'], _hour(ts)), dict.fromkeys(ROLLUP_FIELDS, 0))
+        for k, v in delta.items():
+            acc[k] += v
+    if not deltas:
+        return
+    psycopg2.extras.execute_values(cur, f"""
+        INSERT INTO queue_hourly_rollup AS r
+            (institution_id, service_id, bucket, {', '.join(ROLLUP_FIELDS)})
+        VALUES %s
+        ON CONFLICT (institution_id, service_id, bucket) DO UPDATE SET
+            {', '.join(f'{f} = r.{f} + EXCLUDED.{f}' for f in ROLLUP_FIELDS)}
+    """, [key + tuple(acc[f] for f in ROLLUP_FIELDS) for key, acc in deltas.items()])
+
+
+def backfill_hourly_rollup(conn, start=None, end=None, source='queue_events', institution_id=None):
+    """Rebuild rollup buckets in [start, end) (default: everything), optionally
+    for one institution only. Returns the number of buckets written.
+
+    ``source`` is the queue_events log, which sees every call just as the
+    live counters do, or for migrations predating it a ticket table ('queue',
+    'queue_all'), where only a ticket's latest call is visible and repeated
+    calls collapse to one.
+    """
+    start = _hour(start) if start else datetime(1970, 1, 1)
+    end = end or datetime(9999, 1, 1)
+    if _hour(end) != end:
+        end = _hour(end) + timedelta(hours=1)
+    only = "AND institution_id = %(inst)s" if institution_id else ""
+    cur = conn.cursor()
+    cur.execute(f"DELETE FROM queue_hourly_rollup WHERE bucket >= %(start)s AND bucket < %(end)s {only}",
+                {'start': start, 'end': end, 'inst': institution_id})
+    cur.execute(f"""
+        INSERT INTO queue_hourly_rollup
+            (institution_id, service_id, bucket, created, called, completed, served, wait_seconds, service_seconds)
+        SELECT s.institution_id, e.service_id, e.bucket,
+               SUM(e.created), SUM(e.called), SUM(e.completed), SUM(e.served),
+               SUM(e.wait_seconds), SUM(e.service_seconds)
+        FROM ({_rollup_events_sql(source)}) e
+        JOIN services s ON s.id = e.service_id
+        WHERE TRUE {only.replace('institution_id', 's.institution_id')}
+        GROUP BY s.institution_id, e.service_id, e.bucket
+    """, {'start': start, 'end': end, 'inst': institution_id})
+    return cur.rowcount
+
+
+def _rollup_events_sql(source):
+    """Rows of (service_id, bucket, created, called, completed, served,
+    wait_seconds, service_seconds) in [%(start)s, %(end)s) for backfill_hourly_rollup()."""
+    if source == 'queue_events':
+        # Wait = call - creation, service = completion - the call before it,
+        # both looked up within the ticket's own events
+        return """
+            SELECT service_id, date_trunc('hour', at) AS bucket,
+                   (type = 'created')::int AS created, (type = 'called')::int AS called,
+                   (type = 'completed')::int AS completed,
+                   (type = 'completed' AND last_call IS NOT NULL)::int AS served,
+                   CASE WHEN type = 'called' THEN COALESCE(EXTRACT(EPOCH FROM at - created_at), 0)
+                        ELSE 0 END::float8 AS wait_seconds,
+                   CASE WHEN type = 'completed' THEN COALESCE(EXTRACT(EPOCH FROM at - last_call), 0)
+                        ELSE 0 END::float8 AS service_seconds
+            FROM (
+                SELECT e.service_id, e.type, e.at,
+                       MIN(e.at) FILTER (WHERE e.type = 'created') OVER (PARTITION BY e.queue_id) AS created_at,
+                       MAX(e.at) FILTER (WHERE e.type = 'called')
+                           OVER (PARTITION BY e.queue_id ORDER BY e.id ROWS UNBOUNDED PRECEDING) AS last_call
+                FROM queue_events e
+                WHERE e.queue_id IN (
+                    SELECT queue_id FROM queue_events
+                    WHERE at >= %(start)s AND at < %(end)s AND type IN ('created', 'called', 'completed'))
+            ) t
+            WHERE at >= %(start)s AND at < %(end)s AND type IN ('created', 'called', 'completed')
+        """
+    return f"""
+        SELECT service_id, date_trunc('hour', created_at) AS bucket,
+               1 AS created, 0 AS called, 0 AS completed, 0 AS served,
+               0::float8 AS wait_seconds, 0::float8 AS service_seconds
+        FROM {source} WHERE created_at >= %(start)s AND created_at < %(end)s
+        UNION ALL
+        SELECT service_id, date_trunc('hour', called_at), 0, 1, 0, 0,
+               COALESCE(EXTRACT(EPOCH FROM called_at - created_at), 0)::float8, 0
+        FROM {source} WHERE called_at >= %(start)s AND called_at < %(end)s
+        UNION ALL
+        SELECT service_id, date_trunc('hour', completed_at), 0, 0, 1,
+               (called_at IS NOT NULL)::int, 0,
+               COALESCE(EXTRACT(EPOCH FROM completed_at - called_at), 0)::float8
+        FROM {source} WHERE completed_at >= %(start)s AND completed_at < %(end)s
+    """
+
+
+@app.cli.command('rollup-backfill')
+@click.option('--from', 'date_from', help='First day to rebuild (YYYY-MM-DD); default: all history')
+@click.option('--to', 'date_to', help='Last day to rebuild (YYYY-MM-DD), inclusive')
+def rollup_backfill_command(date_from, date_to):
+    """Rebuild queue_hourly_rollup from the queue_events log."""
+    start = _day_range(parse_date(date_from))[0] if date_from else None
+    end = _day_range(parse_date(date_to))[1] if date_to else None
+    with db_pool.connection() as conn:
+        buckets = backfill_hourly_rollup(conn, start, end)
+        conn.commit()
+    print(f"Rebuilt {buckets} rollup bucket(s)")
+
+
+# =================================================================
+# QUEUE ENGINE
+# =================================================================
+
+class ServiceQueue:
+    """Today's active tickets of one service, as loaded at ``version``.
+
+    ``tickets`` maps queue id -> [seq, number, called, present, muted, accessed];
+    ``waiting`` is the sorted list of waiting seqs (position = bisect + 1)
+    and ``called`` keeps called ids in call order (last = now serving).
+    ``loaded`` is the version the rows were read at, ``seen`` the (queue id,
+    action) pairs applied per later version, and ``pending`` events that
+    arrived ahead of a missing version, held from ``gap_since``.
+    """
+
+    __slots__ = ('service_id', 'day', 'version', 'tickets', 'waiting', 'by_seq', 'called', 'last_completed',
+                 'loaded', 'seen', 'pending', 'gap_since')
+
+    def __init__(self, service_id, day, version, rows, last_completed):
+        self.service_id = service_id
+        self.day = day
+        self.version = version
+        self.tickets = {}
+        self.waiting = []
+        self.by_seq = {}
+        self.called = {}
+        self.last_completed = last_completed
+        self.loaded = version
+        self.seen = {}
+        self.pending = {}
+        self.gap_since = None
+        for queue_id, seq, number, called, present, muted, accessed in rows:
+            self._add(queue_id, seq, number, bool(called), bool(present), bool(muted), bool(accessed))
+
+    def _add(self, queue_id, seq, number, called=False, present=False, muted=False, accessed=False):
+        self.tickets[queue_id] = [seq, number, called, present, muted, accessed]
+        self.by_seq[seq] = queue_id
+        if called:
+            self.called[queue_id] = True
+        else:
+            bisect.insort(self.waiting, seq)
+
+    def _unwait(self, seq):
+        i = bisect.bisect_left(self.waiting, seq)
+        if i < len(self.waiting) and self.waiting[i] == seq:
+            del self.waiting[i]
+
+    def apply(self, event):
+        """Apply one change-bus event. Not idempotent ('called' moves the
+        ticket to the end of the call order): QueueEngine drops replays."""
+        queue_id, action = event.get('q'), event.get('a')
+        t = self.tickets.get(queue_id)
+        if action == 'created':
+            if t is None and event.get('sq') is not None:
+                self._add(queue_id, event['sq'], event.get('n'))
+        elif t is None:
+            return
+        elif action == 'called':
+            self._unwait(t[0])
+            t[2] = True
+            self.called.pop(queue_id, None)
+            self.called[queue_id] = True
+        elif action == 'returned':
+            if t[2]:
+                t[2] = False
+                self.called.pop(queue_id, None)
+                bisect.insort(self.waiting, t[0])
+        elif action in ('completed', 'expired'):
+            self._unwait(t[0])
+            self.called.pop(queue_id, None)
+            self.by_seq.pop(t[0], None)
+            del self.tickets[queue_id]
+            if action == 'completed':
+                self.last_completed = t[1]
+        elif action in ('present', 'absent'):
+            t[3] = action == 'present'
+        elif action in ('muted', 'unmuted'):
+            t[4] = action == 'muted'
+        elif action == 'accessed':
+            t[5] = True
+
+    def state(self, queue_id):
+        t = self.tickets.get(queue_id)
+        if t is None:
+            return None
+        seq, number, called, present, muted, accessed = t
+        serving = self.tickets[next(reversed(self.called))][1] if self.called else None
+        return {
+            "number": number, "service_id": self.service_id, "version": self.version,
+            "called": called, "completed": False, "is_present": present, "is_muted": muted,
+            "accessed": accessed,
+            "position": 0 if called else bisect.bisect_left(self.waiting, seq) + 1,
+            "current_serving": serving, "last_completed_queue": self.last_completed,
+            "waiting_count": len(self.waiting),
+        }
+
+    def snapshot(self):
+        """Comparable form used by the consistency check."""
+        return {
+            "tickets": {k: list(v) for k, v in self.tickets.items()},
+            "waiting": [self.by_seq.get(seq) for seq in self.waiting],
+            "last_completed": self.last_completed,
+        }
+
+
+class QueueEngine:
+    """Per-worker, in-memory view of every active service's live queue.
+
+    Services load lazily on first read; Postgres stays the source of truth
+    (mutation handlers write it first, then the engine applies the committed
+    change from the request or from the change bus). Events carry the service
+    version. Each one arrives twice (from the request and as the NOTIFY
+    echo), so an event already applied at its version is dropped. Events
+    ahead of a missing version wait in ``pending`` until it arrives, and
+    reads fall back to SQL meanwhile; a gap still open after ``gap_timeout``
+    seconds, or more than ``max_pending`` versions waiting, means an event
+    was lost and the service reloads. The engine is only trusted while the
+    LISTEN connection is up — otherwise other workers' changes would go
+    unseen — and reads fall back to SQL.
+    """
+
+    def __init__(self, listener, pool, enabled=True, gap_timeout=5.0, max_pending=256, seen_versions=64):
+        self._listener = listener
+        self._pool = pool
+        self.enabled = enabled
+        self.gap_timeout = gap_timeout
+        self.max_pending = max_pending
+        self.seen_versions = seen_versions
+        self._lock = threading.RLock()
+        self._services = {}
+        self._loading = {}        # service_id -> events buffered while loading
+        self._index = {}          # queue id -> service_id, for loaded services
+        self._stats = {'loads': 0, 'hits': 0, 'misses': 0, 'gaps': 0, 'events': 0, 'replays': 0,
+                       'reordered': 0}
+
+    @property
+    def active(self):
+        return self.enabled and self._listener.connected
+
+    def reset(self):
+        with self._lock:
+            self._services.clear()
+            self._index.clear()
+            self._loading.clear()
+
+    def invalidate(self, service_id):
+        with self._lock:
+            sq = self._services.pop(service_id, None)
+            if sq:
+                for queue_id in sq.tickets:
+                    self._index.pop(queue_id, None)
+
+    def _fetch(self, service_id, day):
+        day_start, day_end = _day_range(day)
+        with self._pool.connection() as conn:
+            cur = conn.cursor()
+            # One snapshot for the version and the rows it describes
+            cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY")
+            cur.execute("SELECT COALESCE((SELECT version FROM service_versions WHERE service_id = %s), 0)",
+                        (service_id,))
+            version = cur.fetchone()[0]
+            cur.execute(f"""
+                SELECT id, seq, number, {QUEUE_FLAG_COLUMNS['called']}, is_present, is_muted, accessed FROM queue
+                WHERE service_id = %s AND created_at >= %s AND created_at < %s
+                  AND {QUEUE_STATUS_FILTERS['active']}
+                ORDER BY seq
+            """, (service_id, day_start, day_end))
+            rows = cur.fetchall()
+            cur.execute("""
+                SELECT number FROM queue
+                WHERE service_id = %s AND completed_at >= %s AND completed_at < %s
+                ORDER BY completed_at DESC LIMIT 1
+            """, (service_id, day_start, day_end))
+            last = cur.fetchone()
+            conn.rollback()
+        return ServiceQueue(service_id, day, version, rows, last[0] if last else None)
+
+    def service(self, service_id):
+        """The loaded ServiceQueue for today, loading it if needed (None when inactive)."""
+        if not self.active:
+            return None
+        today = datetime.now().date()
+        with self._lock:
+            sq = self._services.get(service_id)
+            if sq is not None and sq.gap_since is not None and time.monotonic() - sq.gap_since > self.gap_timeout:
+                self._stats['gaps'] += 1
+                self.invalidate(service_id)
+                sq = None
+            if sq is not None and sq.day == today:
+                return sq
+            if service_id in self._loading:
+                return None  # another thread is loading it; read from SQL meanwhile
+            if sq is not None:
+                self.invalidate(service_id)
+            self._loading[service_id] = []
+        try:
+            sq = self._fetch(service_id, today)
+        except Exception:
+            with self._lock:
+                self._loading.pop(service_id, None)
+            raise
+        with self._lock:
+            self._services[service_id] = sq
+            for queue_id in sq.tickets:
+                self._index[queue_id] = service_id
+            for event in self._loading.pop(service_id, []):
+                self._apply(event)
+            self._stats['loads'] += 1
+        return self._services.get(service_id)
+
+    def apply(self, event):
+        """Apply a committed change-bus event (from this request or another worker)."""
+        if not event.get('s'):
+            return
+        with self._lock:
+            self._stats['events'] += 1
+            if event['s'] in self._loading:
+                self._loading[event['s']].append(event)
+                return
+            self._apply(event)
+
+    def _apply(self, event):
+        service_id, version = event['s'], event.get('v') or 0
+        sq = self._services.get(service_id)
+        if sq is None or version <= sq.loaded:
+            return
+        if (event.get('q'), event.get('a')) in sq.seen.get(version, ()):
+            self._stats['replays'] += 1
+            return
+        if event.get('q') is None or version < sq.version or (
+                version > sq.version + 1 and len(sq.pending) >= self.max_pending):
+            # Service-wide change (e.g. delete), an event from a version already
+            # passed, or a gap that is not closing: reload on next read
+            if event.get('q') is not None:
+                self._stats['gaps'] += 1
+            self.invalidate(service_id)
+            return
+        if version > sq.version + 1:
+            self._stats['reordered'] += 1
+            sq.pending.setdefault(version, []).append(event)
+            if sq.gap_since is None:
+                sq.gap_since = time.monotonic()
+            return
+        self._step(sq, event)
+        while sq.version + 1 in sq.pending:
+            for held in sq.pending.pop(sq.version + 1):
+                if (held.get('q'), held.get('a')) not in sq.seen.get(held['v'], ()):
+                    self._step(sq, held)
+        if not sq.pending:
+            sq.gap_since = None
+
+    def _step(self, sq, event):
+        """Apply the next event of a service (its version is current or next)."""
+        version, queue_id = event['v'], event['q']
+        sq.seen.setdefault(version, set()).add((queue_id, event.get('a')))
+        if len(sq.seen) > self.seen_versions:
+            del sq.seen[min(sq.seen)]
+        sq.apply(event)
+        sq.version = version
+        if queue_id in sq.tickets:
+            self._index[queue_id] = sq.service_id
+        else:
+            self._index.pop(queue_id, None)
+
+    def ticket(self, queue_id, service_id=None):
+        """Live state of an active ticket from memory, or None (use SQL)."""
+        if not self.active:
+            return None
+        if service_id is None:
+            with self._lock:
+                service_id = self._index.get(queue_id)
+        if service_id is None:
+            self._stats['misses'] += 1
+            return None
+        sq = self.service(service_id)
+        with self._lock:
+            # Behind a missing version, memory is not current: read from SQL
+            state = sq.state(queue_id) if sq and not sq.pending else None
+        self._stats['hits' if state else 'misses'] += 1
+        return state
+
+    def check(self, repair=False):
+        """Compare every loaded service with a fresh load from the database."""
+        with self._lock:
+            loaded = dict(self._services)
+        report = []
+        for service_id, sq in loaded.items():
+            fresh = self._fetch(service_id, sq.day)
+            with self._lock:
+                mine = sq.snapshot()
+            theirs = fresh.snapshot()
+            consistent = mine == theirs or fresh.version != sq.version
+            entry = {"service_id": service_id, "version": sq.version, "db_version": fresh.version,
+                     "tickets": len(mine['tickets']), "consistent": consistent}
+            if not consistent:
+                entry["memory"], entry["database"] = mine, theirs
+                if repair:
+                    self.invalidate(service_id)
+            report.append(entry)
+        return report
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, active=self.active, services=len(self._services),
+                        tickets=len(self._index))
+
+
+queue_engine = QueueEngine(db_listener, db_pool,
+                           enabled=os.environ.get('QUEUE_ENGINE', 'true').lower() != 'false')
+
+
+# =================================================================
+# ACCESS RECORDER
+# =================================================================
+
+class AccessRecorder:
+    """Coalesces repeat page visits into one batched accessed_at UPDATE per interval.
+
+    record() only touches memory; a daemon thread writes the latest visit
+    time of every ticket seen since the last flush in a single statement.
+    """
+
+    def __init__(self, pool, interval=10.0):
+        self._pool = pool
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._thread = None
+        self._stats = {'recorded': 0, 'flushes': 0, 'rows_flushed': 0, 'errors': 0}
+
+    def record(self, queue_id):
+        with self._lock:
+            self._pending[queue_id] = datetime.now()
+            self._stats['recorded'] += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='access-flusher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        try:
+            with self._pool.connection() as conn:
+                psycopg2.extras.execute_values(conn.cursor(), """
+                    UPDATE queue AS q SET accessed_at = v.ts
+                    FROM (VALUES %s) AS v(id, ts) JOIN queue_ids i ON i.id = v.id
+                    WHERE q.id = v.id AND q.created_at = i.created_at
+                      AND (q.accessed_at IS NULL OR q.accessed_at < v.ts)
+                """, list(batch.items()), template="(%s, %s::timestamp)")
+                conn.commit()
+        except Exception as e:
+            print(f"Access flush failed: {e}")
+            with self._lock:
+                for queue_id, ts in batch.items():
+                    self._pending.setdefault(queue_id, ts)
+                self._stats['errors'] += 1
+            return 0
+        with self._lock:
+            self._stats['flushes'] += 1
+            self._stats['rows_flushed'] += len(batch)
+        return len(batch)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, pending=len(self._pending), interval=self.interval)
+
+
+access_recorder = AccessRecorder(db_pool, interval=float(os.environ.get('ACCESS_FLUSH_SECONDS', 10)))
+atexit.register(access_recorder.flush)
+
+
+def _record_access(conn, queue_id, already_accessed):
+    """Record a ticket page visit. The first one sets ``accessed`` in its own
+    small transaction and publishes an 'accessed' change (the kiosk waits on
+    it); later ones only go to the batched flusher."""
+    if already_accessed:
+        access_recorder.record(queue_id)
+        return
+    conn.set_session(readonly=False, autocommit=False)
+    cur = conn.cursor()
+    cur.execute(f"""
+        UPDATE queue SET accessed = TRUE, accessed_at = NOW()
+        WHERE {_by_queue_id()} AND accessed IS NOT TRUE
+        RETURNING {CHANGE_RETURNING}
+    """, (queue_id,))
+    rows = _change_rows(cur)
+    if rows:
+        _queue_changed(cur, 'accessed', rows)
+    conn.commit()
+
+
+# =================================================================
+# QUEUE ARCHIVE
+# =================================================================
+
+# Columns moved from queue into queue_history
+HISTORY_COLUMNS = ['id', 'seq', 'institution_id', 'service_id', 'number', 'person', 'date', 'time', 'state',
+                   'created_at', 'called_at', 'completed_at', 'is_present', 'accessed']
+
+
+class QueueArchiver:
+    """Moves finished tickets out of the live queue table into queue_history.
+
+    A finished (completed or expired) ticket from before today is archived
+    once it has been finished for ``after_hours``; waiting and called ones
+    stay until the rollover expires them. Rows move in batches of
+    ``batch_size``, each its own short transaction with SKIP LOCKED, so live
+    traffic never waits on the archiver. It only moves rows: emptied day
+    partitions are dropped by maintain_queue_partitions(). Today's tickets
+    always stay live; history readers use the queue_all view.
+    """
+
+    def __init__(self, pool, after_hours=24, batch_size=500, interval=600.0):
+        self._pool = pool
+        self.after_hours = after_hours
+        self.batch_size = batch_size
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {'runs': 0, 'archived': 0, 'errors': 0, 'last_run': None}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='queue-archiver', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.run()
+            except Exception as e:
+                print(f"Queue archive failed: {e}")
+                with self._lock:
+                    self._stats['errors'] += 1
+
+    def is_running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def run(self, max_batches=None):
+        """Archive every eligible ticket; returns the number moved. A row that
+        cannot be inserted into queue_history fails its whole batch, so it
+        stays in queue rather than being deleted."""
+        today = _day_range(datetime.now().date())[0]
+        cutoff = datetime.now() - timedelta(hours=self.after_hours)
+        cols = ', '.join(HISTORY_COLUMNS)
+        total, batches = 0, 0
+        with self._pool.connection() as conn:
+            cur = conn.cursor()
+            while max_batches is None or batches < max_batches:
+                cur.execute(f"""
+                    WITH batch AS (
+                        SELECT seq, created_at FROM queue
+                        WHERE created_at < %(today)s
+                          AND {QUEUE_STATUS_FILTERS['completed']}
+                          AND COALESCE(completed_at, created_at) < %(cutoff)s
+                        ORDER BY created_at LIMIT %(limit)s
+                        FOR UPDATE SKIP LOCKED
+                    ), moved AS (
+                        DELETE FROM queue q USING batch b
+                        WHERE q.seq = b.seq AND q.created_at = b.created_at
+                        RETURNING q.*
+                    ), archived AS (
+                        INSERT INTO queue_history ({cols})
+                        SELECT {cols} FROM moved
+                    )
+                    SELECT COUNT(*) FROM moved
+                """, {'today': today, 'cutoff': cutoff, 'limit': self.batch_size})
+                moved = cur.fetchone()[0]
+                conn.commit()
+                total += moved
+                batches += 1
+                if moved < self.batch_size:
+                    break
+        with self._lock:
+            self._stats['runs'] += 1
+            self._stats['archived'] += total
+            self._stats['last_run'] = datetime.now().isoformat()
+        return total
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, after_hours=self.after_hours, batch_size=self.batch_size,
+                        interval=self.interval, running=self.is_running())
+
+
+queue_archiver = QueueArchiver(
+    db_pool,
+    after_hours=float(os.environ.get('QUEUE_ARCHIVE_AFTER_HOURS', 24)),
+    batch_size=int(os.environ.get('QUEUE_ARCHIVE_BATCH', 500)),
+    interval=float(os.environ.get('QUEUE_ARCHIVE_INTERVAL_SECONDS', 600)),
+)
+
+
+@app.before_request
+def start_background_workers():
+    """Start the archive and rollover threads once the schema is in place
+    (QUEUE_ARCHIVE=false / ROLLOVER=false disable them)."""
+    if not _schema_ready:
+        return
+    if not queue_archiver.is_running() and os.environ.get('QUEUE_ARCHIVE', 'true').lower() != 'false':
+        queue_archiver.start()
+    if not rollover_worker.is_running() and os.environ.get('ROLLOVER', 'true').lower() != 'false':
+        rollover_worker.start()
+
+
+@app.cli.command('archive')
+@click.option('--after-hours', type=float, help='Override QUEUE_ARCHIVE_AFTER_HOURS')
+def archive_command(after_hours):
+    """Move finished tickets from queue into queue_history."""
+    if after_hours is not None:
+        queue_archiver.after_hours = after_hours
+    moved = queue_archiver.run()
+    print(f"Archived {moved} ticket(s)")
+
+
+@app.route('/admin/archive/run', methods=['POST'])
+@require_admin('super-admin')
+def run_archive_endpoint():
+    """Run the archiver now and return its counters."""
+    try:
+        moved = queue_archiver.run()
+        return jsonify({"success": True, "archived": moved, "archiver": queue_archiver.stats()})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+# =================================================================
+# DAY ROLLOVER
+# =================================================================
+
+def rollover_institution(conn, institution_id, day=None, force=False):
+    """Close out the days before ``day`` (default today) for one institution.
+
+    In one transaction: expire every unfinished ticket from before ``day``
+    (state expired, no completed_at, so it counts as neither served nor
+    waiting), rebuild the rollup buckets of every day closed since
+    the institution's last finished rollover (just the previous day, unless
+    one was missed; never today's live buckets), and open ``day``'s
+    numbering counters at zero. The day is claimed in
+    rollover_runs, so across workers it runs once unless ``force`` is set.
+    Returns a summary, or None if the day was already rolled over.
+
+    Days come from the database's CURRENT_DATE, like the counters
+    create_queue reads and the created_at stamps, not from this server's
+    clock; a live counter (today's) is never deleted.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT CURRENT_DATE")
+    today = cur.fetchone()[0]
+    day = day or today
+    day_start = _day_range(day)[0]
+    cur.execute("""
+        INSERT INTO rollover_runs (institution_id, day) VALUES (%s, %s)
+        ON CONFLICT (institution_id, day) DO UPDATE SET started_at = NOW(), finished_at = NULL
+            WHERE %s
+        RETURNING 1
+    """, (institution_id, day, force))
+    if not cur.fetchone():
+        conn.rollback()
+        return None
+    cur.execute(f"""
+        UPDATE queue SET state = {STATE_EXPIRED}
+        WHERE institution_id = %s AND created_at < %s AND {QUEUE_STATUS_FILTERS['active']}
+        RETURNING {CHANGE_RETURNING}
+    """, (institution_id, day_start))
+    rows = _change_rows(cur)
+    if rows:
+        _queue_changed(cur, 'expired', rows, 'rollover')
+    cur.execute("""
+        SELECT MAX(day) FROM rollover_runs
+        WHERE institution_id = %s AND day < %s AND finished_at IS NOT NULL
+    """, (institution_id, day))
+    last_day = cur.fetchone()[0]
+    rebuild_from = _day_range(last_day)[0] if last_day else day_start - timedelta(days=1)
+    rebuild_to = min(day_start, _day_range(today)[0])
+    buckets = 0
+    if rebuild_from < rebuild_to:
+        buckets = backfill_hourly_rollup(conn, rebuild_from, rebuild_to, institution_id=institution_id)
+    cur.execute("""
+        INSERT INTO queue_counters (institution_id, service_id, day, last_value)
+        SELECT institution_id, id, %s, 0 FROM services WHERE institution_id = %s
+        ON CONFLICT (institution_id, service_id, day) DO NOTHING
+    """, (day, institution_id))
+    cur.execute("DELETE FROM queue_counters WHERE institution_id = %s AND day < %s",
+                (institution_id, min(day, today)))
+    cur.execute("""
+        UPDATE rollover_runs SET finished_at = NOW(), expired = %s WHERE institution_id = %s AND day = %s
+    """, (len(rows), institution_id, day))
+    conn.commit()
+    return {"institution_id": institution_id, "day": day.isoformat(), "expired": len(rows),
+            "rollup_buckets": buckets}
+
+
+def warm_institution_caches(conn, institution_id):
+    """Load this worker's per-service caches (versions, presence, queue
+    engine) for the institution's active services ahead of the first request."""
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM services WHERE institution_id = %s AND is_active IS NOT FALSE", (institution_id,))
+    service_ids = [r[0] for r in cur.fetchall()]
+    for service_id in service_ids:
+        service_versions.get(cur, service_id)
+        admin_presence.get(service_id)
+        queue_engine.service(service_id)
+    conn.rollback()
+    return len(service_ids)
+
+
+class RolloverWorker:
+    """Runs the day rollover for every active institution at ``at`` (HH:MM,
+    local time) each day, and once at startup to catch up on a missed one.
+    Every worker warms its own caches; the database part runs once per day.
+    Queue partition maintenance runs first, on the same schedule."""
+
+    def __init__(self, pool, at='00:05'):
+        self._pool = pool
+        self.at = datetime.strptime(at, '%H:%M').time()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {'runs': 0, 'rolled_over': 0, 'expired': 0, 'partitions_created': 0, 'errors': 0,
+                       'last_run': None}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='day-rollover', daemon=True)
+                self._thread.start()
+
+    def _next_run(self):
+        now = datetime.now()
+        target = datetime.combine(now.date(), self.at)
+        return target if target > now else target + timedelta(days=1)
+
+    def _run(self):
+        while True:
+            for step in (self.maintain_partitions, self.run):
+                try:
+                    step()
+                except Exception as e:
+                    print(f"Day rollover failed: {e}")
+                    with self._lock:
+                        self._stats['errors'] += 1
+            time.sleep(max(1.0, (self._next_run() - datetime.now()).total_seconds()))
+
+    def is_running(self):
+        return bool(self._thread and self._thread.is_alive())
+
+    def maintain_partitions(self):
+        """Create upcoming queue partitions and apply QUEUE_RETENTION_DAYS."""
+        with self._pool.connection() as conn:
+            created, dropped = maintain_queue_partitions(conn)
+            conn.commit()
+        with self._lock:
+            self._stats['partitions_created'] += len(created)
+        return created, dropped
+
+    def run(self, institution_id=None, day=None, force=False):
+        """Roll over one or all active institutions; returns their summaries."""
+        results = []
+        with self._pool.connection() as conn:
+            cur = conn.cursor()
+            if institution_id:
+                ids = [int(institution_id)]
+            else:
+                cur.execute("SELECT id FROM institutions WHERE is_active IS NOT FALSE ORDER BY id")
+                ids = [r[0] for r in cur.fetchall()]
+            conn.rollback()
+            for inst in ids:
+                summary = rollover_institution(conn, inst, day, force)
+                warm_institution_caches(conn, inst)
+                if summary:
+                    results.append(summary)
+        with self._lock:
+            self._stats['runs'] += 1
+            self._stats['rolled_over'] += len(results)
+            self._stats['expired'] += sum(r['expired'] for r in results)
+            self._stats['last_run'] = datetime.now().isoformat()
+        return results
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, at=self.at.strftime('%H:%M'), next_run=self._next_run().isoformat(),
+                        running=self.is_running())
+
+
+rollover_worker = RolloverWorker(db_pool, at=os.environ.get('ROLLOVER_AT', '00:05'))
+
+
+@app.cli.command('rollover')
+@click.option('--institution', 'institution_id', type=int, help='Only this institution (default: all active)')
+@click.option('--day', help='Day to open (YYYY-MM-DD, default today); earlier days are closed out')
+@click.option('--force', is_flag=True, help='Run again even if the day was already rolled over')
+def rollover_command(institution_id, day, force):
+    """Close out previous days: expire unfinished tickets, finalize rollups, reset counters."""
+    results = rollover_worker.run(institution_id, parse_date(day) if day else None, force)
+    for r in results:
+        print(f"Institution {r['institution_id']}: expired {r['expired']} ticket(s), "
+              f"rebuilt {r['rollup_buckets']} rollup bucket(s)")
+    print(f"Rolled over {len(results)} institution(s) for {day or datetime.now().date().isoformat()}")
+
+
+@app.route('/admin/rollover', methods=['POST'])
+@require_admin('super-admin')
+def run_rollover_endpoint():
+    """Run the day rollover now. Body: institution_id (default all), day, force."""
+    data = request.get_json(silent=True) or {}
+    day = parse_date(data['day']) if data.get('day') else None
+    if data.get('day') and not day:
+        return jsonify({"success": False, "error": f"Invalid day '{data['day']}'"}), 400
+    try:
+        results = rollover_worker.run(data.get('institution_id'), day, bool(data.get('force')))
+        return jsonify({"success": True, "rolled_over": results, "worker": rollover_worker.stats()})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 # =================================================================
 # QUEUE
 # =================================================================
 
+# Columns every mutation returns so _queue_changed() can maintain derived state
+CHANGE_RETURNING = "id, number, seq, institution_id, service_id, state, created_at, called_at, completed_at"
+
+
+def _change_rows(cur):
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+
+def _queue_changed(cur, action, rows, actor=None):
+    """Side effects of a queue mutation, run in the mutation's transaction.
+
+    ``action`` is one of created/called/returned/completed/muted/unmuted/present/absent/accessed/expired
+    and ``rows`` are the affected tickets as returned by CHANGE_RETURNING.
+    ``actor`` (the admin, if any) is recorded with the events.
+    """
+    _append_queue_events(cur, action, rows, actor)
+    _bump_hourly_rollup(cur, action, rows)
+    _notify_queue_changes(cur, action, rows)
+
+
+def _append_queue_events(cur, action, rows, actor=None):
+    """One queue_events row per affected ticket, timestamped with the transaction."""
+    psycopg2.extras.execute_values(cur, """
+        INSERT INTO queue_events (queue_id, institution_id, service_id, type, actor) VALUES %s
+    """, [(str(r['id']), r.get('institution_id'), r.get('service_id'), action, actor) for r in rows])
+
+
 def _resolve_department(department, cur, institution_id=None):
     """Resolve a department string to (filter_type, filter_value).
     Returns ('service_id', int) or ('person_like', str)."""
@@ -886,35 +3179,60 @@ def _queue_where(filter_type, filter_value, institution_id=None):
     return " AND ".join(clauses), params
 
 
+# ?status= filters for the admin queue listing
+QUEUE_STATUS_FILTERS = {
+    'active': f"state IN ({STATE_WAITING}, {STATE_CALLED})",
+    'waiting': f"state = {STATE_WAITING}",
+    'called': f"state = {STATE_CALLED}",
+    'completed': f"state IN ({STATE_COMPLETED}, {STATE_EXPIRED})",
+    'all': None,
+}
+ADMIN_QUEUE_DEFAULT_LIMIT = 200
+ADMIN_QUEUE_MAX_LIMIT = 1000
+
+
+def _day_range(day):
+    """Half-open [start, end) timestamps for a calendar day.
+
+    Filter with ``col >= start AND col < end`` rather than ``DATE(col) = day``
+    so the predicate can use the (…, created_at) / (…, completed_at) indexes.
+    """
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+
+# Highest sequence a service can issue per day (numbers are PREFIX + 3 digits)
+MAX_QUEUE_SEQUENCE = 999
+
+
 @app.route('/queue/next-number/<prefix>', methods=['GET'])
 def get_next_queue_number(prefix):
+    """Preview the next number for a service. POST /queue assigns it atomically."""
+    institution_id = request.args.get('institution_id', type=int)
+    if not institution_id:
+        return jsonify({"success": False, "error": "institution_id is required"}), 400
     conn = get_db_connection()
     if not conn:
         return jsonify({"success": False, "error": "Database connection failed"}), 500
     try:
         cur = conn.cursor()
-        institution_id = request.args.get('institution_id')
-        today = datetime.now().strftime('%Y-%m-%d')
-
-        if institution_id:
-            cur.execute("""
-                SELECT MAX(CAST(SUBSTRING(number FROM 2) AS INTEGER))
-                FROM queue WHERE number LIKE %s AND DATE(created_at) = %s AND institution_id = %s
-            """, (f"{prefix}%", today, institution_id))
-        else:
-            cur.execute("""
-                SELECT MAX(CAST(SUBSTRING(number FROM 2) AS INTEGER))
-                FROM queue WHERE number LIKE %s AND DATE(created_at) = %s
-            """, (f"{prefix}%", today))
+        cur.execute("""
+            SELECT COALESCE(c.last_value, 0)
+            FROM services s
+            LEFT JOIN queue_counters c
+                   ON c.institution_id = s.institution_id AND c.service_id = s.id AND c.day = CURRENT_DATE
+            WHERE s.institution_id = %s AND s.prefix = %s
+        """, (institution_id, prefix))
+        row = cur.fetchone()
+        conn.close()
+        if row is None:
+            return jsonify({"success": False, "error": f"No service with prefix {prefix}"}), 404
 
-        max_num = (cur.fetchone()[0] or 0)
-        next_num = max_num + 1
-        if next_num > 999:
-            conn.close()
+        next_num = row[0] + 1
+        if next_num > MAX_QUEUE_SEQUENCE:
             return jsonify({"success": False, "error": f"Max queue numbers reached for {prefix} today"}), 400
 
         queue_number = f"{prefix}{str(next_num).zfill(3)}"
-        conn.close()
         return jsonify({
             "success": True,
             "queue_number": queue_number,
@@ -927,30 +3245,88 @@ def get_next_queue_number(prefix):
 
 @app.route('/queue', methods=['POST'])
 def create_queue():
+    """Create a ticket. The server assigns the number from queue_counters in
+    the same statement as the insert, for the database's CURRENT_DATE. The
+    service is service_id, or (institution_id, prefix) for callers without
+    one; a client-supplied number is ignored."""
     conn = get_db_connection()
     if not conn:
         return jsonify({"success": False, "error": "Database connection failed"}), 500
     try:
         data = request.json
         cur = conn.cursor()
-        ensure_schema(conn)
+        now = datetime.now()
+        queue_id = data.get('id') or f"queue_{int(now.timestamp() * 1000)}_{secrets.token_hex(5)}"
+        # The page's own date / time strings, parsed once here; the server clock otherwise
+        day = parse_date(data.get('date')) or now.date()
+        at = parse_time(data.get('time')) or now.time().replace(second=0, microsecond=0)
+        status = data.get('status', 'waiting')
+        if status not in QUEUE_STATES:
+            conn.close()
+            return jsonify({"success": False, "error": f"Invalid status '{status}'"}), 400
+        state = QUEUE_STATES.index(status)
 
-        cur.execute("""
-            INSERT INTO queue (id, institution_id, service_id, number, person, date, time, status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (
-            data['id'],
-            data.get('institution_id'),
-            data.get('service_id'),
-            data['number'],
-            data['person'],
-            data['date'],
-            data['time'],
-            data.get('status', 'waiting')
-        ))
+        service_id = data.get('service_id')
+        prefix = data.get('prefix') or re.match(r'[A-Za-z]*', data.get('number') or '').group()
+        if not service_id and not (data.get('institution_id') and prefix):
+            conn.close()
+            return jsonify({"success": False, "error": "service_id or institution_id and prefix is required"}), 400
+
+        cur.execute(f"""
+            WITH svc AS (
+                SELECT id, institution_id, TRIM(prefix) AS prefix
+                FROM services
+                WHERE CASE WHEN %(service_id)s::integer IS NOT NULL THEN id = %(service_id)s
+                           ELSE institution_id = %(institution_id)s AND TRIM(prefix) = %(prefix)s END
+            ), seq AS (
+                INSERT INTO queue_counters (institution_id, service_id, day, last_value)
+                SELECT institution_id, id, CURRENT_DATE, 1 FROM svc
+                ON CONFLICT (institution_id, service_id, day)
+                DO UPDATE SET last_value = queue_counters.last_value + 1
+                RETURNING last_value
+            ), qid AS (
+                INSERT INTO queue_ids (id, created_at) VALUES (%(id)s, NOW())
+                ON CONFLICT (id) DO NOTHING
+                RETURNING created_at
+            )
+            INSERT INTO queue (id, institution_id, service_id, number, person, date, time, state, created_at)
+            SELECT %(id)s, svc.institution_id, svc.id,
+                   svc.prefix || LPAD(seq.last_value::text, 3, '0'),
+                   %(person)s, %(date)s, %(time)s, %(state)s, qid.created_at
+            FROM svc, seq, qid
+            WHERE seq.last_value <= %(max_seq)s
+            RETURNING {CHANGE_RETURNING}
+        """, {
+            'service_id': service_id, 'institution_id': data.get('institution_id'), 'prefix': prefix,
+            'id': queue_id, 'person': data['person'], 'date': day, 'time': at,
+            'state': state, 'max_seq': MAX_QUEUE_SEQUENCE,
+        })
+        rows = _change_rows(cur)
+        if not rows:
+            conn.rollback()
+            cur.execute("""
+                SELECT 1 FROM services
+                WHERE CASE WHEN %(service_id)s::integer IS NOT NULL THEN id = %(service_id)s
+                           ELSE institution_id = %(institution_id)s AND TRIM(prefix) = %(prefix)s END
+            """, {'service_id': service_id, 'institution_id': data.get('institution_id'), 'prefix': prefix})
+            exists = cur.fetchone()
+            cur.execute("SELECT 1 FROM queue_ids WHERE id = %s", (queue_id,))
+            taken = cur.fetchone()
+            conn.close()
+            if not exists:
+                return jsonify({"success": False, "error": "Service not found"}), 404
+            if taken:
+                return jsonify({"success": False, "error": f"Queue id '{queue_id}' already exists"}), 409
+            return jsonify({"success": False, "error": "Max queue numbers reached for this service today"}), 400
+        number, institution_id = rows[0]['number'], rows[0]['institution_id']
+        _queue_changed(cur, 'created', rows)
         conn.commit()
         conn.close()
-        return jsonify({"success": True, "message": "Queue entry created"})
+        return jsonify({
+            "success": True, "message": "Queue entry created",
+            "id": queue_id, "number": number, "institution_id": institution_id,
+            "service_id": rows[0]['service_id'], "date": display_date(day), "time": display_time(at)
+        })
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -961,23 +3337,25 @@ def get_queue(queue_id):
     if not conn:
         return jsonify({"error": "Database connection failed"}), 500
     try:
+        # Plain read; the visit itself is recorded by _record_access()
+        conn.set_session(readonly=True, autocommit=True)
         cur = conn.cursor()
-        cur.execute("UPDATE queue SET accessed = TRUE, accessed_at = NOW() WHERE id = %s", (queue_id,))
-        conn.commit()
-        cur.execute("""
-            SELECT q.id, q.number, q.person, q.date, q.time, q.status,
-                   q.institution_id, q.service_id, i.name, s.name
-            FROM queue q
+        cur.execute(f"""
+            SELECT q.id, q.number, q.person, q.date, q.time, q.state,
+                   q.institution_id, q.service_id, i.name, s.name, q.accessed
+            FROM queue_all q
             LEFT JOIN institutions i ON q.institution_id = i.id
             LEFT JOIN services s ON q.service_id = s.id
-            WHERE q.id = %s
+            WHERE {_by_queue_id('q.')}
         """, (queue_id,))
         r = cur.fetchone()
+        if r:
+            _record_access(conn, queue_id, r[10])
         conn.close()
         if r:
             return jsonify({
                 "id": r[0], "number": r[1], "person": r[2],
-                "date": r[3], "time": r[4], "status": r[5],
+                "date": display_date(r[3]), "time": display_time(r[4]), "status": QUEUE_STATES[r[5]],
                 "institution_id": r[6], "service_id": r[7],
                 "institution_name": r[8], "service_name": r[9]
             })
@@ -988,12 +3366,21 @@ def get_queue(queue_id):
 
 @app.route('/queue/<queue_id>/accessed')
 def check_queue_accessed(queue_id):
+    """Whether the ticket's page has been opened (its QR code scanned).
+
+    With ``?wait=<seconds>`` a not-yet-accessed ticket long-polls: the request
+    blocks, holding no database connection, until the first access is
+    published on the change bus or the wait expires (ignored when SERVERLESS).
+    """
+    wait = request.args.get('wait', type=float)
+    if wait and wait > 0 and not SERVERLESS:
+        _wait_for_access(queue_id, wait)
     conn = get_db_connection()
     if not conn:
         return jsonify({"error": "Database connection failed"}), 500
     try:
         cur = conn.cursor()
-        cur.execute("SELECT accessed, accessed_at FROM queue WHERE id = %s", (queue_id,))
+        cur.execute(f"SELECT accessed, accessed_at FROM queue WHERE {_by_queue_id()}", (queue_id,))
         r = cur.fetchone()
         conn.close()
         if r:
@@ -1006,60 +3393,366 @@ def check_queue_accessed(queue_id):
         return jsonify({"error": str(e)}), 500
 
 
+def _wait_for_access(queue_id, timeout):
+    key = ('queue', queue_id)
+    sub = event_hub.subscribe(key)
+
+    def accessed():
+        with db_pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT accessed FROM queue WHERE {_by_queue_id()}", (queue_id,))
+            row = cur.fetchone()
+        return row is None or bool(row[0])
+
+    try:
+        if accessed():
+            return
+        deadline = time.monotonic() + min(timeout, LONG_POLL_MAX_SECONDS)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            step = remaining if db_listener.connected else min(remaining, LONG_POLL_RECHECK_SECONDS)
+            try:
+                event = sub.get(timeout=step)
+            except queue_mod.Empty:
+                if not db_listener.connected and accessed():
+                    return
+                continue
+            if event and event.get('a') == 'accessed':
+                return
+    finally:
+        event_hub.unsubscribe(key, sub)
+
+
+def _ticket_status(number, institution_id, service_id, called, completed, present):
+    """The /queue/<id>/status payload for one ticket row (admin presence comes from the cache)."""
+    is_called = called if called is not None else False
+    is_present = present if present is not None else False
+    prefix = number[0].upper() if number else 'A'
+    if service_id:
+        admin_status = admin_presence.get(service_id)
+    else:
+        admin_status = admin_presence.get_by_prefix(prefix, institution_id)
+
+    # If the queue is completed, return a clear completed status
+    # (previously returned 404, which caused the frontend to fall back to 'Waiting')
+    if completed:
+        return {
+            "status": {"text": "Completed", "class": "status-completed"},
+            "is_cleared": True,
+            "is_called": False,
+            "is_present": is_present,
+            "admin_status": admin_status,
+            "department_prefix": prefix,
+            "queue_number": number
+        }
+
+    if admin_status == 'away':
+        status = {"text": "Admin Away", "class": "status-away", "priority": "low"}
+    elif is_called:
+        status = {"text": "You are now being called!", "class": "status-called", "priority": "high"}
+    else:
+        status = {"text": "Waiting", "class": "status-waiting", "priority": "low"}
+    return {
+        "status": status, "department_prefix": prefix,
+        "admin_status": admin_status, "is_called": is_called,
+        "is_present": is_present, "queue_number": number
+    }
+
+
 @app.route('/queue/<queue_id>/status')
 def get_queue_status(queue_id):
+    """Ticket status. With ``?wait=<s>&since=<version>`` (long-poll) the request
+    first blocks until the ticket's service changes past ``since``."""
+    long_poll = _long_poll_args()
+    if long_poll:
+        service_id = service_versions.ticket_service(queue_id)
+        if service_id is None:
+            with db_pool.connection() as conn:
+                cur = conn.cursor()
+                cur.execute(f"SELECT service_id FROM queue WHERE {_by_queue_id()}", (queue_id,))
+                row = cur.fetchone()
+            service_id = row[0] if row else None
+            if service_id:
+                service_versions.remember_ticket(queue_id, service_id)
+        if service_id:
+            _wait_for_change(service_id, long_poll[1], long_poll[0])
+
+    # Active tickets of a loaded service are answered from the queue engine
+    service_id = service_versions.ticket_service(queue_id)
+    live = queue_engine.ticket(queue_id, service_id)
+    if live:
+        etag = _service_etag(live['service_id'], live['version'], 'status', queue_id,
+                             admin_presence.get(live['service_id']))
+        if etag in request.if_none_match:
+            return _not_modified(etag)
+        return _with_etag(jsonify(_ticket_status(live['number'], None, live['service_id'], live['called'],
+                                                 False, live['is_present'])), etag)
+
+    # A ticket seen before, with its service version known from the change
+    # bus, can be revalidated without touching the database
+    version = service_versions.cached(service_id) if service_id else None
+    if version is not None:
+        etag = _service_etag(service_id, version, 'status', queue_id, admin_presence.get(service_id))
+        if etag in request.if_none_match:
+            return _not_modified(etag)
+
     conn = get_db_connection()
     if not conn:
         return jsonify({"error": "Database connection failed"}), 500
     try:
         cur = conn.cursor()
-        cur.execute("""
-            SELECT number, person, created_at, called, is_present, institution_id, service_id, completed
-            FROM queue WHERE id = %s
+        cur.execute(f"""
+            SELECT q.number, q.institution_id, q.service_id, q.called, q.completed, q.is_present,
+                   COALESCE(v.version, 0)
+            FROM queue_all q LEFT JOIN service_versions v ON v.service_id = q.service_id
+            WHERE {_by_queue_id('q.')}
         """, (queue_id,))
         row = cur.fetchone()
+        conn.close()
         if not row:
-            conn.close()
             return jsonify({"error": "Queue not found"}), 404
+        etag = None
+        if row[2]:
+            service_versions.remember_ticket(queue_id, row[2])
+            service_versions.observe(row[2], row[6])
+            etag = _service_etag(row[2], row[6], 'status', queue_id, admin_presence.get(row[2]))
+            if etag in request.if_none_match:
+                return _not_modified(etag)
+        return _with_etag(jsonify(_ticket_status(*row[:6])), etag)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        queue_number = row[0]
-        is_called = row[3] if row[3] is not None else False
-        is_present = row[4] if row[4] is not None else False
-        is_completed = row[7] if row[7] is not None else False
-        prefix = queue_number[0].upper() if queue_number else 'A'
-        admin_status = admin_statuses.get(prefix, 'available')
 
-        # If the queue is completed, return a clear completed status
-        # (previously returned 404, which caused the frontend to fall back to 'Waiting')
-        if is_completed:
-            conn.close()
-            return jsonify({
-                "status": {"text": "Completed", "class": "status-completed"},
-                "is_cleared": True,
-                "is_called": False,
-                "is_present": is_present,
-                "admin_status": admin_status,
-                "department_prefix": prefix,
-                "queue_number": queue_number
-            })
+def _ticket_state(cur, queue_id):
+    """Everything a ticket's page shows, in one round trip (None if the ticket is gone).
 
-        if admin_status == 'away':
-            status = {"text": "Admin Away", "class": "status-away", "priority": "low"}
-        elif is_called:
-            status = {"text": "You are now being called!", "class": "status-called", "priority": "high"}
-        else:
-            status = {"text": "Waiting", "class": "status-waiting", "priority": "low"}
+    ``position`` counts waiting tickets of the same service and day issued
+    before this one (1 = next); it is 0 once the ticket has been called.
+    ``estimated_minutes`` is position x today's mean service time for the
+    service (mean wait if nothing has been served yet), from the hourly
+    rollup.
+    """
+    day_start, day_end = _day_range(datetime.now().date())
+    cur.execute(f"""
+        SELECT q.number, q.institution_id, q.service_id, q.called, q.completed, q.is_present, q.is_muted,
+               q.person, q.date, q.time, i.name, s.name,
+               (SELECT COUNT(*) FROM queue w
+                WHERE w.service_id = q.service_id
+                  AND w.created_at >= date_trunc('day', q.created_at)
+                  AND w.created_at < date_trunc('day', q.created_at) + INTERVAL '1 day'
+                  AND w.state = {STATE_WAITING} AND w.seq < q.seq),
+               (SELECT c.number FROM queue c
+                WHERE c.service_id = q.service_id AND c.created_at >= %(start)s AND c.created_at < %(end)s
+                  AND c.state = {STATE_CALLED}
+                ORDER BY c.called_at DESC NULLS LAST LIMIT 1),
+               (SELECT d.number FROM queue d
+                WHERE d.service_id = q.service_id AND d.completed_at >= %(start)s AND d.completed_at < %(end)s
+                ORDER BY d.completed_at DESC LIMIT 1),
+               (SELECT COUNT(*) FROM queue w
+                WHERE w.service_id = q.service_id AND w.created_at >= %(start)s AND w.created_at < %(end)s
+                  AND w.state = {STATE_WAITING}),
+               r.service_seconds / NULLIF(r.served, 0),
+               r.wait_seconds / NULLIF(r.called, 0),
+               q.accessed
+        FROM queue_all q
+        LEFT JOIN institutions i ON i.id = q.institution_id
+        LEFT JOIN services s ON s.id = q.service_id
+        LEFT JOIN LATERAL (
+            SELECT SUM(served) AS served, SUM(service_seconds) AS service_seconds,
+                   SUM(called) AS called, SUM(wait_seconds) AS wait_seconds
+            FROM queue_hourly_rollup
+            WHERE service_id = q.service_id AND bucket >= %(start)s AND bucket < %(end)s
+        ) r ON TRUE
+        WHERE {_by_queue_id('q.', '%(id)s')}
+    """, {'id': queue_id, 'start': day_start, 'end': day_end})
+    row = cur.fetchone()
+    if not row:
+        return None
+    state = _ticket_status(*row[:6])
+    waiting = not row[3] and not row[4]
+    position = row[12] + 1 if waiting else 0
+    pace = row[16] if row[16] is not None else row[17]
+    state.update({
+        "id": queue_id, "institution_id": row[1], "service_id": row[2],
+        "is_muted": bool(row[6]),
+        "person": row[7], "date": display_date(row[8]), "time": display_time(row[9]),
+        "institution_name": row[10], "service_name": row[11],
+        "position": position,
+        "current_serving": row[13], "last_completed_queue": row[14],
+        "waiting_count": row[15],
+        "avg_service_minutes": _minutes(pace),
+        "estimated_minutes": _minutes(position * pace) if waiting and pace is not None else None,
+        "accessed": bool(row[18]),
+    })
+    return state
+
+
+def _live_ticket_state(base, live):
+    """Refresh a _ticket_state() snapshot with a queue-engine reading; the
+    static details and the service pace are kept from ``base``."""
+    state = dict(base)
+    state.update(_ticket_status(live['number'], base['institution_id'], live['service_id'],
+                                live['called'], False, live['is_present']))
+    pace = base.get('avg_service_minutes')
+    position = live['position']
+    state.update({
+        "is_muted": live['is_muted'], "accessed": live['accessed'], "position": position,
+        "current_serving": live['current_serving'], "last_completed_queue": live['last_completed_queue'],
+        "waiting_count": live['waiting_count'],
+        "estimated_minutes": round(position * pace, 1) if position and pace is not None else None,
+    })
+    return state
+
+
+@app.route('/queue/<queue_id>/snapshot')
+def get_queue_snapshot(queue_id):
+    """Ticket details, position, now serving, last completed, waiting count,
+    ETA and admin presence for the queue-status page, in one query.
 
+    ``?visit=1`` also records the page visit (as GET /queue/<id> does).
+    """
+    visit = request.args.get('visit', '').lower() in ('1', 'true')
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+    try:
+        conn.set_session(readonly=True, autocommit=True)
+        state = _ticket_state(conn.cursor(), queue_id)
+        if state is not None and visit:
+            _record_access(conn, queue_id, state['accessed'])
         conn.close()
-        return jsonify({
-            "status": status, "department_prefix": prefix,
-            "admin_status": admin_status, "is_called": is_called,
-            "is_present": is_present, "queue_number": queue_number
-        })
+        if state is None:
+            return jsonify({"error": "Queue not found"}), 404
+        return jsonify(state)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def _state_changes(old, new):
+    """Names of the transitions between two _ticket_state() snapshots."""
+    if old is None:
+        return ['snapshot']
+    changes = []
+    if new.get('is_cleared') and not old.get('is_cleared'):
+        changes.append('completed')
+    elif new['is_called'] != old['is_called']:
+        changes.append('called' if new['is_called'] else 'returned')
+    if new['is_muted'] != old['is_muted']:
+        changes.append('muted' if new['is_muted'] else 'unmuted')
+    if new['admin_status'] != old['admin_status']:
+        changes.append('admin_status')
+    if new['position'] != old['position']:
+        changes.append('position')
+    if new['accessed'] != old['accessed']:
+        changes.append('accessed')
+    if new['is_present'] != old['is_present']:
+        changes.append('present' if new['is_present'] else 'absent')
+    if (new['current_serving'], new['last_completed_queue']) != (old['current_serving'], old['last_completed_queue']):
+        changes.append('serving')
+    if (new['waiting_count'], new['estimated_minutes']) != (old['waiting_count'], old['estimated_minutes']):
+        changes.append('eta')
+    return changes
+
+
+# Seconds between SSE comment heartbeats, and the lifetime of one stream
+# (clients reconnect transparently with Last-Event-ID)
+SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+SSE_MAX_STREAM_SECONDS = float(os.environ.get('SSE_MAX_STREAM_SECONDS', 300))
+
+
+def _sse(event, data, event_id=None):
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _state_id(state):
+    """Event id for a state: a digest of its content, so a resumed client that
+    already has the current state is not sent it again."""
+    return hashlib.sha1(json.dumps(state, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+@app.route('/queue/<queue_id>/events')
+def queue_events(queue_id):
+    """Server-Sent Events stream of a ticket's state.
+
+    Sends a ``status`` event with the full _ticket_state() plus a ``changes``
+    list whenever it changes, and a comment heartbeat otherwise. No database
+    connection is held while the stream is idle. The stream ends once the
+    ticket is completed or deleted.
+
+    When SERVERLESS the stream is refused with 204 No Content, which tells
+    EventSource not to reconnect; the page then polls instead.
+    """
+    if SERVERLESS:
+        return Response(status=204)
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+    try:
+        cur = conn.cursor()
+        cur.execute(f"SELECT service_id FROM queue WHERE {_by_queue_id()}", (queue_id,))
+        row = cur.fetchone()
+        conn.close()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if not row:
+        return jsonify({"error": "Queue not found"}), 404
+
+    key = ('service', row[0]) if row[0] else ('queue', queue_id)
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    # Subscribe before the first read so a change in between is not lost
+    sub = event_hub.subscribe(key)
+
+    def read_state(previous):
+        live = queue_engine.ticket(queue_id, row[0]) if previous and row[0] else None
+        if live:
+            return _live_ticket_state(previous, live)
+        with db_pool.connection() as c:
+            return _ticket_state(c.cursor(), queue_id)
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            state, sent_id = None, last_event_id
+            deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+            while True:
+                new = read_state(state)
+                if new is None:
+                    yield _sse('deleted', {"id": queue_id})
+                    return
+                new_id = _state_id(new)
+                if new_id != sent_id:
+                    yield _sse('status', dict(new, changes=_state_changes(state, new)), new_id)
+                    sent_id = new_id
+                state = new
+                if new.get('is_cleared'):
+                    return
+                # Wait for a change signal, heartbeating while idle
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return
+                    try:
+                        sub.get(timeout=min(SSE_HEARTBEAT_SECONDS, remaining))
+                    except queue_mod.Empty:
+                        yield ": heartbeat\n\n"
+                        continue
+                    while not sub.empty():
+                        sub.get_nowait()
+                    break
+        finally:
+            event_hub.unsubscribe(key, sub)
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/queue/im-here/<queue_id>', methods=['POST'])
 def queue_im_here(queue_id):
     conn = get_db_connection()
@@ -1067,15 +3760,19 @@ def queue_im_here(queue_id):
         return jsonify({"success": False, "error": "Database connection failed"}), 500
     try:
         cur = conn.cursor()
-        cur.execute("SELECT number FROM queue WHERE id = %s AND completed = FALSE", (queue_id,))
-        q = cur.fetchone()
-        if not q:
+        cur.execute(f"""
+            UPDATE queue SET is_present = TRUE, present_at = NOW()
+            WHERE {_by_queue_id()} AND {QUEUE_STATUS_FILTERS['active']}
+            RETURNING {CHANGE_RETURNING}
+        """, (queue_id,))
+        rows = _change_rows(cur)
+        if not rows:
             conn.close()
             return jsonify({"success": False, "error": "Queue not found or already completed"}), 404
-        cur.execute("UPDATE queue SET is_present = TRUE, present_at = NOW() WHERE id = %s", (queue_id,))
+        _queue_changed(cur, 'present', rows)
         conn.commit()
         conn.close()
-        return jsonify({"success": True, "message": "Marked as present", "queue_number": q[0]})
+        return jsonify({"success": True, "message": "Marked as present", "queue_number": rows[0]['number']})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -1087,15 +3784,19 @@ def cancel_queue_im_here(queue_id):
         return jsonify({"success": False, "error": "Database connection failed"}), 500
     try:
         cur = conn.cursor()
-        cur.execute("SELECT number FROM queue WHERE id = %s AND completed = FALSE", (queue_id,))
-        q = cur.fetchone()
-        if not q:
+        cur.execute(f"""
+            UPDATE queue SET is_present = FALSE, present_at = NULL
+            WHERE {_by_queue_id()} AND {QUEUE_STATUS_FILTERS['active']}
+            RETURNING {CHANGE_RETURNING}
+        """, (queue_id,))
+        rows = _change_rows(cur)
+        if not rows:
             conn.close()
             return jsonify({"success": False, "error": "Queue not found or already completed"}), 404
-        cur.execute("UPDATE queue SET is_present = FALSE, present_at = NULL WHERE id = %s", (queue_id,))
+        _queue_changed(cur, 'absent', rows)
         conn.commit()
         conn.close()
-        return jsonify({"success": True, "message": "Cancelled present status", "queue_number": q[0]})
+        return jsonify({"success": True, "message": "Cancelled present status", "queue_number": rows[0]['number']})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -1107,7 +3808,14 @@ def get_queue_mute_status(queue_id):
         return jsonify({"error": "Database connection failed"}), 500
     try:
         cur = conn.cursor()
-        cur.execute("SELECT is_muted, muted_at, muted_by FROM queue WHERE id = %s", (queue_id,))
+        cur.execute(f"""
+            SELECT q.is_muted, e.at, e.actor FROM queue q
+            LEFT JOIN LATERAL (
+                SELECT at, actor FROM queue_events
+                WHERE queue_id = q.id AND type = 'muted' ORDER BY id DESC LIMIT 1
+            ) e ON q.is_muted
+            WHERE {_by_queue_id('q.')}
+        """, (queue_id,))
         r = cur.fetchone()
         conn.close()
         if not r:
@@ -1128,21 +3836,15 @@ def check_previous_day(queue_id):
         return jsonify({"error": "Database connection failed"}), 500
     try:
         cur = conn.cursor()
-        cur.execute("SELECT created_at, date FROM queue WHERE id = %s", (queue_id,))
+        cur.execute("SELECT created_at::date FROM queue_ids WHERE id = %s", (queue_id,))
         row = cur.fetchone()
         conn.close()
         if not row:
             return jsonify({"error": "Queue not found"}), 404
         today = datetime.now().date()
-        if row[0]:
-            queue_date = row[0].date()
-            is_prev = queue_date < today
-        else:
-            parsed = parse_date(row[1])
-            queue_date = parsed if parsed else today
-            is_prev = queue_date < today if parsed else False
+        queue_date = row[0]
         return jsonify({
-            "is_previous_day": is_prev,
+            "is_previous_day": queue_date < today,
             "queue_date": queue_date.isoformat(),
             "today": today.isoformat()
         })
@@ -1156,36 +3858,151 @@ def check_previous_day(queue_id):
 
 @app.route('/admin/queue/<department>')
 def get_admin_queue(department):
+    """List a service's tickets, oldest first, one keyset page at a time.
+
+    Query params: status (active|waiting|called|completed|all, default active),
+    date (YYYY-MM-DD or 'all', default today), is_present (true|false),
+    after (seq of the last row already seen), limit (default 200, max 1000).
+    When more rows remain, the X-Next-After header holds the next ``after``.
+    For a numeric department, ``?wait=<s>&since=<version>`` long-polls: the
+    request blocks until the service version passes ``since`` (see
+    X-Queue-Version) or the wait expires.
+    """
+    status = request.args.get('status', 'active')
+    if status not in QUEUE_STATUS_FILTERS:
+        return jsonify({"error": f"Invalid status '{status}'"}), 400
+    date_arg = request.args.get('date')
+    day = None
+    if date_arg != 'all':
+        day = parse_date(date_arg) if date_arg else datetime.now().date()
+        if not day:
+            return jsonify({"error": f"Invalid date '{date_arg}'"}), 400
+    after = request.args.get('after', type=int)
+    limit = request.args.get('limit', ADMIN_QUEUE_DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, ADMIN_QUEUE_MAX_LIMIT))
+    long_poll = _long_poll_args()
+    if long_poll and department.isdigit():
+        _wait_for_change(int(department), long_poll[1], long_poll[0])
+    etag = _department_etag(department, day)
+    if etag and etag in request.if_none_match:
+        return _not_modified(etag)
+
     conn = get_db_connection()
     if not conn:
         return jsonify({"error": "Database connection failed"}), 500
     try:
         cur = conn.cursor()
+        etag = etag or _department_etag(department, day, cur=cur)
+        if etag and etag in request.if_none_match:
+            conn.close()
+            return _not_modified(etag)
         institution_id = request.args.get('institution_id')
         ft, fv = _resolve_department(department, cur, institution_id)
         where, params = _queue_where(ft, fv, institution_id)
+        if QUEUE_STATUS_FILTERS[status]:
+            where += f" AND {QUEUE_STATUS_FILTERS[status]}"
+        if day:
+            where += " AND created_at >= %s AND created_at < %s"
+            params += list(_day_range(day))
+        present = request.args.get('is_present')
+        if present in ('true', 'false'):
+            where += " AND is_present IS " + ("TRUE" if present == 'true' else "NOT TRUE")
+        if after is not None:
+            where += " AND seq > %s"
+            params.append(after)
+        # Today's tickets are never archived; other days may be
+        source = 'queue' if day == datetime.now().date() else 'queue_all'
         cur.execute(f"""
-            SELECT id, number, person, date, time, status, created_at,
-                   is_present, present_at, is_muted
-            FROM queue WHERE {where} ORDER BY id ASC
-        """, params)
+            SELECT id, number, person, date, time, state, created_at,
+                   is_present, present_at, is_muted, seq
+            FROM {source} WHERE {where} ORDER BY seq ASC LIMIT %s
+        """, params + [limit + 1])
         rows = cur.fetchall()
         conn.close()
-        return jsonify([{
-            "id": r[0], "number": r[1], "person": r[2], "date": r[3],
-            "time": r[4], "status": r[5],
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        resp = jsonify([{
+            "id": r[0], "number": r[1], "person": r[2], "date": display_date(r[3]),
+            "time": display_time(r[4]), "status": QUEUE_STATES[r[5]],
             "created_at": r[6].isoformat() if r[6] else None,
             "is_present": r[7] if r[7] is not None else False,
             "present_at": r[8].isoformat() if r[8] else None,
-            "is_muted": r[9] if r[9] is not None else False
+            "is_muted": r[9] if r[9] is not None else False,
+            "seq": r[10]
         } for r in rows])
+        if has_more:
+            resp.headers['X-Next-After'] = str(rows[-1][10])
+        return _with_etag(resp, etag)
     except Exception as e:
         import traceback
         return jsonify({"error": str(e), "traceback": traceback.format_exc()}), 500
 
 
+EXPORT_COLUMNS = ['id', 'number', 'person', 'date', 'time', 'status', 'institution_id', 'service_id',
+                  'created_at', 'called_at', 'called_by', 'completed_at', 'completed_by', 'is_present']
+EXPORT_BATCH_SIZE = 1000
+# Export columns read from the event log: the latest actor of each action
+EXPORT_ACTOR_COLUMNS = {'called_by': 'called', 'completed_by': 'completed'}
+
+
+def _export_row(r):
+    """One export row as {column: value}, dates and state the way the API shows them."""
+    row = dict(zip(EXPORT_COLUMNS, r))
+    row.update(date=display_date(row['date']), time=display_time(row['time']), status=QUEUE_STATES[row['status']])
+    return {c: v.isoformat() if isinstance(v, datetime) else v for c, v in row.items()}
+
+
+def _stream_queue_export(conn, where, params, fmt):
+    """Yield the export in EXPORT_BATCH_SIZE chunks from a server-side cursor."""
+    try:
+        cur = conn.cursor(name=f"queue_export_{secrets.token_hex(4)}")
+        cur.itersize = EXPORT_BATCH_SIZE
+        select = ', '.join(f"{c}.actor" if c in EXPORT_ACTOR_COLUMNS else 'q.state' if c == 'status' else f"q.{c}"
+                           for c in EXPORT_COLUMNS)
+        actors = ''.join(f"""
+            LEFT JOIN LATERAL (
+                SELECT actor FROM queue_events e
+                WHERE e.queue_id = q.id AND e.type = '{action}' ORDER BY e.id DESC LIMIT 1
+            ) {c} ON TRUE""" for c, action in EXPORT_ACTOR_COLUMNS.items())
+        cur.execute(f"SELECT {select} FROM queue_all q {actors} WHERE {where} ORDER BY q.seq", params)
+        if fmt == 'csv':
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(EXPORT_COLUMNS)
+        while True:
+            rows = cur.fetchmany(EXPORT_BATCH_SIZE)
+            if fmt == 'csv':
+                writer.writerows([list(_export_row(r).values()) for r in rows])
+                chunk = buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+            else:
+                chunk = ''.join(
+                    json.dumps(_export_row(r)) + '\n' for r in rows)
+            if chunk:
+                yield chunk
+            if len(rows) < EXPORT_BATCH_SIZE:
+                break
+        cur.close()
+    finally:
+        conn.close()
+
+
 @app.route('/admin/queue-history/<department>')
 def get_admin_queue_history(department):
+    """Queue history for a service, optionally limited with from=/to= (YYYY-MM-DD).
+
+    format=ndjson or format=csv streams the export through a server-side
+    cursor so memory stays flat however many rows match.
+    """
+    fmt = request.args.get('format', 'json')
+    if fmt not in ('json', 'ndjson', 'csv'):
+        return jsonify({"error": f"Invalid format '{fmt}'"}), 400
+    date_from = parse_date(request.args.get('from'))
+    date_to = parse_date(request.args.get('to'))
+    if (request.args.get('from') and not date_from) or (request.args.get('to') and not date_to):
+        return jsonify({"error": "from/to must be dates (YYYY-MM-DD)"}), 400
+
     conn = get_db_connection()
     if not conn:
         return jsonify({"error": "Database connection failed"}), 500
@@ -1194,41 +4011,106 @@ def get_admin_queue_history(department):
         institution_id = request.args.get('institution_id')
         ft, fv = _resolve_department(department, cur, institution_id)
         where, params = _queue_where(ft, fv, institution_id)
-        cur.execute(f"SELECT id, number, person, date, time, status FROM queue WHERE {where} ORDER BY id ASC", params)
+        if date_from:
+            where += " AND created_at >= %s"
+            params.append(_day_range(date_from)[0])
+        if date_to:
+            where += " AND created_at < %s"
+            params.append(_day_range(date_to)[1])
+
+        if fmt != 'json':
+            filename = f"queue-history-{department}.{'csv' if fmt == 'csv' else 'ndjson'}"
+            return Response(
+                stream_with_context(_stream_queue_export(conn, where, params, fmt)),
+                mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+                headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
+        cur.execute(f"SELECT id, number, person, date, time, state FROM queue_all WHERE {where} ORDER BY seq", params)
         rows = cur.fetchall()
         conn.close()
         return jsonify([{
             "id": r[0], "number": r[1], "person": r[2],
-            "date": r[3], "time": r[4], "status": r[5]
+            "date": display_date(r[3]), "time": display_time(r[4]), "status": QUEUE_STATES[r[5]]
         } for r in rows])
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def _admin_stats_query(where, params, day_start, day_end):
+    """One-pass stats for a service: counts plus measured wait/service times (seconds).
+
+    Wait = called_at - created_at for tickets called today; service =
+    completed_at - called_at for tickets completed today.
+    """
+    wait = "EXTRACT(EPOCH FROM called_at - created_at)"
+    service = "EXTRACT(EPOCH FROM completed_at - called_at)"
+    called_today = "called_at >= %s AND called_at < %s"
+    completed_today = f"state = {STATE_COMPLETED} AND completed_at >= %s AND completed_at < %s"
+    sql = f"""
+        SELECT
+            COUNT(*) FILTER (WHERE created_at >= %s AND created_at < %s),
+            COUNT(*) FILTER (WHERE {QUEUE_STATUS_FILTERS['active']}),
+            COUNT(*) FILTER (WHERE state = {STATE_WAITING}),
+            COUNT(*) FILTER (WHERE {completed_today}),
+            COUNT(*) FILTER (WHERE {called_today}),
+            AVG({wait}) FILTER (WHERE {called_today}),
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY {wait}) FILTER (WHERE {called_today}),
+            percentile_cont(0.9) WITHIN GROUP (ORDER BY {wait}) FILTER (WHERE {called_today}),
+            AVG({service}) FILTER (WHERE {completed_today} AND called_at IS NOT NULL),
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY {service}) FILTER (WHERE {completed_today} AND called_at IS NOT NULL),
+            percentile_cont(0.9) WITHIN GROUP (ORDER BY {service}) FILTER (WHERE {completed_today} AND called_at IS NOT NULL)
+        FROM queue
+        WHERE {where}
+          AND ({QUEUE_STATUS_FILTERS['active']} OR created_at >= %s OR completed_at >= %s)
+    """
+    # Nine [day_start, day_end) pairs for the FILTER clauses, in SELECT order
+    return sql, [day_start, day_end] * 9 + params + [day_start, day_start]
+
+
+def _minutes(seconds):
+    return round(float(seconds) / 60, 1) if seconds is not None else None
+
+
 @app.route('/admin/stats/<department>')
 def get_admin_stats(department):
+    today = datetime.now().date()
+    etag = _department_etag(department, today)
+    if etag and etag in request.if_none_match:
+        return _not_modified(etag)
     conn = get_db_connection()
     if not conn:
         return jsonify({"error": "Database connection failed"}), 500
     try:
         cur = conn.cursor()
+        etag = etag or _department_etag(department, today, cur=cur)
+        if etag and etag in request.if_none_match:
+            conn.close()
+            return _not_modified(etag)
         institution_id = request.args.get('institution_id')
-        today = datetime.now().strftime('%Y-%m-%d')
+        day_start, day_end = _day_range(today)
         ft, fv = _resolve_department(department, cur, institution_id)
         where, params = _queue_where(ft, fv, institution_id)
-
-        cur.execute(f"SELECT COUNT(*) FROM queue WHERE {where} AND DATE(created_at) = %s", params + [today])
-        total_today = cur.fetchone()[0] or 0
-        cur.execute(f"SELECT COUNT(*) FROM queue WHERE {where} AND (completed IS NULL OR completed = FALSE)", params)
-        current_queue = cur.fetchone()[0] or 0
-        cur.execute(f"SELECT COUNT(*) FROM queue WHERE {where} AND completed = TRUE AND DATE(completed_at) = %s", params + [today])
-        completed_today = cur.fetchone()[0] or 0
-        avg_wait = max(current_queue * 5, 5)
+        cur.execute(*_admin_stats_query(where, params, day_start, day_end))
+        (total_today, current_queue, waiting, completed_today, called_today,
+         avg_wait, p50_wait, p90_wait, avg_service, p50_service, p90_service) = cur.fetchone()
         conn.close()
-        return jsonify({
+        # Expected wait for someone joining now: everyone still waiting, served
+        # at today's measured pace (falls back to the measured wait alone).
+        estimated = None
+        if avg_service is not None:
+            estimated = waiting * avg_service
+        elif avg_wait is not None:
+            estimated = avg_wait
+        return _with_etag(jsonify({
             "totalToday": total_today, "currentQueue": current_queue,
-            "completedToday": completed_today, "avgWaitTime": avg_wait
-        })
+            "waiting": waiting, "calledToday": called_today,
+            "completedToday": completed_today,
+            "avgWaitTime": _minutes(avg_wait) or 0,
+            "p50WaitTime": _minutes(p50_wait), "p90WaitTime": _minutes(p90_wait),
+            "avgServiceTime": _minutes(avg_service),
+            "p50ServiceTime": _minutes(p50_service), "p90ServiceTime": _minutes(p90_service),
+            "estimatedWaitTime": _minutes(estimated)
+        }), etag)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -1241,13 +4123,16 @@ def call_queue(queue_id):
     try:
         data = request.json
         cur = conn.cursor()
-        cur.execute("""
-            UPDATE queue SET called = TRUE, called_at = NOW(), called_by = %s, status = 'called'
-            WHERE id = %s AND completed = FALSE
-        """, (data.get('calledBy'), queue_id))
-        if cur.rowcount == 0:
+        cur.execute(f"""
+            UPDATE queue SET called_at = NOW(), state = {STATE_CALLED}
+            WHERE {_by_queue_id()} AND {QUEUE_STATUS_FILTERS['active']}
+            RETURNING {CHANGE_RETURNING}
+        """, (queue_id,))
+        rows = _change_rows(cur)
+        if not rows:
             conn.close()
             return jsonify({"error": "Queue not found or already completed"}), 404
+        _queue_changed(cur, 'called', rows, data.get('calledBy'))
         conn.commit()
         conn.close()
         return jsonify({"success": True, "message": "Queue called", "status": "called"})
@@ -1255,6 +4140,55 @@ def call_queue(queue_id):
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/admin/services/<int:service_id>/call-next', methods=['POST'])
+def call_next(service_id):
+    """Call the oldest waiting ticket of today for a service, in one statement.
+
+    Body: calledBy, preferPresent (call tickets marked "I'm here" first).
+    The candidate row is locked with FOR UPDATE SKIP LOCKED, so counters
+    serving the same service never wait on each other nor call the same
+    ticket twice. It is matched back by (seq, created_at), so the UPDATE
+    is pruned to the ticket's day partition.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+    try:
+        data = request.get_json(silent=True) or {}
+        order = "is_present IS TRUE DESC, seq" if data.get('preferPresent') else "seq"
+        cur = conn.cursor()
+        cur.execute(f"""
+            UPDATE queue SET called_at = NOW(), state = {STATE_CALLED}
+            WHERE (seq, created_at) = (
+                SELECT seq, created_at FROM queue
+                WHERE service_id = %s AND created_at >= %s AND created_at < %s
+                  AND state = {STATE_WAITING}
+                ORDER BY {order} LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING {CHANGE_RETURNING}, person, date, time, is_present, present_at, is_muted
+        """, (service_id, *_day_range(datetime.now().date())))
+        rows = _change_rows(cur)
+        if not rows:
+            conn.close()
+            return jsonify({"error": "No waiting queues"}), 404
+        _queue_changed(cur, 'called', rows, data.get('calledBy'))
+        conn.commit()
+        conn.close()
+        r = rows[0]
+        return jsonify({"success": True, "message": "Queue called", "status": "called", "queue": {
+            "id": r['id'], "number": r['number'], "person": r['person'], "date": display_date(r['date']),
+            "time": display_time(r['time']), "status": "called",
+            "created_at": r['created_at'].isoformat() if r['created_at'] else None,
+            "is_present": bool(r['is_present']),
+            "present_at": r['present_at'].isoformat() if r['present_at'] else None,
+            "is_muted": bool(r['is_muted']),
+            "seq": r['seq']
+        }})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/admin/return-queue/<queue_id>', methods=['POST'])
 def return_queue(queue_id):
     conn = get_db_connection()
@@ -1263,13 +4197,16 @@ def return_queue(queue_id):
     try:
         data = request.json
         cur = conn.cursor()
-        cur.execute("""
-            UPDATE queue SET called = FALSE, status = 'waiting', returned_by = %s, returned_at = NOW()
-            WHERE id = %s AND called = TRUE AND completed = FALSE
-        """, (data.get('returnedBy'), queue_id))
-        if cur.rowcount == 0:
+        cur.execute(f"""
+            UPDATE queue SET state = {STATE_WAITING}
+            WHERE {_by_queue_id()} AND state = {STATE_CALLED}
+            RETURNING {CHANGE_RETURNING}
+        """, (queue_id,))
+        rows = _change_rows(cur)
+        if not rows:
             conn.close()
             return jsonify({"error": "Queue not found, not called, or already completed"}), 404
+        _queue_changed(cur, 'returned', rows, data.get('returnedBy'))
         conn.commit()
         conn.close()
         return jsonify({"success": True, "message": "Queue returned to waiting", "status": "waiting"})
@@ -1285,13 +4222,21 @@ def complete_queue(queue_id):
     try:
         data = request.json
         cur = conn.cursor()
-        cur.execute("""
-            UPDATE queue SET completed = TRUE, completed_at = NOW(), completed_by = %s,
-            status = 'completed', called = TRUE WHERE id = %s
-        """, (data.get('completedBy'), queue_id))
-        if cur.rowcount == 0:
+        cur.execute(f"""
+            UPDATE queue SET completed_at = NOW(), state = {STATE_COMPLETED}
+            WHERE {_by_queue_id()} AND {QUEUE_STATUS_FILTERS['active']}
+            RETURNING {CHANGE_RETURNING}
+        """, (queue_id,))
+        rows = _change_rows(cur)
+        if not rows:
+            # Completing twice is a no-op, not an error
+            cur.execute(f"SELECT 1 FROM queue WHERE {_by_queue_id()}", (queue_id,))
+            exists = cur.fetchone()
             conn.close()
-            return jsonify({"error": "Queue not found"}), 404
+            if not exists:
+                return jsonify({"error": "Queue not found"}), 404
+            return jsonify({"success": True, "message": "Queue completed"})
+        _queue_changed(cur, 'completed', rows, data.get('completedBy'))
         conn.commit()
         conn.close()
         return jsonify({"success": True, "message": "Queue completed"})
@@ -1301,25 +4246,32 @@ def complete_queue(queue_id):
 
 @app.route('/admin/activity/<department>')
 def get_recent_activity(department):
+    etag = _department_etag(department)
+    if etag and etag in request.if_none_match:
+        return _not_modified(etag)
     conn = get_db_connection()
     if not conn:
         return jsonify({"error": "Database connection failed"}), 500
     try:
         cur = conn.cursor()
+        etag = etag or _department_etag(department, cur=cur)
+        if etag and etag in request.if_none_match:
+            conn.close()
+            return _not_modified(etag)
         institution_id = request.args.get('institution_id')
         ft, fv = _resolve_department(department, cur, institution_id)
         where, params = _queue_where(ft, fv, institution_id)
         cur.execute(f"""
-            SELECT number, person, completed_at FROM queue
-            WHERE {where} AND completed = TRUE
+            SELECT number, person, completed_at FROM queue_all
+            WHERE {where} AND state = {STATE_COMPLETED}
             ORDER BY completed_at DESC LIMIT 10
         """, params)
         rows = cur.fetchall()
         conn.close()
-        return jsonify([{
+        return _with_etag(jsonify([{
             "number": r[0], "person": r[1],
             "completedAt": r[2].strftime('%Y-%m-%d %H:%M') if r[2] else None
-        } for r in rows])
+        } for r in rows]), etag)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -1331,13 +4283,17 @@ def mute_queue(queue_id):
         return jsonify({"success": False, "error": "Database connection failed"}), 500
     try:
         cur = conn.cursor()
-        cur.execute("SELECT number FROM queue WHERE id = %s AND called = TRUE AND completed = FALSE", (queue_id,))
-        if not cur.fetchone():
+        data = request.json
+        cur.execute(f"""
+            UPDATE queue SET is_muted = TRUE
+            WHERE {_by_queue_id()} AND state = {STATE_CALLED}
+            RETURNING {CHANGE_RETURNING}
+        """, (queue_id,))
+        rows = _change_rows(cur)
+        if not rows:
             conn.close()
             return jsonify({"success": False, "error": "Queue not found, not called, or already completed"}), 404
-        data = request.json
-        cur.execute("UPDATE queue SET is_muted = TRUE, muted_at = NOW(), muted_by = %s WHERE id = %s",
-                    (data.get('mutedBy'), queue_id))
+        _queue_changed(cur, 'muted', rows, data.get('mutedBy'))
         conn.commit()
         conn.close()
         return jsonify({"success": True, "message": "Queue muted"})
@@ -1352,11 +4308,16 @@ def unmute_queue(queue_id):
         return jsonify({"success": False, "error": "Database connection failed"}), 500
     try:
         cur = conn.cursor()
-        cur.execute("SELECT number FROM queue WHERE id = %s AND called = TRUE AND completed = FALSE", (queue_id,))
-        if not cur.fetchone():
+        cur.execute(f"""
+            UPDATE queue SET is_muted = FALSE
+            WHERE {_by_queue_id()} AND state = {STATE_CALLED}
+            RETURNING {CHANGE_RETURNING}
+        """, (queue_id,))
+        rows = _change_rows(cur)
+        if not rows:
             conn.close()
             return jsonify({"success": False, "error": "Queue not found, not called, or already completed"}), 404
-        cur.execute("UPDATE queue SET is_muted = FALSE, muted_at = NULL, muted_by = NULL WHERE id = %s", (queue_id,))
+        _queue_changed(cur, 'unmuted', rows)
         conn.commit()
         conn.close()
         return jsonify({"success": True, "message": "Queue unmuted"})
@@ -1364,46 +4325,397 @@ def unmute_queue(queue_id):
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+# action -> (SET clause, tickets it applies to, change action); the same
+# transitions as the single-ticket endpoints above
+BULK_ACTIONS = {
+    'call': (f"called_at = NOW(), state = {STATE_CALLED}",
+             QUEUE_STATUS_FILTERS['active'], 'called'),
+    'return': (f"state = {STATE_WAITING}", QUEUE_STATUS_FILTERS['called'], 'returned'),
+    'complete': (f"completed_at = NOW(), state = {STATE_COMPLETED}",
+                 QUEUE_STATUS_FILTERS['active'], 'completed'),
+    'mute': ("is_muted = TRUE", QUEUE_STATUS_FILTERS['called'], 'muted'),
+    'unmute': ("is_muted = FALSE", QUEUE_STATUS_FILTERS['called'], 'unmuted'),
+}
+BULK_MAX_IDS = 1000
+# filter key -> column compared with "< cutoff"
+BULK_CUTOFF_FILTERS = {'called_before': 'called_at', 'created_before': 'created_at'}
+
+
+def _parse_cutoff(value):
+    """ISO timestamp, or HH:MM meaning today at that time."""
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.combine(datetime.now().date(), datetime.strptime(value, '%H:%M').time())
+    except (TypeError, ValueError):
+        return None
+
+
+@app.route('/admin/queue/bulk', methods=['POST'])
+@require_admin()
+def bulk_queue_action():
+    """Apply one action to many tickets in a single UPDATE.
+
+    Needs an admin session; only tickets of the admin's service (or
+    institution, for institution admins) are touched; ``by`` defaults to
+    the admin's username.
+
+    Body: action (call|return|complete|mute|unmute), by, and either
+    ``ids`` (list of queue ids, per-id results returned) or ``filter``:
+    department (required), institution_id, status (see QUEUE_STATUS_FILTERS),
+    date (YYYY-MM-DD), called_before / created_before (ISO timestamp or HH:MM
+    today). E.g. complete everything called before 17:00:
+    ``{"action": "complete", "filter": {"department": "2", "called_before": "17:00"}}``.
+    """
+    data = request.get_json(silent=True) or {}
+    action = BULK_ACTIONS.get(data.get('action'))
+    if not action:
+        return jsonify({"success": False, "error": f"Invalid action '{data.get('action')}'"}), 400
+    set_clause, eligible, change = action
+    ids, flt = data.get('ids'), data.get('filter')
+    if (ids is None) == (flt is None):
+        return jsonify({"success": False, "error": "Provide either ids or filter"}), 400
+    if ids is not None:
+        if not isinstance(ids, list) or not ids:
+            return jsonify({"success": False, "error": "ids must be a non-empty list"}), 400
+        if len(ids) > BULK_MAX_IDS:
+            return jsonify({"success": False, "error": f"At most {BULK_MAX_IDS} ids per request"}), 400
+        ids = [str(i) for i in dict.fromkeys(ids)]
+    elif not isinstance(flt, dict) or not flt.get('department'):
+        return jsonify({"success": False, "error": "filter.department is required"}), 400
+
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"success": False, "error": "Database connection failed"}), 500
+    try:
+        cur = conn.cursor()
+        if ids is not None:
+            where, params = "(id, created_at) IN (SELECT id, created_at FROM queue_ids WHERE id = ANY(%s))", [ids]
+        else:
+            ft, fv = _resolve_department(str(flt['department']), cur, flt.get('institution_id'))
+            where, params = _queue_where(ft, fv, flt.get('institution_id'))
+            status = flt.get('status')
+            if status:
+                if status not in QUEUE_STATUS_FILTERS:
+                    conn.close()
+                    return jsonify({"success": False, "error": f"Invalid status '{status}'"}), 400
+                if QUEUE_STATUS_FILTERS[status]:
+                    where += f" AND {QUEUE_STATUS_FILTERS[status]}"
+            if flt.get('date'):
+                day = parse_date(flt['date'])
+                if not day:
+                    conn.close()
+                    return jsonify({"success": False, "error": f"Invalid date '{flt['date']}'"}), 400
+                where += " AND created_at >= %s AND created_at < %s"
+                params += list(_day_range(day))
+            for key, column in BULK_CUTOFF_FILTERS.items():
+                if flt.get(key):
+                    cutoff = _parse_cutoff(flt[key])
+                    if not cutoff:
+                        conn.close()
+                        return jsonify({"success": False, "error": f"Invalid {key} '{flt[key]}'"}), 400
+                    where += f" AND {column} < %s"
+                    params.append(cutoff)
+        scope, scope_params = _admin_scope()
+        cur.execute(f"""
+            UPDATE queue SET {set_clause}
+            WHERE {where} AND {scope} AND {eligible}
+            RETURNING {CHANGE_RETURNING}
+        """, params + scope_params)
+        rows = _change_rows(cur)
+        if rows:
+            _queue_changed(cur, change, rows, data.get('by') or g.admin['username'])
+        result = {"success": True, "action": data['action'], "updated": len(rows)}
+        if ids is not None:
+            updated = {str(r['id']) for r in rows}
+            cur.execute(f"SELECT id FROM queue WHERE {where} AND {scope}", params + scope_params)
+            existing = {r[0] for r in cur.fetchall()}
+            result["results"] = [{
+                "id": i,
+                "result": "updated" if i in updated else ("unchanged" if i in existing else "not_found"),
+            } for i in ids]
+        else:
+            result["ids"] = [str(r['id']) for r in rows]
+        conn.commit()
+        conn.close()
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 # =================================================================
 # ADMIN STATUS
 # =================================================================
 
+ADMIN_STATUSES = ('available', 'busy', 'away')
+PRESENCE_CHANNEL = 'admin_presence'
+
+
+class PresenceCache:
+    """Per-worker read cache of admin_presence.
+
+    The whole table (one row per service) is loaded on first use and dropped
+    whenever a NOTIFY on PRESENCE_CHANNEL arrives. If the listener is not
+    connected (e.g. a frozen serverless instance) entries are trusted for at
+    most ``ttl`` seconds instead.
+    """
+
+    def __init__(self, listener, ttl=30.0):
+        self._listener = listener
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = None       # {service_id: (status, institution_id, prefix)}
+        self._loaded_at = 0.0
+
+    def invalidate(self, payload=None):
+        with self._lock:
+            self._entries = None
+
+    def _load(self):
+        with db_pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT p.service_id, p.status, s.institution_id, TRIM(s.prefix)
+                FROM admin_presence p JOIN services s ON s.id = p.service_id
+            """)
+            return {r[0]: (r[1], r[2], r[3]) for r in cur.fetchall()}
+
+    def _snapshot(self):
+        with self._lock:
+            entries = self._entries
+            fresh = self._listener.connected or time.monotonic() - self._loaded_at < self.ttl
+        if entries is not None and fresh:
+            return entries
+        entries = self._load()
+        with self._lock:
+            self._entries, self._loaded_at = entries, time.monotonic()
+        return entries
+
+    def get(self, service_id):
+        entry = self._snapshot().get(int(service_id))
+        return entry[0] if entry else 'available'
+
+    def get_by_prefix(self, prefix, institution_id=None):
+        """Status for a legacy prefix lookup (lowest matching service wins)."""
+        for sid, (status, inst, pfx) in sorted(self._snapshot().items()):
+            if pfx == prefix and (not institution_id or inst == institution_id):
+                return status
+        return 'available'
+
+
+admin_presence = PresenceCache(db_listener, ttl=float(os.environ.get('PRESENCE_CACHE_TTL', 30)))
+
+
+def _presence_changed(payload):
+    """Wake the live streams of every service named in a presence NOTIFY payload."""
+    for sid in (payload or '').split(','):
+        if sid.isdigit():
+            event_hub.publish(('service', int(sid)))
+
+
+# Registration order matters: drop the cache before streams re-read it
+db_listener.subscribe(PRESENCE_CHANNEL, admin_presence.invalidate, admin_presence.invalidate)
+db_listener.subscribe(PRESENCE_CHANNEL, _presence_changed)
+
+
 @app.route('/admin/status', methods=['POST'])
 def set_admin_status():
-    try:
-        data = request.get_json()
-        department = data.get('department', '')
-        status = data.get('status')
-        service_id = data.get('service_id')
+    """Set presence for one service (``service_id``, or a numeric ``department``).
+
+    A legacy department name sets every service with that department's prefix,
+    optionally narrowed to ``institution_id``.
+    """
+    data = request.get_json(silent=True) or {}
+    department = str(data.get('department') or '')
+    status = data.get('status')
+    service_id = data.get('service_id') or (department if department.isdigit() else None)
 
-        if status not in ('available', 'busy', 'away'):
-            return jsonify({"success": False, "error": "Invalid status"}), 400
+    if status not in ADMIN_STATUSES:
+        return jsonify({"success": False, "error": "Invalid status"}), 400
+    if not service_id and department not in LEGACY_DEPT_MAPPING:
+        return jsonify({"success": False, "error": "Invalid department"}), 400
 
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"success": False, "error": "Database connection failed"}), 500
+    try:
+        cur = conn.cursor()
         if service_id:
-            conn = get_db_connection()
-            if conn:
-                cur = conn.cursor()
-                cur.execute("SELECT prefix FROM services WHERE id = %s", (service_id,))
-                row = cur.fetchone()
-                conn.close()
-                if row:
-                    admin_statuses[row[0].strip()] = status
-                    return jsonify({"success": True, "department": row[0].strip(), "status": status})
-
-        prefix = LEGACY_DEPT_MAPPING.get(department)
-        if not prefix:
-            return jsonify({"success": False, "error": "Invalid department"}), 400
-        admin_statuses[prefix] = status
-        return jsonify({"success": True, "department": prefix, "status": status})
+            where, params = "id = %s", [service_id]
+        else:
+            where, params = "TRIM(prefix) = %s", [LEGACY_DEPT_MAPPING[department]]
+            if data.get('institution_id'):
+                where += " AND institution_id = %s"
+                params.append(data['institution_id'])
+        cur.execute(f"""
+            WITH svc AS (SELECT id, TRIM(prefix) AS prefix FROM services WHERE {where}),
+            up AS (
+                INSERT INTO admin_presence (service_id, status, updated_at)
+                SELECT id, %s, NOW() FROM svc
+                ON CONFLICT (service_id) DO UPDATE SET status = EXCLUDED.status, updated_at = EXCLUDED.updated_at
+                RETURNING service_id
+            )
+            SELECT up.service_id, svc.prefix FROM up JOIN svc ON svc.id = up.service_id ORDER BY 1
+        """, params + [status])
+        rows = cur.fetchall()
+        if not rows:
+            conn.rollback()
+            conn.close()
+            return jsonify({"success": False, "error": "Service not found"}), 404
+        # Delivered to every worker's listener when the transaction commits
+        cur.execute("SELECT pg_notify(%s, %s)", (PRESENCE_CHANNEL, ','.join(str(r[0]) for r in rows)))
+        conn.commit()
+        conn.close()
+        admin_presence.invalidate()
+        if not db_listener.connected:
+            _presence_changed(','.join(str(r[0]) for r in rows))
+        result = {"success": True, "department": rows[0][1], "status": status}
+        if service_id:
+            result["service_id"] = rows[0][0]
+        return jsonify(result)
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
 @app.route('/admin/status/<department>', methods=['GET'])
 def get_admin_status_endpoint(department):
+    """Presence for a service id, or for a legacy prefix (optionally ?institution_id=)."""
+    try:
+        if department.isdigit():
+            status = admin_presence.get(int(department))
+            return jsonify({"success": True, "department": department, "service_id": int(department), "status": status})
+        prefix = department.upper()
+        status = admin_presence.get_by_prefix(prefix, request.args.get('institution_id', type=int))
+        return jsonify({"success": True, "department": prefix, "status": status})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+# =================================================================
+# QUEUE EVENTS
+# =================================================================
+
+def _event_json(r):
+    return {"id": r[0], "queue_id": r[1], "service_id": r[2], "type": r[3], "actor": r[4],
+            "at": r[5].isoformat() if r[5] else None}
+
+
+@app.route('/queue/<queue_id>/history')
+def get_queue_event_history(queue_id):
+    """Every recorded action on one ticket, oldest first."""
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT id, queue_id, service_id, type, actor, at FROM queue_events
+            WHERE queue_id = %s ORDER BY id
+        """, (queue_id,))
+        rows = cur.fetchall()
+        conn.close()
+        if not rows:
+            return jsonify({"error": "Queue not found"}), 404
+        return jsonify([_event_json(r) for r in rows])
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/admin/events/<int:service_id>')
+def get_service_events(service_id):
+    """Audit log of a service, one keyset page at a time.
+
+    Query params: from / to (YYYY-MM-DD), type (comma-separated), after (id of
+    the last event already seen), limit (default 200, max 1000). When more
+    rows remain, the X-Next-After header holds the next ``after``.
+    """
+    date_from = parse_date(request.args.get('from'))
+    date_to = parse_date(request.args.get('to'))
+    if (request.args.get('from') and not date_from) or (request.args.get('to') and not date_to):
+        return jsonify({"error": "from/to must be dates (YYYY-MM-DD)"}), 400
+    after = request.args.get('after', type=int)
+    limit = request.args.get('limit', ADMIN_QUEUE_DEFAULT_LIMIT, type=int)
+    limit = max(1, min(limit, ADMIN_QUEUE_MAX_LIMIT))
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+    try:
+        where, params = "service_id = %s", [service_id]
+        if date_from:
+            where += " AND at >= %s"
+            params.append(_day_range(date_from)[0])
+        if date_to:
+            where += " AND at < %s"
+            params.append(_day_range(date_to)[1])
+        if request.args.get('type'):
+            where += " AND type = ANY(%s)"
+            params.append(request.args['type'].split(','))
+        if after is not None:
+            where += " AND id > %s"
+            params.append(after)
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT id, queue_id, service_id, type, actor, at FROM queue_events
+            WHERE {where} ORDER BY id LIMIT %s
+        """, params + [limit + 1])
+        rows = cur.fetchall()
+        conn.close()
+        resp = jsonify([_event_json(r) for r in rows[:limit]])
+        if len(rows) > limit:
+            resp.headers['X-Next-After'] = str(rows[limit - 1][0])
+        return resp
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# =================================================================
+# QUEUE PARTITIONS
+# =================================================================
+
+@app.route('/admin/partitions')
+def list_queue_partitions():
+    """Day partitions of the queue table with their estimated row counts."""
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+    try:
+        cur = conn.cursor()
+        parts = queue_partitions(cur)
+        cur.execute("""
+            SELECT c.relname, GREATEST(c.reltuples, 0)::bigint, pg_total_relation_size(c.oid)
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'queue'::regclass
+        """)
+        sizes = {name: (rows, size) for name, rows, size in cur.fetchall()}
+        conn.close()
+        return jsonify({
+            "retention_days": QUEUE_RETENTION_DAYS, "ahead_days": QUEUE_PARTITION_AHEAD_DAYS,
+            "default": {"rows": sizes.get('queue_default', (0, 0))[0], "bytes": sizes.get('queue_default', (0, 0))[1]},
+            "partitions": [{"day": day.isoformat(), "name": name,
+                            "rows": sizes.get(name, (0, 0))[0], "bytes": sizes.get(name, (0, 0))[1]}
+                           for day, name in sorted(parts.items())],
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/admin/partitions/maintain', methods=['POST'])
+@require_admin('super-admin')
+def maintain_partitions_endpoint():
+    """Create upcoming partitions now; body ``retention_days`` overrides
+    QUEUE_RETENTION_DAYS for this run (whole days are dropped, not deleted)."""
+    data = request.get_json(silent=True) or {}
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"success": False, "error": "Database connection failed"}), 500
     try:
-        status = admin_statuses.get(department.upper(), 'available')
-        return jsonify({"success": True, "department": department.upper(), "status": status})
+        created, dropped = maintain_queue_partitions(conn, data.get('retention_days'))
+        conn.commit()
+        conn.close()
+        return jsonify({"success": True, "created": created,
+                        "dropped": [{"name": name, "rows": rows} for name, rows in dropped]})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -1412,6 +4724,17 @@ def get_admin_status_endpoint(department):
 # DELETE QUEUES
 # =================================================================
 
+def _delete_tickets(conn, where, params):
+    """Delete the live and archived tickets matching ``where``, with their
+    queue_ids routes, in committed batches; returns how many went. Each
+    batch notifies the services it touched."""
+    def on_batch(cur, rows):
+        cur.execute("DELETE FROM queue_ids WHERE id = ANY(%s)", ([queue_id for queue_id, _, _ in rows],))
+        _notify_services_changed(cur, 'deleted', list({(inst, sid) for _, inst, sid in rows}))
+    return sum(_delete_in_batches(conn, table, key, where, params, 'id, institution_id, service_id', on_batch)
+               for table, key in (('queue', 'seq, created_at'), ('queue_history', 'seq')))
+
+
 @app.route('/admin/delete-all-queues', methods=['DELETE', 'POST'])
 def delete_all_queues():
     conn = get_db_connection()
@@ -1424,16 +4747,17 @@ def delete_all_queues():
             institution_id = request.json.get('institution_id')
 
         if institution_id:
-            cur.execute("SELECT COUNT(*) FROM queue WHERE institution_id = %s", (institution_id,))
-            total = cur.fetchone()[0] or 0
-            cur.execute("DELETE FROM queue WHERE institution_id = %s", (institution_id,))
+            deleted = _delete_tickets(conn, "institution_id = %s", (institution_id,))
         else:
-            cur.execute("SELECT COUNT(*) FROM queue")
-            total = cur.fetchone()[0] or 0
-            cur.execute("DELETE FROM queue")
-
-        deleted = cur.rowcount
-        conn.commit()
+            # Everything goes: empty every partition instead of deleting row by row
+            cur.execute("LOCK TABLE queue, queue_history, queue_ids IN ACCESS EXCLUSIVE MODE")
+            cur.execute("SELECT institution_id, service_id, COUNT(*) FROM queue_all GROUP BY 1, 2")
+            groups = cur.fetchall()
+            cur.execute("TRUNCATE queue, queue_history, queue_ids")
+            deleted = sum(n for _, _, n in groups)
+            _notify_services_changed(cur, 'deleted', [(inst, sid) for inst, sid, _ in groups])
+            conn.commit()
+        total = deleted
         conn.close()
         return jsonify({
             "success": True, "message": f"Deleted {deleted} queues",
@@ -1451,12 +4775,8 @@ def delete_department_queues(department):
     try:
         cur = conn.cursor()
         ft, fv = _resolve_department(department, cur)
-        if ft == 'service_id':
-            cur.execute("DELETE FROM queue WHERE service_id = %s", (fv,))
-        else:
-            cur.execute("DELETE FROM queue WHERE person LIKE %s", (fv,))
-        deleted = cur.rowcount
-        conn.commit()
+        where = "service_id = %s" if ft == 'service_id' else "person LIKE %s"
+        deleted = _delete_tickets(conn, where, (fv,))
         conn.close()
         return jsonify({"success": True, "message": f"Deleted {deleted} queues", "deleted": deleted, "department": department})
     except Exception as e:
@@ -1475,7 +4795,7 @@ def emergency_audio():
         queue_number = data.get('queue_number', 'Unknown')
         try:
             subprocess.Popen([sys.executable, 'emergency_audio.py', str(queue_number)],
-                             cwd=os.path.dirname(os.path.abspath(__file__)))
+                             cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
             return jsonify({"success": True, "message": f"Emergency audio triggered for {queue_number}"})
         except FileNotFoundError:
             return jsonify({"success": False, "error": "Emergency audio script not found"}), 404
@@ -1489,12 +4809,30 @@ def emergency_audio():
 # ANALYTICS
 # =================================================================
 
+def _hourly_counts(cur, service_ids, day_start, day_end):
+    """Tickets created per service per hour of one day, read from the hourly rollup.
+
+    Returns {service_id: [24 counts]} with every requested service present.
+    """
+    counts = {sid: [0] * 24 for sid in service_ids}
+    if not service_ids:
+        return counts
+    cur.execute("""
+        SELECT service_id, bucket, created
+        FROM queue_hourly_rollup
+        WHERE service_id = ANY(%s) AND bucket >= %s AND bucket < %s
+    """, (list(service_ids), day_start, day_end))
+    for sid, bucket, n in cur.fetchall():
+        counts[sid][bucket.hour] += n
+    return counts
+
+
 @app.route('/analytics/hourly-queue-data')
 def get_hourly_queue_data():
     try:
         now = datetime.now()
         current_hour = now.hour
-        max_hour = max(current_hour + 2, 8)
+        max_hour = min(max(current_hour + 2, 8), 23)
         institution_id = request.args.get('institution_id')
 
         labels = []
@@ -1509,29 +4847,17 @@ def get_hourly_queue_data():
         if conn:
             try:
                 cur = conn.cursor()
-                today = now.strftime('%Y-%m-%d')
+                day_start, _ = _day_range(now.date())
                 if institution_id:
                     cur.execute("SELECT id, name, prefix FROM services WHERE institution_id = %s AND is_active = TRUE ORDER BY display_order", (institution_id,))
                 else:
                     cur.execute("SELECT id, name, prefix FROM services WHERE is_active = TRUE ORDER BY institution_id, display_order LIMIT 10")
                 svcs = cur.fetchall()
+                counts = _hourly_counts(cur, [sv[0] for sv in svcs], day_start,
+                                        day_start + timedelta(hours=current_hour + 1))
 
                 for idx, (sid, sname, spfx) in enumerate(svcs):
-                    data_arr = [0] * (max_hour + 1)
-                    for h in range(0, min(current_hour + 1, max_hour + 1)):
-                        if institution_id:
-                            cur.execute("""
-                                SELECT COUNT(*) FROM queue
-                                WHERE service_id = %s AND institution_id = %s
-                                AND DATE(created_at) = %s AND EXTRACT(HOUR FROM created_at) = %s
-                            """, (sid, institution_id, today, h))
-                        else:
-                            cur.execute("""
-                                SELECT COUNT(*) FROM queue
-                                WHERE service_id = %s AND DATE(created_at) = %s
-                                AND EXTRACT(HOUR FROM created_at) = %s
-                            """, (sid, today, h))
-                        data_arr[h] = cur.fetchone()[0] or 0
+                    data_arr = counts[sid][:max_hour + 1]
                     datasets.append({
                         'label': sname,
                         'data': data_arr,
@@ -1559,7 +4885,7 @@ def get_hourly_department_data():
             return jsonify({'error': 'Database connection failed'}), 500
 
         cur = conn.cursor()
-        today = datetime.now().strftime('%Y-%m-%d')
+        day_start, day_end = _day_range(datetime.now().date())
         institution_id = request.args.get('institution_id')
 
         if institution_id:
@@ -1568,23 +4894,13 @@ def get_hourly_department_data():
             cur.execute("SELECT id, name, prefix FROM services WHERE is_active = TRUE ORDER BY institution_id, display_order LIMIT 10")
 
         svcs = cur.fetchall()
+        counts = _hourly_counts(cur, [sv[0] for sv in svcs], day_start, day_end)
         result = {}
 
         for sid, sname, spfx in svcs:
             key = spfx.strip().lower()
-            hourly = [0] * 24
-            total = 0
-            cur.execute("""
-                SELECT EXTRACT(HOUR FROM created_at), COUNT(*)
-                FROM queue WHERE service_id = %s AND DATE(created_at) = %s
-                GROUP BY EXTRACT(HOUR FROM created_at)
-            """, (sid, today))
-            for row in cur.fetchall():
-                h = int(row[0]) if row[0] is not None else 0
-                if 0 <= h < 24:
-                    hourly[h] = row[1]
-                    total += row[1]
-            result[key] = {'hourlyData': hourly, 'totalToday': total, 'name': sname}
+            hourly = counts[sid]
+            result[key] = {'hourlyData': hourly, 'totalToday': sum(hourly), 'name': sname}
 
         # backward compat keys
         legacy_map = {'a': 'dean', 'b': 'ie', 'c': 'cpe', 'd': 'ece', 'e': 'others'}
@@ -1601,6 +4917,84 @@ def get_hourly_department_data():
         return jsonify({}), 500
 
 
+ROLLUP_GRANULARITIES = ('hour', 'day', 'week', 'month')
+
+
+@app.route('/analytics/rollup')
+def get_analytics_rollup():
+    """Created/called/completed counts and mean wait/service minutes per service
+    and bucket over a date range, read from queue_hourly_rollup.
+
+    Query params: institution_id and/or service_id, from/to (YYYY-MM-DD,
+    inclusive, default the last 7 days), granularity (hour|day|week|month).
+    """
+    institution_id = request.args.get('institution_id', type=int)
+    service_id = request.args.get('service_id', type=int)
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in ROLLUP_GRANULARITIES:
+        return jsonify({"error": f"granularity must be one of {', '.join(ROLLUP_GRANULARITIES)}"}), 400
+    if not institution_id and not service_id:
+        return jsonify({"error": "institution_id or service_id is required"}), 400
+    today = datetime.now().date()
+    date_to = parse_date(request.args.get('to')) or today
+    date_from = parse_date(request.args.get('from')) or (date_to - timedelta(days=6))
+    start, end = _day_range(date_from)[0], _day_range(date_to)[1]
+
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+    try:
+        cur = conn.cursor()
+        clauses, params = ["bucket >= %s", "bucket < %s"], [start, end]
+        if institution_id:
+            clauses.append("institution_id = %s")
+            params.append(institution_id)
+        if service_id:
+            clauses.append("service_id = %s")
+            params.append(service_id)
+        cur.execute(f"""
+            SELECT service_id, date_trunc(%s, bucket) AS period,
+                   SUM(created), SUM(called), SUM(completed), SUM(served),
+                   SUM(wait_seconds), SUM(service_seconds)
+            FROM queue_hourly_rollup
+            WHERE {' AND '.join(clauses)}
+            GROUP BY service_id, period
+            ORDER BY service_id, period
+        """, [granularity] + params)
+        rows = cur.fetchall()
+        conn.close()
+        return jsonify({
+            "from": date_from.isoformat(), "to": date_to.isoformat(), "granularity": granularity,
+            "buckets": [{
+                "service_id": r[0], "bucket": r[1].isoformat(),
+                "created": r[2], "called": r[3], "completed": r[4],
+                "avgWaitTime": _minutes(r[6] / r[3]) if r[3] else None,
+                "avgServiceTime": _minutes(r[7] / r[5]) if r[5] else None,
+            } for r in rows]
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/admin/rollup/backfill', methods=['POST'])
+@require_admin('super-admin')
+def rollup_backfill():
+    """Rebuild the hourly rollup for an optional from/to day range (JSON body)."""
+    data = request.get_json(silent=True) or {}
+    start = _day_range(parse_date(data['from']))[0] if data.get('from') else None
+    end = _day_range(parse_date(data['to']))[1] if data.get('to') else None
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"success": False, "error": "Database connection failed"}), 500
+    try:
+        buckets = backfill_hourly_rollup(conn, start, end)
+        conn.commit()
+        conn.close()
+        return jsonify({"success": True, "buckets": buckets})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 # =================================================================
 # DEBUG
 # =================================================================
@@ -1625,6 +5019,35 @@ def debug_db():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route('/debug/events')
+def debug_events():
+    return jsonify({"success": True, "listener_connected": db_listener.connected,
+                    "notifications_received": db_listener.received, "hub": event_hub.stats()})
+
+
+@app.route('/debug/engine')
+def debug_engine():
+    """Queue engine counters plus a memory-vs-database comparison of every
+    loaded service (?repair=1 drops inconsistent services so they reload)."""
+    try:
+        repair = request.args.get('repair', '').lower() in ('1', 'true')
+        report = queue_engine.check(repair=repair)
+        return jsonify({"success": all(r['consistent'] for r in report),
+                        "engine": queue_engine.stats(), "services": report})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/debug/access')
+def debug_access():
+    return jsonify({"success": True, "access": access_recorder.stats()})
+
+
+@app.route('/debug/pool')
+def debug_pool():
+    return jsonify({"success": True, "pool": db_pool.stats()})
+
+
 @app.route('/debug/query')
 def debug_query():
     try:
@@ -4,3 +4,34 @@ const API_BASE_URL = window.location.hostname === 'localhost' || window.location
     : '/api';  // Use /api prefix for Vercel deployment
 
 console.log('Using API Base URL:', API_BASE_URL);
+
+// Fetch every page of a keyset-paginated list (e.g. /admin/queue): follows
+// the X-Next-After header until the server stops sending it.
+async function fetchAllPages(url) {
+    const rows = [];
+    let after = null;
+    do {
+        const response = await fetch(after === null ? url : `${url}&after=${after}`);
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        rows.push(...await response.json());
+        after = response.headers.get('X-Next-After');
+    } while (after !== null);
+    return rows;
+}
+
+// Authorization header for admin-only endpoints (/admin/queue/bulk, ...):
+// the bearer token /auth/login returned, kept in the stored adminSession.
+function authHeaders(headers = {}) {
+    const session = JSON.parse(localStorage.getItem('adminSession') || 'null');
+    return session && session.token ? { ...headers, Authorization: `Bearer ${session.token}` } : headers;
+}
+
+// End the server-side session, then forget it locally.
+async function endAdminSession() {
+    try {
+        await fetch(`${API_BASE_URL}/auth/logout`, { method: 'POST', headers: authHeaders() });
+    } catch (e) {
+        // Offline: the token still expires on its own
+    }
+    localStorage.removeItem('adminSession');
+}
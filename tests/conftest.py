@@ -0,0 +1,139 @@
+"""Shared fixtures.
+
+api/index.py is loaded once per session as ``api``. Tests that need
+PostgreSQL run against a throwaway database created on the server named by
+TEST_DATABASE_URL (e.g. ``postgresql://postgres@localhost/postgres``) and
+are skipped when it is not set.
+"""
+import importlib.util
+import os
+import pathlib
+import uuid
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+ADMIN_URL = os.environ.get('TEST_DATABASE_URL')
+
+# No background threads: tests drive workers and caches explicitly
+os.environ.setdefault('DB_LISTEN', 'false')
+os.environ.setdefault('QUEUE_ARCHIVE', 'false')
+os.environ.setdefault('ROLLOVER', 'false')
+
+# Per-test data; schema, seed data and service_versions survive between tests
+DATA_TABLES = ['queue', 'queue_history', 'queue_events', 'queue_counters', 'queue_hourly_rollup',
+               'rollover_runs', 'admin_presence', 'admin_sessions', 'queue_ids']
+
+
+def load_api(name='api_index'):
+    spec = importlib.util.spec_from_file_location(name, ROOT / 'api' / 'index.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _admin_connect():
+    conn = psycopg2.connect(ADMIN_URL)
+    conn.autocommit = True
+    return conn
+
+
+def create_database():
+    """Create an empty database; returns its DSN."""
+    name = f"qms_test_{uuid.uuid4().hex[:12]}"
+    conn = _admin_connect()
+    conn.cursor().execute(f'CREATE DATABASE {name}')
+    conn.close()
+    return psycopg2.extensions.make_dsn(ADMIN_URL, dbname=name)
+
+
+def drop_database(dsn):
+    name = psycopg2.extensions.parse_dsn(dsn)['dbname']
+    conn = _admin_connect()
+    conn.cursor().execute(f'DROP DATABASE IF EXISTS {name} WITH (FORCE)')
+    conn.close()
+
+
+requires_db = pytest.mark.skipif(not ADMIN_URL, reason='TEST_DATABASE_URL is not set')
+
+
+@pytest.fixture(scope='session')
+def api():
+    return load_api()
+
+
+@pytest.fixture(scope='session')
+def database(api):
+    """The session's migrated database; DATABASE_URL points the app at it."""
+    if not ADMIN_URL:
+        pytest.skip('TEST_DATABASE_URL is not set')
+    dsn = create_database()
+    os.environ['DATABASE_URL'] = dsn
+    conn = psycopg2.connect(dsn)
+    api.apply_migrations(conn)
+    conn.close()
+    yield dsn
+    api.db_pool.closeall()
+    drop_database(dsn)
+
+
+@pytest.fixture
+def empty_database():
+    """A fresh, unmigrated database (for migration tests)."""
+    if not ADMIN_URL:
+        pytest.skip('TEST_DATABASE_URL is not set')
+    dsn = create_database()
+    yield dsn
+    drop_database(dsn)
+
+
+@pytest.fixture
+def db(database):
+    """A direct connection to the session database."""
+    conn = psycopg2.connect(database)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def client(api, database, db):
+    """A test client over a clean set of queue tables and empty caches."""
+    cur = db.cursor()
+    cur.execute(f"TRUNCATE {', '.join(DATA_TABLES)} RESTART IDENTITY")
+    db.commit()
+    api._reset_change_caches()
+    api.service_versions._ticket_services.clear()
+    api.admin_presence.invalidate()
+    api.app.testing = True
+    return api.app.test_client()
+
+
+@pytest.fixture
+def service(db):
+    """(id, institution_id, prefix) of the seeded 'A' service."""
+    cur = db.cursor()
+    cur.execute("SELECT id, institution_id, TRIM(prefix) FROM services WHERE prefix = 'A' ORDER BY id LIMIT 1")
+    return cur.fetchone()
+
+
+def make_tickets(client, service_id, count=1):
+    """Create tickets through POST /queue; returns their ids."""
+    ids = []
+    for _ in range(count):
+        body = client.post('/api/queue', json={'service_id': service_id, 'person': 'Visitor'}).get_json()
+        assert body['success'], body
+        ids.append(body['id'])
+    return ids
+
+
+# Seeded admin accounts (migration 2)
+PASSWORDS = {'super-admin': 'admin2026', 'dean': 'dean2025', 'ie-chair': 'ie2025'}
+
+
+def login(client, username):
+    """Log in as a seeded admin; returns the Authorization header."""
+    body = client.post('/api/auth/login', json={'username': username, 'password': PASSWORDS[username]}).get_json()
+    assert body['success'], body
+    return {'Authorization': f"Bearer {body['token']}"}
@@ -0,0 +1,41 @@
+"""Ticket page reads without a write per visit (user-016)."""
+import pytest
+
+from conftest import make_tickets
+
+
+@pytest.fixture
+def recorder(api, monkeypatch):
+    """The access recorder without its background flush thread."""
+    monkeypatch.setattr(api.access_recorder, '_thread', type('Alive', (), {'is_alive': lambda self: True})())
+    monkeypatch.setattr(api.access_recorder, '_pending', {})
+    return api.access_recorder
+
+
+def row_version(db, ticket):
+    cur = db.cursor()
+    cur.execute("SELECT xmin::text, accessed, accessed_at FROM queue WHERE id = %s", (ticket,))
+    row = cur.fetchone()
+    db.rollback()
+    return row
+
+
+def test_first_visit_marks_accessed_and_later_ones_do_not_write(client, service, db, recorder):
+    [ticket] = make_tickets(client, service[0])
+    assert client.get(f'/api/queue/{ticket}').get_json()['number'] == 'A001'
+    xmin, accessed, first_at = row_version(db, ticket)
+    assert accessed and first_at is not None
+    assert client.get(f'/api/queue/{ticket}/accessed').get_json()['accessed'] is True
+
+    client.get(f'/api/queue/{ticket}')
+    client.get(f'/api/queue/{ticket}')
+    assert row_version(db, ticket)[0] == xmin
+    assert list(recorder._pending) == [ticket]
+
+    assert recorder.flush() == 1
+    assert row_version(db, ticket)[2] > first_at
+
+
+def test_unknown_ticket_is_404_without_recording(client, recorder):
+    assert client.get('/api/queue/nope').status_code == 404
+    assert recorder._pending == {}
@@ -0,0 +1,54 @@
+"""Keyset-paginated admin queue listing (user-005)."""
+import pytest
+
+
+@pytest.fixture
+def service_id(db):
+    cur = db.cursor()
+    cur.execute("SELECT id FROM services WHERE prefix = 'B' ORDER BY id LIMIT 1")
+    return cur.fetchone()[0]
+
+
+def fetch_all_pages(client, url):
+    """What config.js fetchAllPages does: follow X-Next-After until it is absent."""
+    rows, after, pages = [], None, 0
+    while True:
+        response = client.get(url if after is None else f'{url}&after={after}')
+        assert response.status_code == 200
+        rows += response.get_json()
+        pages += 1
+        after = response.headers.get('X-Next-After')
+        if after is None:
+            return rows, pages
+
+
+def test_pages_cover_every_ticket_once_in_order(client, service_id):
+    for _ in range(5):
+        client.post('/api/queue', json={'service_id': service_id, 'person': 'Visitor'})
+    rows, pages = fetch_all_pages(client, f'/api/admin/queue/{service_id}?status=all&limit=2')
+    assert pages == 3
+    assert [r['number'] for r in rows] == [f'B{n:03d}' for n in range(1, 6)]
+    assert [r['seq'] for r in rows] == sorted(r['seq'] for r in rows)
+
+
+def test_last_page_has_no_next_header(client, service_id):
+    client.post('/api/queue', json={'service_id': service_id, 'person': 'Visitor'})
+    response = client.get(f'/api/admin/queue/{service_id}?status=all&limit=1')
+    assert len(response.get_json()) == 1
+    assert 'X-Next-After' not in response.headers
+
+
+def test_active_filter_excludes_finished_tickets(api, client, service_id, db):
+    for _ in range(3):
+        client.post('/api/queue', json={'service_id': service_id, 'person': 'Visitor'})
+    cur = db.cursor()
+    cur.execute(f"""
+        UPDATE queue SET state = {api.STATE_COMPLETED}, called_at = NOW(), completed_at = NOW()
+        WHERE number = 'B002'
+    """)
+    db.commit()
+    api._reset_change_caches()
+    rows = client.get(f'/api/admin/queue/{service_id}').get_json()
+    assert [r['number'] for r in rows] == ['B001', 'B003']
+    rows = client.get(f'/api/admin/queue/{service_id}?status=completed').get_json()
+    assert [(r['number'], r['status']) for r in rows] == [('B002', 'completed')]
@@ -0,0 +1,67 @@
+"""Atomic ticket numbering from queue_counters (user-003)."""
+import threading
+
+
+def create(client, **fields):
+    body = {'person': 'Visitor', 'status': 'waiting', **fields}
+    return client.post('/api/queue', json=body)
+
+
+def test_numbers_are_sequential_per_service(client, service):
+    service_id, _, prefix = service
+    numbers = [create(client, service_id=service_id).get_json()['number'] for _ in range(3)]
+    assert numbers == [f'{prefix}001', f'{prefix}002', f'{prefix}003']
+
+
+def test_prefix_resolves_the_service_and_client_number_is_ignored(client, service):
+    service_id, institution_id, prefix = service
+    create(client, service_id=service_id)
+    body = create(client, institution_id=institution_id, prefix=prefix, number=f'{prefix}001').get_json()
+    assert body['success'] and body['number'] == f'{prefix}002'
+    assert body['service_id'] == service_id
+
+
+def test_counter_day_comes_from_the_database(client, service, db):
+    create(client, service_id=service[0])
+    cur = db.cursor()
+    cur.execute("SELECT day = CURRENT_DATE FROM queue_counters WHERE service_id = %s", (service[0],))
+    assert cur.fetchall() == [(True,)]
+
+
+def test_concurrent_creates_get_unique_numbers(api, client, service):
+    numbers, lock = [], threading.Lock()
+
+    def worker():
+        local = api.app.test_client()
+        for _ in range(5):
+            number = create(local, service_id=service[0]).get_json()['number']
+            with lock:
+                numbers.append(number)
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(numbers) == [f'{service[2]}{n:03d}' for n in range(1, 31)]
+
+
+def test_rejects_unknown_service_missing_service_and_exhausted_day(api, client, service, db):
+    assert create(client, service_id=999999).status_code == 404
+    assert create(client, number='A001').status_code == 400
+    cur = db.cursor()
+    cur.execute("""
+        INSERT INTO queue_counters (institution_id, service_id, day, last_value)
+        VALUES (%s, %s, CURRENT_DATE, %s)
+    """, (service[1], service[0], api.MAX_QUEUE_SEQUENCE))
+    db.commit()
+    assert create(client, service_id=service[0]).status_code == 400
+
+
+def test_next_number_preview(client, service):
+    service_id, institution_id, prefix = service
+    assert client.get(f'/api/queue/next-number/{prefix}').status_code == 400
+    assert client.get(f'/api/queue/next-number/Z?institution_id={institution_id}').status_code == 404
+    create(client, service_id=service_id)
+    preview = client.get(f'/api/queue/next-number/{prefix}?institution_id={institution_id}').get_json()
+    assert preview['queue_number'] == f'{prefix}002'
+    assert create(client, service_id=service_id).get_json()['number'] == preview['queue_number']
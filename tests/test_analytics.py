@@ -0,0 +1,33 @@
+"""Per-hour analytics from one grouped query (user-008)."""
+from datetime import datetime
+
+from conftest import make_tickets
+
+
+def test_department_data_counts_tickets_per_hour(client, service, db):
+    make_tickets(client, service[0], 2)
+    cur = db.cursor()
+    cur.execute("SELECT id FROM services WHERE institution_id = %s AND prefix = 'B'", (service[1],))
+    make_tickets(client, cur.fetchone()[0])
+    hour = datetime.now().hour
+
+    data = client.get(f'/api/analytics/hourly-department-data?institution_id={service[1]}').get_json()
+    assert data['a']['hourlyData'][hour] == 2 and data['a']['totalToday'] == 2
+    assert data['b']['totalToday'] == 1
+    # Legacy department keys alias the prefix keys
+    assert data['dean'] == data['a'] and data['ie'] == data['b']
+    assert all(len(v['hourlyData']) == 24 for v in data.values())
+
+
+def test_hourly_queue_data_has_one_dataset_per_service(client, service, db):
+    make_tickets(client, service[0], 3)
+    cur = db.cursor()
+    cur.execute("SELECT name FROM services WHERE institution_id = %s AND is_active = TRUE ORDER BY display_order",
+                (service[1],))
+    names = [r[0] for r in cur.fetchall()]
+    hour = datetime.now().hour
+
+    data = client.get(f'/api/analytics/hourly-queue-data?institution_id={service[1]}').get_json()
+    assert [d['label'] for d in data['datasets']] == names
+    assert len(data['labels']) == len(data['datasets'][0]['data']) == min(max(hour + 2, 8), 23) + 1
+    assert sum(d['data'][hour] for d in data['datasets']) == 3
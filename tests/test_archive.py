@@ -0,0 +1,104 @@
+"""Moving finished tickets from queue into queue_history (user-022)."""
+from datetime import datetime, timedelta
+
+import psycopg2.errors
+import pytest
+
+from conftest import login, make_tickets
+
+
+def backdate(db, ids, days):
+    """Move tickets ``days`` back, as if created then."""
+    cur = db.cursor()
+    for table in ('queue', 'queue_ids'):
+        cur.execute(f"UPDATE {table} SET created_at = created_at - %s * interval '1 day' WHERE id = ANY(%s)",
+                    (days, ids))
+    db.commit()
+
+
+def expire(api, db, service):
+    """Roll the institution over, expiring its backdated unfinished tickets."""
+    api.rollover_institution(db, service[1], force=True)
+
+
+def where_are(db, ids):
+    cur = db.cursor()
+    cur.execute("""
+        SELECT id, 'queue' FROM queue WHERE id = ANY(%(ids)s)
+        UNION ALL SELECT id, 'history' FROM queue_history WHERE id = ANY(%(ids)s)
+    """, {'ids': ids})
+    rows = dict(cur.fetchall())
+    db.rollback()
+    return [rows.get(i) for i in ids]
+
+
+def test_moves_old_tickets_and_counts_them(api, client, service, db):
+    old = make_tickets(client, service[0], 3)
+    today = make_tickets(client, service[0])
+    backdate(db, old, 2)
+    expire(api, db, service)
+    assert api.queue_archiver.run() == 3
+    assert where_are(db, old + today) == ['history'] * 3 + ['queue']
+    # Still readable through queue_all by id
+    assert client.get(f'/api/queue/{old[0]}').get_json()['id'] == old[0]
+
+
+def test_batches_until_drained(api, client, service, db, monkeypatch):
+    ids = make_tickets(client, service[0], 5)
+    backdate(db, ids, 2)
+    expire(api, db, service)
+    monkeypatch.setattr(api.queue_archiver, 'batch_size', 2)
+    assert api.queue_archiver.run(max_batches=1) == 2
+    assert api.queue_archiver.run() == 3
+    assert where_are(db, ids) == ['history'] * 5
+
+
+def test_a_row_history_rejects_stays_in_queue(api, client, service, db):
+    ids = make_tickets(client, service[0], 2)
+    backdate(db, ids, 2)
+    expire(api, db, service)
+    cur = db.cursor()
+    # A history row already holding the seq of one of them
+    cur.execute("""
+        INSERT INTO queue_history (id, seq, institution_id, service_id, number, date, time, state, created_at)
+        SELECT 'clash', seq, institution_id, service_id, number, date, time, state, created_at
+        FROM queue WHERE id = %s
+    """, (ids[0],))
+    db.commit()
+    with pytest.raises(psycopg2.errors.UniqueViolation):
+        api.queue_archiver.run()
+    assert where_are(db, ids) == ['queue', 'queue']
+
+
+def test_unfinished_tickets_wait_for_the_rollover(api, client, service, db):
+    waiting, called = make_tickets(client, service[0], 2)
+    client.post(f'/api/admin/call-queue/{called}', json={})
+    backdate(db, [waiting, called], 2)
+    assert api.queue_archiver.run() == 0
+    assert where_are(db, [waiting, called]) == ['queue', 'queue']
+    expire(api, db, service)
+    assert api.queue_archiver.run() == 2
+
+
+def test_emptied_partitions_are_dropped_by_maintenance_not_the_archiver(api, client, service, db, monkeypatch):
+    yesterday = datetime.now().date() - timedelta(days=1)
+    ids = make_tickets(client, service[0], 2)
+    backdate(db, ids, 1)
+    cur = db.cursor()
+    api._create_queue_partition(cur, yesterday)
+    db.commit()
+    expire(api, db, service)
+    monkeypatch.setattr(api.queue_archiver, 'after_hours', 0)
+    assert api.queue_archiver.run() == 2
+    assert yesterday in api.queue_partitions(cur)
+    _, dropped = api.maintain_queue_partitions(db)
+    db.commit()
+    assert (api._partition_name(yesterday), 0) in dropped
+    assert yesterday not in api.queue_partitions(cur)
+
+
+def test_endpoint_requires_super_admin(api, client):
+    assert client.post('/api/admin/archive/run').status_code == 401
+    assert client.post('/api/admin/archive/run', headers=login(client, 'dean')).status_code == 403
+    body = client.post('/api/admin/archive/run', headers=login(client, 'super-admin')).get_json()
+    assert body['success'] and body['archiver']['running'] is api.queue_archiver.is_running() is False
@@ -0,0 +1,70 @@
+"""Admin sessions and the role check on admin-only endpoints (user-020)."""
+import pytest
+
+from conftest import login, make_tickets
+
+
+def bulk(client, headers, **body):
+    return client.post('/api/admin/queue/bulk', json={'action': 'call', **body}, headers=headers)
+
+
+@pytest.fixture
+def other_service(db, service):
+    """(id, prefix) of the 'B' service, run by ie-chair."""
+    cur = db.cursor()
+    cur.execute("SELECT id, TRIM(prefix) FROM services WHERE prefix = 'B' AND institution_id = %s", (service[1],))
+    return cur.fetchone()
+
+
+def test_bulk_requires_a_session(client, service):
+    ids = make_tickets(client, service[0])
+    assert bulk(client, {}, ids=ids).status_code == 401
+    assert bulk(client, {'Authorization': 'Bearer nonsense'}, ids=ids).status_code == 401
+
+
+def test_only_a_hash_of_the_token_is_stored(client, db):
+    token = login(client, 'super-admin')['Authorization'].split()[1]
+    cur = db.cursor()
+    cur.execute("SELECT token_hash FROM admin_sessions")
+    hashes = [h for (h,) in cur.fetchall()]
+    assert hashes and token not in hashes
+
+
+def test_logout_and_expiry_end_the_session(client, db, service):
+    ids = make_tickets(client, service[0], 2)
+    headers = login(client, 'super-admin')
+    assert client.post('/api/auth/logout', headers=headers).get_json()['success']
+    assert bulk(client, headers, ids=ids[:1]).status_code == 401
+
+    headers = login(client, 'super-admin')
+    cur = db.cursor()
+    cur.execute("UPDATE admin_sessions SET expires_at = NOW() - interval '1 second'")
+    db.commit()
+    assert bulk(client, headers, ids=ids[1:]).status_code == 401
+
+
+def test_service_admin_only_touches_their_own_service(client, service, other_service):
+    own = make_tickets(client, other_service[0])
+    foreign = make_tickets(client, service[0])
+    response = bulk(client, login(client, 'ie-chair'), ids=own + foreign)
+    assert response.status_code == 200
+    results = {r['id']: r['result'] for r in response.get_json()['results']}
+    assert results == {own[0]: 'updated', foreign[0]: 'not_found'}
+
+
+def test_institution_admin_and_super_admin_reach_every_service(client, db, service, other_service):
+    ids = make_tickets(client, service[0]) + make_tickets(client, other_service[0])
+    assert bulk(client, login(client, 'dean'), ids=ids).get_json()['updated'] == 2
+    body = bulk(client, login(client, 'super-admin'), action='complete', ids=ids).get_json()
+    assert body['updated'] == 2
+    cur = db.cursor()
+    cur.execute("SELECT DISTINCT actor FROM queue_events WHERE type = 'completed'")
+    assert cur.fetchall() == [('super-admin',)]
+
+
+def test_require_admin_rejects_other_roles(api, client):
+    view = api.require_admin('super-admin')(lambda: {'user': api.g.admin['username']})
+    with api.app.test_request_context(headers=login(client, 'dean')):
+        assert view()[1] == 403
+    with api.app.test_request_context(headers=login(client, 'super-admin')):
+        assert view() == {'user': 'super-admin'}
@@ -0,0 +1,48 @@
+"""Atomic call-next with SKIP LOCKED (user-019)."""
+import threading
+
+from conftest import make_tickets
+
+
+def call_next(client, service_id, **body):
+    return client.post(f'/api/admin/services/{service_id}/call-next', json=body)
+
+
+def test_calls_the_oldest_waiting_ticket(client, service):
+    make_tickets(client, service[0], 3)
+    first = call_next(client, service[0], calledBy='desk-1').get_json()['queue']
+    assert (first['number'], first['status']) == ('A001', 'called')
+    assert call_next(client, service[0]).get_json()['queue']['number'] == 'A002'
+
+
+def test_prefer_present_jumps_the_queue(client, service):
+    ids = make_tickets(client, service[0], 3)
+    client.post(f'/api/queue/im-here/{ids[2]}')
+    assert call_next(client, service[0], preferPresent=True).get_json()['queue']['number'] == 'A003'
+    assert call_next(client, service[0]).get_json()['queue']['number'] == 'A001'
+
+
+def test_nothing_waiting_is_404(client, service):
+    [ticket] = make_tickets(client, service[0])
+    client.post(f'/api/admin/complete-queue/{ticket}', json={})
+    assert call_next(client, service[0]).status_code == 404
+
+
+def test_concurrent_counters_never_call_the_same_ticket(api, client, service):
+    make_tickets(client, service[0], 12)
+    called, lock = [], threading.Lock()
+
+    def counter():
+        local = api.app.test_client()
+        while True:
+            response = call_next(local, service[0])
+            if response.status_code == 404:
+                return
+            with lock:
+                called.append(response.get_json()['queue']['number'])
+    threads = [threading.Thread(target=counter) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(called) == [f'A{n:03d}' for n in range(1, 13)]
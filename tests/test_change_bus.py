@@ -0,0 +1,72 @@
+"""LISTEN/NOTIFY change bus for queue mutations (user-012)."""
+import json
+import queue
+import select
+import time
+
+import psycopg2
+import pytest
+
+from conftest import make_tickets
+
+
+@pytest.fixture
+def listen(api, database):
+    conn = psycopg2.connect(database)
+    conn.autocommit = True
+    conn.cursor().execute(f'LISTEN "{api.QUEUE_CHANNEL}"')
+
+    def received(timeout=0.5):
+        events = []
+        while select.select([conn], [], [], timeout) != ([], [], []):
+            conn.poll()
+            events += [json.loads(n.payload) for n in conn.notifies]
+            conn.notifies.clear()
+        return events
+    yield received
+    conn.close()
+
+
+def test_each_committed_mutation_notifies_with_the_next_version(client, service, listen):
+    [ticket] = make_tickets(client, service[0])
+    client.post(f'/api/admin/call-queue/{ticket}', json={})
+    created, called = listen()
+    assert (created['a'], created['st'], created['q'], created['n']) == ('created', 'waiting', ticket, 'A001')
+    assert (called['a'], called['st'], called['s']) == ('called', 'called', service[0])
+    assert called['v'] == created['v'] + 1
+
+
+def test_rolled_back_mutation_sends_nothing(api, service, db, listen):
+    cur = db.cursor()
+    api._notify_services_changed(cur, 'deleted', [(service[1], service[0])])
+    db.rollback()
+    assert listen() == []
+
+
+def test_listener_dispatches_and_runs_reconnect_hooks(api, database):
+    received, reconnects = queue.Queue(), []
+    listener = api.NotificationListener(lambda: psycopg2.connect(database), poll_interval=0.1)
+    listener.subscribe('test_channel', received.put, lambda: reconnects.append(1))
+    listener.start()
+    try:
+        deadline = time.monotonic() + 5
+        while not listener.connected and time.monotonic() < deadline:
+            time.sleep(0.05)
+        conn = psycopg2.connect(database)
+        conn.cursor().execute("SELECT pg_notify('test_channel', 'hello')")
+        conn.commit()
+        conn.close()
+        assert received.get(timeout=5) == 'hello'
+        assert reconnects == [1]
+    finally:
+        listener.stop()
+
+
+def test_event_hub_never_blocks_on_a_full_subscriber(api):
+    hub = api.EventHub(maxsize=1)
+    sub = hub.subscribe(('service', 1))
+    hub.publish(('service', 1), {'v': 1})
+    hub.publish(('service', 1), {'v': 2})
+    assert sub.get_nowait() == {'v': 1} and sub.empty()
+    hub.unsubscribe(('service', 1), sub)
+    assert hub.stats() == {'keys': 0, 'subscribers': 0}
@@ -0,0 +1,121 @@
+"""In-memory per-service queue engine: replays, gaps and reordering (user-018).
+
+These drive QueueEngine directly with a stubbed loader, so they run without
+PostgreSQL.
+"""
+import types
+from datetime import datetime
+
+import pytest
+
+SERVICE = 7
+
+
+@pytest.fixture
+def loads():
+    return []
+
+
+@pytest.fixture
+def engine(api, loads):
+    """An engine whose service 7 loads at version 1 with A001..A003 waiting."""
+    engine = api.QueueEngine(types.SimpleNamespace(connected=True), pool=None)
+
+    def fetch(service_id, day):
+        loads.append(service_id)
+        rows = [(f't{n}', n, f'A00{n}', False, False, False, False) for n in (1, 2, 3)]
+        return api.ServiceQueue(service_id, day, 1, rows, None)
+    engine._fetch = fetch
+    engine.service(SERVICE)
+    return engine
+
+
+def event(action, ticket, version, **extra):
+    return dict({'s': SERVICE, 'q': ticket, 'a': action, 'v': version}, **extra)
+
+
+def serving(engine):
+    return engine.ticket('t3', SERVICE)['current_serving']
+
+
+def test_replayed_call_does_not_reorder_the_call_list(engine):
+    # A bulk call: two tickets in one transaction share version 2
+    engine.apply(event('called', 't1', 2))
+    engine.apply(event('called', 't2', 2))
+    assert serving(engine) == 'A002'
+    # The NOTIFY echo of the same transaction
+    engine.apply(event('called', 't1', 2))
+    engine.apply(event('called', 't2', 2))
+    assert serving(engine) == 'A002'
+    assert engine.stats()['replays'] == 2
+
+
+def test_replayed_created_and_completed_are_no_ops(engine, loads):
+    new = event('created', 't4', 2, sq=4, n='A004')
+    engine.apply(new)
+    engine.apply(event('completed', 't1', 3))
+    engine.apply(new)
+    engine.apply(event('completed', 't1', 3))
+    state = engine.ticket('t4', SERVICE)
+    assert (state['position'], state['waiting_count'], state['last_completed_queue']) == (3, 3, 'A001')
+    assert loads == [SERVICE]
+
+
+def test_events_already_in_the_load_are_ignored(engine):
+    engine.apply(event('called', 't1', 1))
+    assert engine.ticket('t1', SERVICE)['called'] is False
+
+
+def test_out_of_order_events_wait_for_the_gap_to_fill(engine, loads):
+    engine.apply(event('called', 't2', 3))
+    assert engine.ticket('t3', SERVICE) is None   # behind a missing version: SQL
+    engine.apply(event('called', 't1', 2))
+    assert serving(engine) == 'A002'
+    assert engine.ticket('t3', SERVICE)['position'] == 1
+    assert loads == [SERVICE]
+    assert engine.stats()['reordered'] == 1 and engine.stats()['gaps'] == 0
+
+
+def test_echo_of_a_held_event_is_not_applied_twice(engine):
+    engine.apply(event('called', 't1', 3))
+    engine.apply(event('called', 't1', 3))
+    engine.apply(event('called', 't2', 2))
+    assert serving(engine) == 'A001'
+
+
+def test_gap_that_never_fills_reloads_the_service(engine, loads):
+    engine.gap_timeout = 0
+    engine.apply(event('called', 't2', 3))
+    assert engine.ticket('t3', SERVICE) is not None
+    assert loads == [SERVICE, SERVICE]
+    assert engine.stats()['gaps'] == 1
+
+
+def test_too_many_held_versions_reload_the_service(engine, loads):
+    engine.max_pending = 2
+    for version in (3, 4, 5):
+        engine.apply(event('present', 't3', version))
+    engine.ticket('t3', SERVICE)
+    assert loads == [SERVICE, SERVICE]
+
+
+def test_late_unseen_event_and_service_wide_change_reload(engine, loads):
+    engine.apply(event('called', 't1', 2))
+    engine.apply(event('called', 't2', 3))
+    engine.apply(event('muted', 't3', 2))
+    engine.ticket('t3', SERVICE)
+    assert len(loads) == 2
+    engine.apply({'s': SERVICE, 'q': None, 'a': 'deleted', 'v': 2})
+    engine.ticket('t3', SERVICE)
+    assert len(loads) == 3
+
+
+def test_inactive_without_a_listener(api):
+    engine = api.QueueEngine(types.SimpleNamespace(connected=False), pool=None)
+    assert engine.service(SERVICE) is None and engine.ticket('t1', SERVICE) is None
+
+
+def test_loaded_day_rolls_over(api, engine, loads):
+    engine._services[SERVICE].day = datetime(2000, 1, 1).date()
+    engine.ticket('t1', SERVICE)
+    assert loads == [SERVICE, SERVICE]
@@ -0,0 +1,41 @@
+"""ETag / 304 from per-service versions (user-014)."""
+from conftest import make_tickets
+
+
+def test_admin_queue_revalidates_until_the_service_changes(client, service):
+    [ticket] = make_tickets(client, service[0])
+    url = f'/api/admin/queue/{service[0]}'
+    first = client.get(url)
+    etag = first.headers['ETag']
+    assert first.headers['X-Queue-Version']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    client.post(f'/api/admin/call-queue/{ticket}', json={})
+    changed = client.get(url, headers={'If-None-Match': etag})
+    assert changed.status_code == 200 and changed.headers['ETag'] != etag
+    assert int(changed.headers['X-Queue-Version']) == int(first.headers['X-Queue-Version']) + 1
+
+
+def test_etag_depends_on_the_query(client, service):
+    make_tickets(client, service[0])
+    active = client.get(f'/api/admin/queue/{service[0]}').headers['ETag']
+    every = client.get(f'/api/admin/queue/{service[0]}?status=all').headers['ETag']
+    assert active != every
+    assert client.get(f'/api/admin/queue/{service[0]}?status=all',
+                      headers={'If-None-Match': active}).status_code == 200
+
+
+def test_ticket_status_and_stats_revalidate(client, service):
+    [ticket] = make_tickets(client, service[0])
+    for url in (f'/api/queue/{ticket}/status', f'/api/admin/stats/{service[0]}'):
+        etag = client.get(url).headers['ETag']
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    etag = client.get(f'/api/queue/{ticket}/status').headers['ETag']
+    # Presence is part of the status ETag
+    client.post('/api/admin/status', json={'service_id': service[0], 'status': 'away'})
+    response = client.get(f'/api/queue/{ticket}/status', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.get_json()['admin_status'] == 'away'
+
+
+def test_legacy_department_has_no_etag(client):
+    assert 'ETag' not in client.get('/api/admin/queue/dean').headers
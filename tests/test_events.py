@@ -0,0 +1,32 @@
+"""Per-ticket history and the per-service audit log (user-024)."""
+from conftest import make_tickets
+
+
+def test_ticket_history_lists_actions_in_order(client, service):
+    ticket = make_tickets(client, service[0])[0]
+    client.post(f'/api/admin/call-queue/{ticket}', json={'calledBy': 'desk-1'})
+    client.post(f'/api/admin/complete-queue/{ticket}', json={'completedBy': 'desk-1'})
+    events = client.get(f'/api/queue/{ticket}/history').get_json()
+    assert [(e['type'], e['actor']) for e in events] == [('created', None), ('called', 'desk-1'),
+                                                        ('completed', 'desk-1')]
+    assert client.get('/api/queue/nope/history').status_code == 404
+
+
+def test_service_log_pages_with_next_after(client, service):
+    make_tickets(client, service[0], 3)
+    url = f'/api/admin/events/{service[0]}?limit=2'
+    first = client.get(url)
+    assert len(first.get_json()) == 2
+    second = client.get(f"{url}&after={first.headers['X-Next-After']}")
+    assert len(second.get_json()) == 1 and 'X-Next-After' not in second.headers
+    ids = [e['id'] for e in first.get_json() + second.get_json()]
+    assert ids == sorted(ids)
+
+
+def test_service_log_filters(client, service):
+    ticket = make_tickets(client, service[0], 2)[0]
+    client.post(f'/api/admin/call-queue/{ticket}', json={})
+    events = client.get(f'/api/admin/events/{service[0]}?type=called').get_json()
+    assert [(e['queue_id'], e['type']) for e in events] == [(ticket, 'called')]
+    assert client.get(f'/api/admin/events/{service[0]}?from=2000-01-01&to=2000-01-02').get_json() == []
+    assert client.get(f'/api/admin/events/{service[0]}?from=yesterday').status_code == 400
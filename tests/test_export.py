@@ -0,0 +1,41 @@
+"""Streaming queue history exports (user-006)."""
+import csv
+import io
+import json
+
+from conftest import make_tickets
+
+
+def test_ndjson_streams_every_row_in_batches(api, client, service, monkeypatch):
+    monkeypatch.setattr(api, 'EXPORT_BATCH_SIZE', 2)
+    ids = make_tickets(client, service[0], 5)
+    client.post(f'/api/admin/call-queue/{ids[0]}', json={'calledBy': 'desk-1'})
+    response = client.get(f'/api/admin/queue-history/{service[0]}?format=ndjson')
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.is_streamed
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [r['id'] for r in rows] == ids
+    assert (rows[0]['status'], rows[0]['called_by']) == ('called', 'desk-1')
+    assert rows[1]['status'] == 'waiting' and rows[1]['called_by'] is None
+    assert api.db_pool.stats()['in_use'] == 0
+
+
+def test_csv_has_header_and_one_line_per_ticket(api, client, service):
+    make_tickets(client, service[0], 3)
+    response = client.get(f'/api/admin/queue-history/{service[0]}?format=csv')
+    assert response.mimetype == 'text/csv'
+    assert 'attachment' in response.headers['Content-Disposition']
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0] == api.EXPORT_COLUMNS
+    assert [r[1] for r in rows[1:]] == ['A001', 'A002', 'A003']
+
+
+def test_date_range_filters_the_export(client, service):
+    make_tickets(client, service[0], 2)
+    assert client.get(f'/api/admin/queue-history/{service[0]}?from=2000-01-01&to=2000-01-02').get_json() == []
+    assert len(client.get(f'/api/admin/queue-history/{service[0]}?from=2000-01-01').get_json()) == 2
+
+
+def test_rejects_unknown_format_and_bad_dates(client, service):
+    assert client.get(f'/api/admin/queue-history/{service[0]}?format=xml').status_code == 400
+    assert client.get(f'/api/admin/queue-history/{service[0]}?from=yesterday').status_code == 400
@@ -0,0 +1,108 @@
+"""The hot queue/login queries can use the indexes built for them (user-004).
+
+Sequential scans are disabled for the check so the near-empty test tables
+still show whether an index is *usable*; any remaining Seq Scan means it is not.
+"""
+from datetime import datetime
+
+import pytest
+
+
+def plan_scans(plan):
+    """Return (index names, seq-scanned relations) found in an EXPLAIN (FORMAT JSON) plan."""
+    indexes, seq_scans = set(), set()
+    stack = [plan[0]['Plan']]
+    while stack:
+        node = stack.pop()
+        if 'Index Name' in node:
+            indexes.add(node['Index Name'])
+        if node.get('Node Type') == 'Seq Scan':
+            seq_scans.add(node.get('Relation Name'))
+        stack.extend(node.get('Plans', []))
+    return indexes, seq_scans
+
+
+@pytest.fixture
+def explain(db):
+    cur = db.cursor()
+    cur.execute("SET enable_seqscan = off")
+
+    def run(sql, params):
+        cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        indexes, seq_scans = plan_scans(cur.fetchone()[0])
+        assert indexes and not seq_scans, (indexes, seq_scans)
+        return indexes
+    yield run
+    db.rollback()
+
+
+@pytest.fixture
+def scope(api, db):
+    cur = db.cursor()
+    cur.execute("SELECT id, institution_id FROM services ORDER BY id LIMIT 1")
+    service_id, institution_id = cur.fetchone()
+    where, params = api._queue_where('service_id', service_id, institution_id)
+    return service_id, institution_id, where, params, api._day_range(datetime.now().date())
+
+
+def test_admin_stats_uses_an_index(api, explain, scope):
+    _, _, where, params, (day_start, day_end) = scope
+    explain(*api._admin_stats_query(where, params, day_start, day_end))
+
+
+def test_admin_queue_page_scans_service_seq_in_todays_partition(api, explain, scope):
+    _, _, where, params, (day_start, day_end) = scope
+    indexes = explain(f"""
+        SELECT id FROM queue
+        WHERE {where} AND {api.QUEUE_STATUS_FILTERS['active']} AND created_at >= %s AND created_at < %s
+          AND seq > %s ORDER BY seq LIMIT %s
+    """, params + [day_start, day_end, 0, api.ADMIN_QUEUE_DEFAULT_LIMIT + 1])
+    assert len(indexes) == 1 and 'service_id_seq' in indexes.pop()
+
+
+def test_call_next_candidate_uses_an_index(api, explain, scope):
+    service_id, _, _, _, (day_start, day_end) = scope
+    explain(f"""
+        SELECT seq FROM queue
+        WHERE service_id = %s AND created_at >= %s AND created_at < %s AND state = {api.STATE_WAITING}
+        ORDER BY seq LIMIT 1
+    """, [service_id, day_start, day_end])
+
+
+def test_hourly_rollup_uses_service_bucket_index(explain, scope):
+    service_id, _, _, _, (day_start, day_end) = scope
+    indexes = explain("""
+        SELECT service_id, bucket, created FROM queue_hourly_rollup
+        WHERE service_id = ANY(%s) AND bucket >= %s AND bucket < %s
+    """, [[service_id], day_start, day_end])
+    assert 'idx_rollup_service_bucket' in indexes or 'queue_hourly_rollup_pkey' in indexes
+
+
+def test_login_lookups_use_user_indexes(explain, scope):
+    _, institution_id, _, _, _ = scope
+    explain("SELECT id FROM users WHERE institution_id = %s AND username = %s", [institution_id, 'dean'])
+    assert explain("SELECT id FROM users WHERE username = %s", ['super-admin']) == {'idx_users_username'}
+
+
+def test_service_events_page_uses_service_id_index(explain, scope):
+    service_id, _, _, _, _ = scope
+    indexes = explain("""
+        SELECT id FROM queue_events WHERE service_id = %s AND id > %s ORDER BY id LIMIT %s
+    """, [service_id, 0, 201])
+    assert indexes == {'idx_queue_events_service'}
+
+
+def test_active_tickets_use_the_state_partial_index(api, db, explain, scope):
+    service_id, _, _, _, (day_start, day_end) = scope
+    indexes = explain(f"""
+        SELECT id FROM queue
+        WHERE service_id = %s AND created_at >= %s AND created_at < %s AND {api.QUEUE_STATUS_FILTERS['active']}
+    """, [service_id, day_start, day_end])
+    # Partition indexes get generated names; compare their parents
+    cur = db.cursor()
+    cur.execute("""
+        SELECT DISTINCT p.relname FROM pg_class c
+        JOIN pg_inherits i ON i.inhrelid = c.oid JOIN pg_class p ON p.oid = i.inhparent
+        WHERE c.relname = ANY(%s)
+    """, (list(indexes),))
+    assert [r[0] for r in cur.fetchall()] == ['idx_queue_active_service']
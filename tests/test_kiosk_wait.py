@@ -0,0 +1,38 @@
+"""Kiosk "QR scanned" long-poll (user-017)."""
+import threading
+import time
+
+from conftest import make_tickets
+
+
+def timed_get(client, url):
+    started = time.monotonic()
+    response = client.get(url)
+    return response.get_json(), time.monotonic() - started
+
+
+def test_wait_returns_when_the_ticket_page_is_opened(api, client, service):
+    [ticket] = make_tickets(client, service[0])
+
+    def open_page():
+        time.sleep(0.2)
+        api.app.test_client().get(f'/api/queue/{ticket}')
+    threading.Thread(target=open_page).start()
+    body, elapsed = timed_get(client, f'/api/queue/{ticket}/accessed?wait=5')
+    assert body['accessed'] is True and elapsed < 2
+
+
+def test_wait_times_out_and_already_accessed_answers_at_once(client, service):
+    [ticket] = make_tickets(client, service[0])
+    body, elapsed = timed_get(client, f'/api/queue/{ticket}/accessed?wait=0.3')
+    assert body['accessed'] is False and elapsed >= 0.3
+    client.get(f'/api/queue/{ticket}')
+    body, elapsed = timed_get(client, f'/api/queue/{ticket}/accessed?wait=5')
+    assert body['accessed'] is True and elapsed < 1
+
+
+def test_serverless_never_blocks(api, client, service, monkeypatch):
+    monkeypatch.setattr(api, 'SERVERLESS', True)
+    [ticket] = make_tickets(client, service[0])
+    body, elapsed = timed_get(client, f'/api/queue/{ticket}/accessed?wait=5')
+    assert body['accessed'] is False and elapsed < 1
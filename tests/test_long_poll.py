@@ -0,0 +1,53 @@
+"""Long-poll on the service version (user-015)."""
+import threading
+import time
+
+from conftest import make_tickets
+
+
+def timed_get(client, url):
+    started = time.monotonic()
+    response = client.get(url)
+    return response, time.monotonic() - started
+
+
+def version(client, ticket):
+    return int(client.get(f'/api/queue/{ticket}/status').headers['X-Queue-Version'])
+
+
+def test_waits_until_timeout_without_a_change(client, service):
+    [ticket] = make_tickets(client, service[0])
+    since = version(client, ticket)
+    response, elapsed = timed_get(client, f'/api/queue/{ticket}/status?wait=0.3&since={since}')
+    assert elapsed >= 0.3
+    assert int(response.headers['X-Queue-Version']) == since
+
+
+def test_returns_early_when_the_service_changes(api, client, service):
+    [ticket] = make_tickets(client, service[0])
+    since = version(client, ticket)
+
+    def call_later():
+        time.sleep(0.2)
+        api.app.test_client().post(f'/api/admin/call-queue/{ticket}', json={})
+    threading.Thread(target=call_later).start()
+    response, elapsed = timed_get(client, f'/api/queue/{ticket}/status?wait=5&since={since}')
+    assert elapsed < 2
+    assert response.get_json()['is_called']
+    assert int(response.headers['X-Queue-Version']) == since + 1
+
+
+def test_stale_since_answers_at_once(client, service):
+    [ticket] = make_tickets(client, service[0])
+    since = version(client, ticket)
+    _, elapsed = timed_get(client, f'/api/admin/queue/{service[0]}?wait=5&since={since - 1}')
+    assert elapsed < 1
+
+
+def test_serverless_never_blocks(api, client, service, monkeypatch):
+    monkeypatch.setattr(api, 'SERVERLESS', True)
+    [ticket] = make_tickets(client, service[0])
+    since = version(client, ticket)
+    for url in (f'/api/queue/{ticket}/status', f'/api/admin/queue/{service[0]}'):
+        response, elapsed = timed_get(client, f'{url}?wait=5&since={since}')
+        assert response.status_code == 200 and elapsed < 1
@@ -0,0 +1,56 @@
+"""Versioned, run-once migrations and the request-path schema check (user-002)."""
+import importlib
+import sys
+
+import psycopg2
+import pytest
+
+from conftest import ROOT
+
+
+def test_fresh_database_migrates_to_the_latest_version(api, empty_database):
+    conn = psycopg2.connect(empty_database)
+    assert api.get_schema_version(conn) == 0
+    assert api.apply_migrations(conn) == [v for v, _, _ in api.MIGRATIONS]
+    assert api.get_schema_version(conn) == api.SCHEMA_VERSION
+    assert api.apply_migrations(conn) == []
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM schema_migrations")
+    assert cur.fetchone()[0] == len(api.MIGRATIONS)
+    conn.close()
+
+
+def test_failed_migration_is_rolled_back_and_not_recorded(api, database, db, monkeypatch):
+    def broken(conn):
+        conn.cursor().execute("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError('boom')
+    monkeypatch.setattr(api, 'MIGRATIONS', api.MIGRATIONS + [(999, 'broken', broken)])
+    with pytest.raises(RuntimeError):
+        api.apply_migrations(db)
+    cur = db.cursor()
+    cur.execute("SELECT to_regclass('half_done'), EXISTS (SELECT 1 FROM schema_migrations WHERE version = 999)")
+    assert cur.fetchone() == (None, False)
+
+
+def test_schema_is_checked_on_the_first_request_only(api, client, monkeypatch):
+    calls = []
+    real = api.get_schema_version
+    monkeypatch.setattr(api, 'get_schema_version', lambda conn: calls.append(1) or real(conn))
+    monkeypatch.setattr(api, '_schema_ready', False)
+    monkeypatch.setattr(api, 'apply_migrations', lambda conn: pytest.fail('schema is already current'))
+    for _ in range(3):
+        assert client.get('/api/institutions').status_code == 200
+    assert calls == [1]
+
+
+def test_backend_serves_the_api_app_and_static_pages(monkeypatch):
+    monkeypatch.syspath_prepend(str(ROOT))
+    monkeypatch.delitem(sys.modules, 'backend', raising=False)
+    backend = importlib.import_module('backend')
+    assert backend.app.import_name == 'api.index'
+    client = backend.app.test_client()
+    response = client.get('/style.css')
+    assert response.status_code == 200
+    response.close()
+    rules = {r.rule for r in backend.app.url_map.iter_rules()}
+    assert '/queue/<queue_id>' in rules and '/admin/queue/bulk' in rules
@@ -0,0 +1,132 @@
+"""Day-partitioned queue: id routing, maintenance and retention (user-021)."""
+from datetime import datetime, timedelta
+
+import psycopg2
+import pytest
+
+from conftest import login, make_tickets
+
+
+def executed_partitions(cur, sql, params):
+    """Queue partitions an EXPLAIN ANALYZE run of ``sql`` actually scanned."""
+    cur.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + sql, params)
+    scanned, stack = set(), [cur.fetchone()[0][0]['Plan']]
+    while stack:
+        node = stack.pop()
+        if node.get('Relation Name', '').startswith(('queue_p', 'queue_default')) and node.get('Actual Loops'):
+            scanned.add(node['Relation Name'])
+        stack.extend(node.get('Plans', []))
+    return scanned
+
+
+def test_lookup_by_id_searches_only_the_tickets_partition(api, client, service, db):
+    ticket = make_tickets(client, service[0])[0]
+    cur = db.cursor()
+    cur.execute("SELECT created_at FROM queue_ids WHERE id = %s", (ticket,))
+    created_at = cur.fetchone()[0]
+    scanned = executed_partitions(cur, f"SELECT * FROM queue WHERE {api._by_queue_id()}", (ticket,))
+    assert scanned == {api._partition_name(created_at.date())}
+    db.rollback()
+    assert client.get(f'/api/queue/{ticket}').get_json()['id'] == ticket
+    assert client.post(f'/api/admin/call-queue/{ticket}', json={}).get_json()['success']
+
+
+def test_ticket_ids_are_unique(client, service):
+    body = {'service_id': service[0], 'person': 'Visitor', 'id': 'kiosk-1'}
+    assert client.post('/api/queue', json=body).status_code == 200
+    assert client.post('/api/queue', json=body).status_code == 409
+    # The rejected create did not use up a number
+    assert client.post('/api/queue', json=dict(body, id='kiosk-2')).get_json()['number'] == 'A002'
+
+
+def test_requests_do_not_maintain_partitions(api, client, monkeypatch):
+    monkeypatch.setattr(api, 'maintain_queue_partitions', lambda *a: pytest.fail('ran from a request'))
+    assert client.get('/api/institutions').status_code == 200
+
+
+def test_rollover_worker_creates_missing_partitions(api, client, db):
+    last = datetime.now().date() + timedelta(days=api.QUEUE_PARTITION_AHEAD_DAYS)
+    cur = db.cursor()
+    cur.execute(f"DROP TABLE {api._partition_name(last)}")
+    db.commit()
+    created, _ = api.rollover_worker.maintain_partitions()
+    assert created == [api._partition_name(last)]
+    assert api.rollover_worker.stats()['partitions_created'] >= 1
+
+
+def test_retention_drops_old_history_and_id_routes(api, client, db):
+    assert api.QUEUE_RETENTION_DAYS > 0
+    old = datetime.now() - timedelta(days=40)
+    cur = db.cursor()
+    cur.execute("INSERT INTO queue_ids VALUES ('old', %s), ('recent', NOW())", (old,))
+    db.commit()
+    _, dropped = api.maintain_queue_partitions(db, 30)
+    db.commit()
+    assert ('queue_ids', 1) in dropped
+    cur.execute("SELECT id FROM queue_ids")
+    assert cur.fetchall() == [('recent',)]
+
+
+def test_retention_deletes_in_batches(api, client, db, monkeypatch):
+    old = datetime.now() - timedelta(days=40)
+    cur = db.cursor()
+    cur.execute("INSERT INTO queue_ids SELECT 'old-' || n, %s FROM generate_series(1, 5) n", (old,))
+    db.commit()
+    monkeypatch.setattr(api, 'QUEUE_DELETE_BATCH', 2)
+    _, dropped = api.maintain_queue_partitions(db, 30)
+    assert ('queue_ids', 5) in dropped
+    cur.execute("SELECT COUNT(*) FROM queue_ids")
+    assert cur.fetchone()[0] == 0
+
+
+def test_scoped_deletes_run_in_batches(api, client, service, db, monkeypatch):
+    ids = make_tickets(client, service[0], 5)
+    cur = db.cursor()
+    # Two of them already archived
+    cur.execute(f"""
+        WITH moved AS (DELETE FROM queue WHERE id = ANY(%s) RETURNING *)
+        INSERT INTO queue_history ({', '.join(api.HISTORY_COLUMNS)}) SELECT {', '.join(api.HISTORY_COLUMNS)} FROM moved
+    """, (ids[:2],))
+    db.commit()
+    monkeypatch.setattr(api, 'QUEUE_DELETE_BATCH', 2)
+    body = client.delete(f'/api/admin/delete-department/{service[0]}').get_json()
+    assert body['deleted'] == 5
+    cur.execute("SELECT (SELECT COUNT(*) FROM queue_all), (SELECT COUNT(*) FROM queue_ids)")
+    assert cur.fetchone() == (0, 0)
+    db.rollback()
+    make_tickets(client, service[0], 3)
+    body = client.post('/api/admin/delete-all-queues', json={'institution_id': service[1]}).get_json()
+    assert body['deleted'] == 3
+
+
+def test_maintain_endpoint_is_super_admin_only(client):
+    url = '/api/admin/partitions/maintain'
+    assert client.post(url, json={}).status_code == 401
+    assert client.post(url, json={}, headers=login(client, 'dean')).status_code == 403
+    assert client.post(url, json={}, headers=login(client, 'super-admin')).get_json()['success']
+
+
+def test_legacy_rows_go_to_the_default_partition(api, empty_database, monkeypatch):
+    conn = psycopg2.connect(empty_database)
+    migrations = api.MIGRATIONS
+    monkeypatch.setattr(api, 'MIGRATIONS', [m for m in migrations if m[0] < 9])
+    api.apply_migrations(conn)
+    cur = conn.cursor()
+    cur.execute("SELECT id, institution_id FROM services WHERE prefix = 'A'")
+    service_id, institution_id = cur.fetchone()
+    for queue_id, days_ago in (('q-old', 30), ('q-week', 7), ('q-today', 0)):
+        cur.execute("""
+            INSERT INTO queue (id, institution_id, service_id, number, person, status, created_at)
+            VALUES (%s, %s, %s, 'A001', 'Visitor', 'waiting', NOW() - %s * interval '1 day')
+        """, (queue_id, institution_id, service_id, days_ago))
+    conn.commit()
+    monkeypatch.setattr(api, 'MIGRATIONS', migrations)
+    api.apply_migrations(conn)
+
+    partitions = api.queue_partitions(cur)
+    assert min(partitions) == datetime.now().date()
+    cur.execute("SELECT id FROM queue_default ORDER BY id")
+    assert cur.fetchall() == [('q-old',), ('q-week',)]
+    cur.execute("SELECT COUNT(*) FROM queue_ids")
+    assert cur.fetchone()[0] == 3
+    conn.close()
@@ -0,0 +1,150 @@
+"""ConnectionPool and the per-request connection handling (user-001).
+
+These use fake connections, so they run without PostgreSQL.
+"""
+import types
+
+import psycopg2
+import psycopg2.extensions
+import pytest
+
+
+class FakeCursor:
+    def __init__(self, raw):
+        self.raw = raw
+
+    def execute(self, sql, params=None):
+        if self.raw.broken:
+            raise psycopg2.OperationalError('server closed the connection')
+        self.raw.in_transaction = True
+
+    def close(self):
+        pass
+
+
+class FakeRaw:
+    def __init__(self):
+        self.closed = False
+        self.broken = False
+        self.in_transaction = False
+        self.rollbacks = 0
+        self.autocommit = False
+        self.readonly = None
+
+    @property
+    def info(self):
+        status = (psycopg2.extensions.TRANSACTION_STATUS_INTRANS if self.in_transaction
+                  else psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+        return types.SimpleNamespace(transaction_status=status)
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def opened():
+    return []
+
+
+@pytest.fixture
+def make_pool(api, opened):
+    def connect():
+        raw = FakeRaw()
+        opened.append(raw)
+        return raw
+
+    def make(**kwargs):
+        kwargs.setdefault('checkout_timeout', 0.05)
+        return api.ConnectionPool(connect, **kwargs)
+    return make
+
+
+def test_released_connection_is_reused(make_pool, opened):
+    pool = make_pool()
+    with pool.connection() as conn:
+        first = conn._raw
+    with pool.connection() as conn:
+        assert conn._raw is first
+    assert len(opened) == 1
+    assert pool.stats()['checkouts'] == 2
+
+
+def test_checkout_times_out_when_exhausted(make_pool):
+    pool = make_pool(max_size=1)
+    held = pool.checkout()
+    with pytest.raises(psycopg2.OperationalError):
+        pool.checkout()
+    assert pool.stats()['timeouts'] == 1
+    held.close()
+    pool.checkout().close()
+
+
+def test_release_rolls_back_and_resets_session(make_pool):
+    pool = make_pool()
+    conn = pool.checkout()
+    raw = conn._raw
+    conn.cursor().execute('UPDATE queue SET called = TRUE')
+    raw.autocommit, raw.readonly = True, True
+    conn.close()
+    assert raw.rollbacks == 1
+    assert (raw.autocommit, raw.readonly) == (False, None)
+    with pytest.raises(psycopg2.InterfaceError):
+        conn.cursor()
+
+
+def test_closed_connection_is_not_returned_to_the_pool(make_pool, opened):
+    pool = make_pool()
+    conn = pool.checkout()
+    conn._raw.closed = True
+    conn.close()
+    with pool.connection():
+        pass
+    assert len(opened) == 2
+
+
+def test_idle_connections_are_reaped_down_to_min_size(make_pool, opened):
+    pool = make_pool(min_size=1, idle_timeout=0)
+    a, b = pool.checkout(), pool.checkout()
+    a.close()
+    b.close()
+    assert pool.stats()['idle'] == 1
+    assert pool.stats()['reaped'] == 1
+    assert sum(raw.closed for raw in opened) == 1
+
+
+def test_stale_connection_failing_ping_is_replaced(make_pool, opened):
+    pool = make_pool(ping_after=0)
+    with pool.connection() as conn:
+        conn._raw.broken = True
+    with pool.connection() as conn:
+        assert conn._raw is opened[1]
+    assert opened[0].closed
+    assert pool.stats()['failed_health_checks'] == 1
+
+
+def test_failed_connect_frees_the_slot(api):
+    def refuse():
+        raise psycopg2.OperationalError('could not connect')
+    pool = api.ConnectionPool(refuse, max_size=1, checkout_timeout=0.05)
+    for _ in range(2):
+        with pytest.raises(psycopg2.OperationalError):
+            pool.checkout()
+    assert pool.stats()['in_use'] == 0
+    assert pool.stats()['timeouts'] == 0
+
+
+def test_request_teardown_returns_leaked_connections(api, make_pool, monkeypatch):
+    pool = make_pool()
+    monkeypatch.setattr(api, 'db_pool', pool)
+    with api.app.test_request_context('/'):
+        api.get_db_connection()
+        assert pool.stats()['in_use'] == 1
+        api.release_request_connections()
+    assert pool.stats()['in_use'] == 0
@@ -0,0 +1,39 @@
+"""Admin presence shared through Postgres (user-010)."""
+import types
+
+
+def test_status_round_trips_by_service_and_prefix(client, service):
+    assert client.get(f'/api/admin/status/{service[0]}').get_json()['status'] == 'available'
+    body = client.post('/api/admin/status', json={'service_id': service[0], 'status': 'busy'}).get_json()
+    assert body == {'success': True, 'department': 'A', 'status': 'busy', 'service_id': service[0]}
+    assert client.get(f'/api/admin/status/{service[0]}').get_json()['status'] == 'busy'
+    assert client.get(f'/api/admin/status/a?institution_id={service[1]}').get_json()['status'] == 'busy'
+
+
+def test_legacy_department_sets_every_matching_service(client, service, db):
+    client.post('/api/admin/status', json={'department': 'dean', 'status': 'away'})
+    cur = db.cursor()
+    cur.execute("SELECT p.status FROM admin_presence p JOIN services s ON s.id = p.service_id "
+                "WHERE TRIM(s.prefix) = 'A'")
+    statuses = [r[0] for r in cur.fetchall()]
+    assert statuses and set(statuses) == {'away'}
+
+
+def test_rejects_bad_status_and_unknown_service(client, service):
+    assert client.post('/api/admin/status', json={'service_id': service[0], 'status': 'asleep'}).status_code == 400
+    assert client.post('/api/admin/status', json={'department': 'nobody', 'status': 'busy'}).status_code == 400
+    assert client.post('/api/admin/status', json={'service_id': 999999, 'status': 'busy'}).status_code == 404
+
+
+def test_another_worker_sees_the_change(api, client, service):
+    # A second worker's cache, with no listener, holding a stale entry
+    other = api.PresenceCache(types.SimpleNamespace(connected=False), ttl=60)
+    assert other.get(service[0]) == 'available'
+    client.post('/api/admin/status', json={'service_id': service[0], 'status': 'busy'})
+    assert other.get(service[0]) == 'available'
+    # ...until the NOTIFY invalidates it, or the ttl runs out
+    other.invalidate()
+    assert other.get(service[0]) == 'busy'
+    client.post('/api/admin/status', json={'service_id': service[0], 'status': 'away'})
+    other.ttl = 0
+    assert other.get(service[0]) == 'away'
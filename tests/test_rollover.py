@@ -0,0 +1,100 @@
+"""End-of-day rollover: expiry, rollup catch-up and counters (user-023)."""
+from datetime import datetime, timedelta
+
+from conftest import login, make_tickets
+
+
+def backdate(db, ids, days):
+    """Move tickets and their events ``days`` back, as if created then."""
+    cur = db.cursor()
+    for table in ('queue', 'queue_ids'):
+        cur.execute(f"UPDATE {table} SET created_at = created_at - %s * interval '1 day' WHERE id = ANY(%s)",
+                    (days, ids))
+    cur.execute("UPDATE queue_events SET at = at - %s * interval '1 day' WHERE queue_id = ANY(%s)", (days, ids))
+    cur.execute("DELETE FROM queue_hourly_rollup")
+    db.commit()
+
+
+def rollup_days(db):
+    """{day: tickets created} from the rollup."""
+    cur = db.cursor()
+    cur.execute("SELECT bucket::date, SUM(created) FROM queue_hourly_rollup GROUP BY 1")
+    days = dict(cur.fetchall())
+    db.rollback()
+    return days
+
+
+def test_expires_unfinished_tickets_once_per_day(api, client, service, db):
+    ids = make_tickets(client, service[0], 2)
+    backdate(db, ids, 1)
+    client.post(f'/api/admin/call-queue/{ids[0]}', json={})
+    client.post(f'/api/admin/complete-queue/{ids[0]}', json={})
+    summary = api.rollover_institution(db, service[1])
+    assert summary['expired'] == 1
+    assert client.get(f'/api/queue/{ids[1]}').get_json()['status'] == 'expired'
+    assert api.rollover_institution(db, service[1]) is None
+    cur = db.cursor()
+    cur.execute("""
+        SELECT s.id, c.day = CURRENT_DATE FROM services s
+        LEFT JOIN queue_counters c ON c.service_id = s.id
+        WHERE s.institution_id = %s
+    """, (service[1],))
+    # Every service has a counter open for today
+    assert all(today for _, today in cur.fetchall())
+
+
+def test_rebuilds_every_day_since_the_last_rollover(api, client, service, db):
+    today = datetime.now().date()
+    backdate(db, make_tickets(client, service[0], 2), 3)
+    cur = db.cursor()
+    cur.execute("INSERT INTO rollover_runs (institution_id, day, finished_at) VALUES (%s, %s, NOW())",
+                (service[1], today - timedelta(days=4)))
+    db.commit()
+    api.rollover_institution(db, service[1])
+    assert rollup_days(db) == {today - timedelta(days=3): 2}
+
+
+def test_without_a_previous_run_only_yesterday_is_rebuilt(api, client, service, db):
+    today = datetime.now().date()
+    backdate(db, make_tickets(client, service[0], 1), 3)
+    backdate(db, make_tickets(client, service[0], 1), 1)
+    api.rollover_institution(db, service[1])
+    assert rollup_days(db) == {today - timedelta(days=1): 1}
+
+
+def test_todays_live_buckets_are_not_rewritten(api, client, service, db):
+    make_tickets(client, service[0], 2)
+    cur = db.cursor()
+    cur.execute("UPDATE queue_hourly_rollup SET created = 99")
+    db.commit()
+    api.rollover_institution(db, service[1], datetime.now().date() + timedelta(days=1))
+    assert rollup_days(db) == {datetime.now().date(): 99}
+
+
+def test_endpoints_require_super_admin(api, client):
+    for url in ('/api/admin/rollover', '/api/admin/rollup/backfill'):
+        assert client.post(url, json={}).status_code == 401
+        assert client.post(url, json={}, headers=login(client, 'dean')).status_code == 403
+        assert client.post(url, json={}, headers=login(client, 'super-admin')).get_json()['success']
+    assert api.rollover_worker.stats()['running'] is api.rollover_worker.is_running() is False
+
+
+def test_days_come_from_the_database_clock(api, client, service, db, monkeypatch):
+    make_tickets(client, service[0], 3)
+
+    class AppClock(datetime):
+        """An app server whose clock runs a day ahead of the database's."""
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.now(tz) + timedelta(days=1)
+    monkeypatch.setattr(api, 'datetime', AppClock)
+    summary = api.rollover_institution(db, service[1])
+    assert summary['expired'] == 0
+    cur = db.cursor()
+    cur.execute("SELECT day = CURRENT_DATE, last_value FROM queue_counters WHERE service_id = %s", (service[0],))
+    assert cur.fetchall() == [(True, 3)]
+    # Opening a later day explicitly still leaves today's live counter alone
+    api.rollover_institution(db, service[1], datetime.now().date() + timedelta(days=1))
+    cur.execute("SELECT COUNT(*) FROM queue_counters WHERE service_id = %s AND day = CURRENT_DATE", (service[0],))
+    assert cur.fetchone()[0] == 1
+    assert client.post('/api/queue', json={'service_id': service[0], 'person': 'V'}).get_json()['number'] == 'A004'
@@ -0,0 +1,45 @@
+"""Hourly rollup maintained in the mutation transactions (user-009)."""
+from conftest import make_tickets
+
+ROLLUP = """
+    SELECT service_id, bucket, created, called, completed, served,
+           round(wait_seconds::numeric, 3), round(service_seconds::numeric, 3)
+    FROM queue_hourly_rollup ORDER BY service_id, bucket
+"""
+
+
+def rollup(db):
+    cur = db.cursor()
+    cur.execute(ROLLUP)
+    rows = cur.fetchall()
+    db.rollback()
+    return rows
+
+
+def test_live_counters_match_a_rebuild_from_events(api, client, service, db):
+    ids = make_tickets(client, service[0], 3)
+    client.post(f'/api/admin/call-queue/{ids[0]}', json={})
+    client.post(f'/api/admin/return-queue/{ids[0]}', json={})
+    client.post(f'/api/admin/call-queue/{ids[0]}', json={})
+    client.post(f'/api/admin/complete-queue/{ids[0]}', json={})
+    client.post(f'/api/admin/call-queue/{ids[1]}', json={})
+    live = rollup(db)
+    assert [r[2:6] for r in live] == [(3, 3, 1, 1)]
+
+    api.backfill_hourly_rollup(db)
+    db.commit()
+    assert rollup(db) == live
+
+
+def test_rollup_endpoint_aggregates_by_granularity(client, service):
+    ids = make_tickets(client, service[0], 2)
+    client.post(f'/api/admin/call-queue/{ids[0]}', json={})
+    body = client.get(f'/api/analytics/rollup?service_id={service[0]}&granularity=day').get_json()
+    [bucket] = body['buckets']
+    assert (bucket['created'], bucket['called'], bucket['completed']) == (2, 1, 0)
+    assert bucket['avgServiceTime'] is None
+
+
+def test_rollup_endpoint_validates_arguments(client, service):
+    assert client.get('/api/analytics/rollup?granularity=day').status_code == 400
+    assert client.get(f'/api/analytics/rollup?service_id={service[0]}&granularity=minute').status_code == 400
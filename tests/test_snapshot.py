@@ -0,0 +1,36 @@
+"""One-query snapshot for the queue-status page (user-013)."""
+from conftest import make_tickets
+
+
+def test_snapshot_has_position_serving_and_counts(client, service, db):
+    ids = make_tickets(client, service[0], 4)
+    client.post(f'/api/admin/call-queue/{ids[0]}', json={})
+    client.post(f'/api/admin/complete-queue/{ids[0]}', json={})
+    client.post(f'/api/admin/call-queue/{ids[1]}', json={})
+    cur = db.cursor()
+    cur.execute("SELECT i.name, s.name FROM services s JOIN institutions i ON i.id = s.institution_id "
+                "WHERE s.id = %s", service[:1])
+    institution_name, service_name = cur.fetchone()
+
+    state = client.get(f'/api/queue/{ids[3]}/snapshot').get_json()
+    assert (state['queue_number'], state['position'], state['waiting_count']) == ('A004', 2, 2)
+    assert (state['current_serving'], state['last_completed_queue']) == ('A002', 'A001')
+    assert (state['institution_name'], state['service_name']) == (institution_name, service_name)
+    assert state['status']['class'] == 'status-waiting' and not state['is_called']
+    assert state['accessed'] is False
+
+    called = client.get(f'/api/queue/{ids[1]}/snapshot').get_json()
+    assert called['is_called'] and called['position'] == 0 and called['estimated_minutes'] is None
+    done = client.get(f'/api/queue/{ids[0]}/snapshot').get_json()
+    assert done['is_cleared']
+
+
+def test_visit_records_the_first_access(client, service):
+    [ticket] = make_tickets(client, service[0])
+    assert client.get(f'/api/queue/{ticket}/snapshot').get_json()['accessed'] is False
+    client.get(f'/api/queue/{ticket}/snapshot?visit=1')
+    assert client.get(f'/api/queue/{ticket}/snapshot').get_json()['accessed'] is True
+
+
+def test_unknown_ticket_is_404(client):
+    assert client.get('/api/queue/nope/snapshot').status_code == 404
@@ -0,0 +1,43 @@
+"""Server-Sent Events stream of a ticket's status (user-011)."""
+import json
+
+from conftest import make_tickets
+
+
+def events(response):
+    """[(event, data, id)] parsed from an SSE body."""
+    parsed = []
+    for block in response.get_data(as_text=True).split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':') and ': ' in line)
+        if 'event' in fields:
+            parsed.append((fields['event'], json.loads(fields['data']), fields.get('id')))
+    return parsed
+
+
+def test_stream_sends_state_and_ends_when_ticket_is_completed(client, service):
+    [ticket] = make_tickets(client, service[0])
+    client.post(f'/api/admin/complete-queue/{ticket}', json={})
+    response = client.get(f'/api/queue/{ticket}/events')
+    assert response.mimetype == 'text/event-stream'
+    assert response.get_data(as_text=True).startswith('retry: 3000')
+    [(name, data, _)] = events(response)
+    assert name == 'status' and data['is_cleared']
+
+
+def test_resumed_stream_skips_the_state_the_client_has(api, client, service, monkeypatch):
+    monkeypatch.setattr(api, 'SSE_MAX_STREAM_SECONDS', 0)
+    [ticket] = make_tickets(client, service[0])
+    [(_, data, event_id)] = events(client.get(f'/api/queue/{ticket}/events'))
+    assert data['queue_number'] == 'A001' and not data['is_called']
+    assert events(client.get(f'/api/queue/{ticket}/events', headers={'Last-Event-ID': event_id})) == []
+
+
+def test_unknown_ticket_is_404(client):
+    assert client.get('/api/queue/nope/events').status_code == 404
+
+
+def test_serverless_refuses_the_stream(api, client, service, monkeypatch):
+    monkeypatch.setattr(api, 'SERVERLESS', True)
+    [ticket] = make_tickets(client, service[0])
+    response = client.get(f'/api/queue/{ticket}/events')
+    assert response.status_code == 204 and response.data == b''
@@ -0,0 +1,109 @@
+"""state as the ticket lifecycle, and the compact row migration (user-025)."""
+from datetime import date, time
+
+import psycopg2
+
+from conftest import login, make_tickets
+
+
+def test_active_index_is_on_state(db):
+    cur = db.cursor()
+    cur.execute("SELECT indexdef FROM pg_indexes WHERE indexname = 'idx_queue_active_service'")
+    assert cur.fetchone()[0].endswith('WHERE (state = ANY (ARRAY[0, 1]))')
+
+
+def test_flags_are_derived_from_state(api, client, service, db):
+    cur = db.cursor()
+    for table in ('queue', 'queue_history'):
+        cur.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = %s AND column_name IN ('called', 'completed')
+        """, (table,))
+        assert cur.fetchall() == []
+    waiting, called, returned, done = make_tickets(client, service[0], 4)
+    for ticket in (called, returned, done):
+        client.post(f'/api/admin/call-queue/{ticket}', json={})
+    client.post(f'/api/admin/return-queue/{returned}', json={})
+    client.post(f'/api/admin/complete-queue/{done}', json={})
+    cur.execute("SELECT id, called, completed FROM queue_all")
+    assert dict((i, (c, d)) for i, c, d in cur.fetchall()) == {
+        waiting: (False, False), called: (True, False), returned: (False, False), done: (True, True)}
+    db.rollback()
+    # Expired keeps whether the ticket was ever called
+    cur.execute(f"UPDATE queue SET state = {api.STATE_EXPIRED} WHERE id IN (%s, %s)", (waiting, returned))
+    cur.execute("SELECT id, called, completed FROM queue_all WHERE id IN (%s, %s)", (waiting, returned))
+    assert sorted(cur.fetchall()) == sorted([(waiting, False, True), (returned, True, True)])
+    db.rollback()
+
+
+def test_created_status_sets_the_state(client, service, db):
+    body = client.post('/api/queue', json={'service_id': service[0], 'person': 'Visitor', 'status': 'completed'})
+    assert body.status_code == 200
+    cur = db.cursor()
+    cur.execute("SELECT state, called, completed FROM queue_all WHERE id = %s", (body.get_json()['id'],))
+    assert cur.fetchone() == (2, True, True)
+
+
+def test_bulk_return_and_mute_only_touch_called_tickets(client, service):
+    ids = make_tickets(client, service[0], 2)
+    client.post(f'/api/admin/call-queue/{ids[0]}', json={})
+    headers = login(client, 'super-admin')
+    for action in ('mute', 'return'):
+        body = client.post('/api/admin/queue/bulk', json={'action': action, 'ids': ids}, headers=headers).get_json()
+        assert [r['result'] for r in body['results']] == ['updated', 'unchanged']
+
+
+def test_a_legacy_duplicate_id_does_not_stall_the_archiver(api, client, service, db):
+    cur = db.cursor()
+    # The same id live and already archived, from before queue_ids existed
+    for table, seq in (('queue', 'DEFAULT'), ('queue_history', '0')):
+        cur.execute(f"""
+            INSERT INTO {table} (id, seq, institution_id, service_id, number, person, date, time, state, created_at)
+            VALUES ('legacy', {seq}, %s, %s, 'A001', 'Visitor', CURRENT_DATE - 3, '09:00', {api.STATE_EXPIRED},
+                    NOW() - interval '3 days')
+        """, (service[1], service[0]))
+    db.commit()
+    assert api.queue_archiver.run() == 1
+    cur.execute("SELECT COUNT(*) FROM queue_history WHERE id = 'legacy'")
+    assert cur.fetchone()[0] == 2
+
+
+def test_compact_row_migration_backfills_state_date_and_time(api, empty_database, monkeypatch):
+    conn = psycopg2.connect(empty_database)
+    migrations = api.MIGRATIONS
+    monkeypatch.setattr(api, 'MIGRATIONS', [m for m in migrations if m[0] < 13])
+    api.apply_migrations(conn)
+    cur = conn.cursor()
+    cur.execute("SELECT id, institution_id FROM services WHERE prefix = 'A'")
+    service_id, institution_id = cur.fetchone()
+    legacy = [
+        # id, status, called, completed, date, time
+        ('t-wait', 'waiting', False, False, '10/17/2026', '9:05 AM'),
+        ('t-called', 'called', True, False, 'October 17, 2026', '14:30'),
+        ('t-done', 'completed', True, True, '2026-10-17', '09:00:00'),
+        ('t-expired', 'expired', False, False, 'garbage', None),
+    ]
+    for queue_id, status, called, completed, day, at in legacy:
+        cur.execute("""
+            INSERT INTO queue (id, institution_id, service_id, number, person, status, called, completed,
+                               date, time, created_at)
+            VALUES (%s, %s, %s, 'A001', 'Visitor', %s, %s, %s, %s, %s, '2026-10-17 08:00:00')
+        """, (queue_id, institution_id, service_id, status, called, completed, day, at))
+    conn.commit()
+    monkeypatch.setattr(api, 'MIGRATIONS', migrations)
+    api.apply_migrations(conn)
+
+    cur.execute("SELECT id, state, called, completed, date, time FROM queue_all ORDER BY id")
+    assert cur.fetchall() == [
+        ('t-called', api.STATE_CALLED, True, False, date(2026, 10, 17), time(14, 30)),
+        ('t-done', api.STATE_COMPLETED, True, True, date(2026, 10, 17), time(9, 0)),
+        # Unparseable date / missing time fall back to created_at; expired is finished
+        ('t-expired', api.STATE_EXPIRED, False, True, date(2026, 10, 17), time(8, 0)),
+        ('t-wait', api.STATE_WAITING, False, False, date(2026, 10, 17), time(9, 5)),
+    ]
+    # seq stays on its sequence (no identity on a partitioned table before PostgreSQL 17)
+    cur.execute("SELECT attidentity FROM pg_attribute WHERE attrelid = 'queue'::regclass AND attname = 'seq'")
+    assert cur.fetchone()[0] == ''
+    cur.execute("SELECT nextval(pg_get_serial_sequence('queue', 'seq'))")
+    assert cur.fetchone()[0] == 5
+    conn.close()
@@ -0,0 +1,33 @@
+"""Single-pass admin stats with measured wait and service times (user-007)."""
+from datetime import datetime, timedelta
+
+from conftest import make_tickets
+
+
+def test_counts_and_measured_times(api, client, service, db):
+    ids = make_tickets(client, service[0], 4)
+    client.post(f'/api/admin/call-queue/{ids[0]}', json={})
+    client.post(f'/api/admin/call-queue/{ids[1]}', json={})
+    client.post(f'/api/admin/complete-queue/{ids[0]}', json={})
+    # Pin the timestamps so the measured times are exact
+    start = datetime.combine(datetime.now().date(), datetime.min.time()) + timedelta(minutes=1)
+    cur = db.cursor()
+    cur.execute("UPDATE queue SET created_at = %s WHERE id = ANY(%s)", (start, ids))
+    cur.execute("UPDATE queue SET called_at = %s + interval '10 minutes', completed_at = %s + interval '16 minutes' "
+                "WHERE id = %s", (start, start, ids[0]))
+    cur.execute("UPDATE queue SET called_at = %s + interval '20 minutes' WHERE id = %s", (start, ids[1]))
+    db.commit()
+
+    stats = client.get(f'/api/admin/stats/{service[0]}').get_json()
+    assert (stats['totalToday'], stats['currentQueue'], stats['waiting']) == (4, 3, 2)
+    assert (stats['calledToday'], stats['completedToday']) == (2, 1)
+    assert (stats['avgWaitTime'], stats['p50WaitTime']) == (15.0, 15.0)
+    assert stats['avgServiceTime'] == 6.0
+    # Two still waiting at six minutes each
+    assert stats['estimatedWaitTime'] == 12.0
+
+
+def test_empty_service_has_no_estimate(client, service):
+    stats = client.get(f'/api/admin/stats/{service[0]}').get_json()
+    assert (stats['totalToday'], stats['waiting'], stats['avgWaitTime']) == (0, 0, 0)
+    assert stats['estimatedWaitTime'] is None